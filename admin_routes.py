@@ -2,7 +2,7 @@ from flask import Blueprint, app, current_app, render_template, abort, request,
 from flask_login import login_required, current_user, login_user
 from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
-from models import PasswordResetRequest, PasswordResetToken, StudentFeeBalance, db, User, Admin, StudentProfile, ParentProfile, Quiz, Question, Option, StudentQuizSubmission, Assignment, CourseMaterial, Course, CourseLimit, TimetableEntry, TeacherProfile, AcademicCalendar, AcademicYear, ClassFeeStructure, StudentFeeTransaction, ParentChildLink, Exam, ExamSubmission, ExamQuestion, ExamAttempt, ExamOption, ExamSet, ExamSetQuestion, SchoolClass
+from models import PasswordResetRequest, PasswordResetToken, StudentFeeBalance, db, User, Admin, StudentProfile, ParentProfile, Quiz, Question, Option, StudentQuizSubmission, Assignment, CourseMaterial, Course, CourseLimit, TimetableEntry, TeacherProfile, AcademicCalendar, AcademicYear, ClassFeeStructure, StudentFeeTransaction, ParentChildLink, Exam, ExamSubmission, ExamQuestion, ExamAttempt, ExamOption, ExamSet, ExamSetQuestion, ExamSetAssignment, ExamAnswerDraft, SchoolClass
 from datetime import date, datetime, timedelta, time
 from sqlalchemy import extract, asc, desc
 from sqlalchemy.orm import joinedload
@@ -10,12 +10,26 @@ from sqlalchemy.exc import IntegrityError
 import os, json, csv
 from forms import AdminLoginForm, QuizForm, AdminRegisterForm, AssignmentForm, MaterialForm, CourseForm, CourseLimitForm, ExamForm, ExamSetForm, ExamQuestionForm
 from utils.promotion import promote_student
+from utils.identity_cache import identity_cache
+from utils.perf import perf_monitor
+from utils.scheduler import scheduler
 from utils.score import calculate_student_score
 from utils.backup import generate_quiz_csv_backup, backup_students_to_csv
 from utils.serializers import (serialize_admin, serialize_submission, serialize_user, serialize_student, serialize_quiz, serialize_question, serialize_option, serialize_submission)
 from utils.receipts import generate_receipt  # ✅ import the receipt generator
 from utils.email_utils import send_temporary_password_email, send_password_reset_email
 from utils.notifications import create_assignment_notification, create_fee_notification
+from utils.notification_counters import bump_unread
+from utils.exam_monitor import exam_monitor
+from utils.item_analysis import item_analysis
+from utils.paper_edits import save_exam_question, save_quiz_questions
+from utils.question_import import QuestionImportError, import_file
+from utils.question_search import available as search_available, near_duplicates, search_questions
+from utils.regrade import regrade_status, start_regrade
+from utils.set_allocation import plan_set_allocation
+from utils.set_generator import generate_sets, save_sets
+from utils.set_membership import (add_questions as add_set_questions, remove_questions as remove_set_questions,
+                                  reorder_questions as reorder_set)
 import uuid, secrets
 from zipfile import ZipFile
 import tempfile
@@ -81,6 +95,46 @@ def dashboard():
         admin_count=admin_count
     )
 
+# --------------- Identity Cache Stats ---------------
+@admin_bp.route('/identity-cache/stats')
+@login_required
+def identity_cache_stats():
+    if current_user.role != 'admin':
+        abort(403)
+    return jsonify(identity_cache.stats())
+
+# --------------- Request Performance ---------------
+@admin_bp.route('/perf', methods=['GET', 'POST'])
+@login_required
+def perf():
+    if current_user.role != 'admin':
+        abort(403)
+
+    if request.method == 'POST':
+        perf_monitor.clear()
+        flash("Performance buffer cleared.", "info")
+        return redirect(url_for('admin.perf'))
+
+    recent = perf_monitor.recent(limit=request.args.get('limit', 100, type=int))
+    endpoints = perf_monitor.by_endpoint()
+
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'recent': recent,
+            'endpoints': endpoints,
+            'identity_cache': identity_cache.stats(),
+            'jobs': scheduler.stats(),
+        })
+
+    return render_template(
+        'admin/perf.html',
+        recent=recent,
+        endpoints=endpoints,
+        identity_stats=identity_cache.stats(),
+        jobs=scheduler.stats(),
+        threshold=perf_monitor.n_plus_one_threshold,
+    )
+
 from werkzeug.utils import secure_filename
 import os
 
@@ -525,6 +579,7 @@ def edit_quiz(quiz_id):
         qlist = []
         for q in quiz_obj.questions:
             qdict = {
+                "id": q.id,
                 "text": q.text,
                 # if you have a label_style stored per-question add it; default to 'abc' otherwise
                 "label_style": getattr(q, "label_style", "abc"),
@@ -532,6 +587,7 @@ def edit_quiz(quiz_id):
             }
             for opt in q.options:
                 qdict["options"].append({
+                    "id": opt.id,
                     "text": opt.text,
                     "is_correct": bool(opt.is_correct)
                 })
@@ -596,18 +652,13 @@ def edit_quiz(quiz_id):
                     content_file.save(os.path.join(UPLOAD_FOLDER, filename))
                     quiz.content_file = filename
 
-                # Remove existing questions + options
-                # Because relationship has cascade delete-orphan this will remove them on commit
-                # but to be explicit we delete them here
-                for q in list(quiz.questions):   # list() to avoid mutation while iterating
-                    # delete options
-                    for opt in list(q.options):
-                        db.session.delete(opt)
-                    db.session.delete(q)
-                db.session.flush()
+                # Parse POSTed questions (keys like questions[0][text], questions[0][id],
+                # questions[1][options][0][text]...) and write only the difference
+                # against the stored paper (utils/paper_edits.py)
+                def posted_id(key):
+                    raw = request.form.get(key, '')
+                    return int(raw) if raw.isdigit() else None
 
-                # Now parse POSTed questions from the form and create new Question / Option rows
-                # Gather question indices posted (keys like questions[0][text], questions[1][options][0][text]...)
                 q_indices = set()
                 pattern_qidx = re.compile(r'^questions\[(\d+)\]')
                 for key in request.form.keys():
@@ -616,14 +667,13 @@ def edit_quiz(quiz_id):
                         q_indices.add(int(m.group(1)))
                 q_indices = sorted(q_indices)
 
+                submitted = []
                 for q_index in q_indices:
                     q_text_key = f'questions[{q_index}][text]'
                     q_text = request.form.get(q_text_key, '').strip()
                     if not q_text:
                         continue
-                    question = Question(quiz_id=quiz.id, text=q_text, points=1.0)
-                    db.session.add(question)
-                    db.session.flush()  # ensure question.id is available
+                    question = {'id': posted_id(f'questions[{q_index}][id]'), 'text': q_text, 'options': []}
 
                     # options are numbered 0..N, loop until missing
                     o_index = 0
@@ -633,13 +683,16 @@ def edit_quiz(quiz_id):
                         if opt_text_key not in request.form:
                             break
                         opt_text = request.form.get(opt_text_key, '').strip()
-                        if not opt_text:
-                            o_index += 1
-                            continue
-                        is_correct = opt_correct_key in request.form
-                        option = Option(question_id=question.id, text=opt_text, is_correct=is_correct)
-                        db.session.add(option)
+                        if opt_text:
+                            question['options'].append({
+                                'id': posted_id(f'questions[{q_index}][options][{o_index}][id]'),
+                                'text': opt_text,
+                                'is_correct': opt_correct_key in request.form,
+                            })
                         o_index += 1
+                    submitted.append(question)
+
+                save_quiz_questions(quiz.id, submitted)
 
                 db.session.commit()
                 flash("Quiz updated successfully!", "success")
@@ -759,15 +812,54 @@ def exam_sets(exam_id):
     for s in sets:
         set_q_map[s.id] = [sq.question_id for sq in s.set_questions]
 
+    # Students allocated to each set by the planner
+    allocation_counts = dict(
+        db.session.query(ExamSetAssignment.set_id, db.func.count(ExamSetAssignment.id))
+        .filter(ExamSetAssignment.exam_id == exam.id)
+        .group_by(ExamSetAssignment.set_id)
+        .all()
+    )
+
     return render_template(
         'admin/exam_sets.html',
         exam=exam,
         pool_questions=pool_questions,
         sets=sets,
-        set_q_map=set_q_map
+        set_q_map=set_q_map,
+        allocation_counts=allocation_counts
     )
 
 
+# Allocate sets to the whole class in one pass (utils/set_allocation.py)
+@admin_bp.route('/exam/<int:exam_id>/sets/allocate', methods=['POST'])
+@login_required
+def allocate_exam_sets(exam_id):
+    admin_only()
+    exam = Exam.query.get_or_404(exam_id)
+    if exam.assignment_mode == 'choice':
+        flash("Students choose their own set for this exam.", "warning")
+        return redirect(url_for('admin.exam_sets', exam_id=exam.id))
+
+    try:
+        counts = plan_set_allocation(
+            exam,
+            avoid_adjacent=request.form.get('avoid_adjacent') == '1',
+            replace=request.form.get('replace') == '1',
+        )
+        db.session.commit()
+    except Exception as e:
+        current_app.logger.exception("Failed allocating exam sets")
+        db.session.rollback()
+        flash(f"Error allocating sets: {e}", "danger")
+        return redirect(url_for('admin.exam_sets', exam_id=exam.id))
+
+    if counts:
+        flash(f"Allocated sets to {sum(counts.values())} students.", "success")
+    else:
+        flash("Create at least one set before allocating.", "warning")
+    return redirect(url_for('admin.exam_sets', exam_id=exam.id))
+
+
 # 2. Create a new set for exam
 @admin_bp.route('/exam/<int:exam_id>/sets/create', methods=['GET', 'POST'])
 @login_required
@@ -800,6 +892,57 @@ def create_exam_set(exam_id):
     return render_template('admin/create_exam_set.html', exam=exam, form=form)
 
 
+# Generate balanced sets from the pool (utils/set_generator.py)
+@admin_bp.route('/exam/<int:exam_id>/sets/generate', methods=['POST'])
+@login_required
+def generate_exam_sets(exam_id):
+    admin_only()
+    exam = Exam.query.get_or_404(exam_id)
+    wants_json = request.args.get('format') == 'json'
+    preview = bool(request.form.get('preview'))
+
+    try:
+        overlap = request.form.get('max_overlap', type=float)
+        plan = generate_sets(
+            exam,
+            n_sets=request.form.get('n_sets', 2, type=int),
+            size=request.form.get('size', type=int),
+            max_overlap=current_app.config.get('EXAM_SET_MAX_OVERLAP', 0.2) if overlap is None else overlap / 100,
+            seed=request.form.get('seed', type=int),
+        )
+        if not preview:
+            save_sets(plan)
+            db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        if wants_json:
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), "danger")
+        return redirect(url_for('admin.exam_sets', exam_id=exam.id))
+    except Exception as e:
+        current_app.logger.exception("Failed generating sets")
+        db.session.rollback()
+        if wants_json:
+            return jsonify({'error': str(e)}), 500
+        flash(f"Error generating sets: {e}", "danger")
+        return redirect(url_for('admin.exam_sets', exam_id=exam.id))
+
+    if wants_json:
+        return jsonify(dict(plan.as_dict(), saved=not preview))
+
+    summary = plan.summary
+    verb = "Planned" if preview else "Created"
+    flash(f"{verb} {summary['n_sets']} sets of {summary['size']} questions "
+          f"(target {summary['target_marks']} marks, difficulty {summary['target_difficulty']}).", "success")
+    for k, info in enumerate(summary['set_stats'], start=1):
+        flash(f"{info.get('name', f'Set {k}')}: {info['total_marks']:g} marks, difficulty {info['difficulty']}, "
+              + ", ".join(f"{n} {t}" for t, n in info['types'].items()), "info")
+    if not summary['within_bound']:
+        flash(f"Some sets share {summary['max_overlap']} questions, more than the {summary['overlap_bound']} "
+              f"allowed; the pool is too small for that many sets.", "warning")
+    return redirect(url_for('admin.exam_sets', exam_id=exam.id))
+
+
 # 3. Edit an existing exam set
 @admin_bp.route('/exam/<int:exam_id>/sets/<int:set_id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -832,8 +975,13 @@ def edit_exam_set(exam_id, set_id):
     )
     set_question_list = [q for q, sq in set_questions]
 
-    # Available pool
-    pool_questions = ExamQuestion.query.filter_by(exam_id=exam.id).all()
+    # Available pool, narrowed through the search index when a query is given
+    search = request.args.get('q', '').strip()
+    pool = ExamQuestion.query.filter_by(exam_id=exam.id)
+    if search and search_available():
+        rows, _ = search_questions(search, kind='exam', owner_id=exam.id, per_page=100)
+        pool = pool.filter(ExamQuestion.id.in_([r['question_id'] for r in rows]))
+    pool_questions = pool.all()
     pool_ids = {q.id for q in set_question_list}
     available_questions = [q for q in pool_questions if q.id not in pool_ids]
 
@@ -843,7 +991,8 @@ def edit_exam_set(exam_id, set_id):
         exam_set=exam_set,
         form=form,
         set_questions=set_question_list,
-        available_questions=available_questions
+        available_questions=available_questions,
+        search=search
     )
 
 @admin_bp.route('/exam/<int:exam_id>/questions/create', methods=['GET', 'POST'])
@@ -854,6 +1003,20 @@ def create_exam_question(exam_id):
     form = ExamQuestionForm()
 
     if form.validate_on_submit():
+        # warn about near-duplicates before saving; posting again confirms
+        if not request.form.get('confirm_duplicate'):
+            duplicates = near_duplicates(form.question_text.data.strip(), kind='exam')
+            if duplicates:
+                flash("Similar questions already exist. Review them, then save again to add this one anyway.", "warning")
+                # the template refills tf_correct and subjective_rubric from request.form
+                math_answers = []
+                for key, val in request.form.items():
+                    m = re.match(r'^math_answer-(\d+)$', key)
+                    if m:
+                        math_answers.append((int(m.group(1)), val))
+                math_answers = [val for _, val in sorted(math_answers)]
+                return render_template('admin/create_exam_question.html', exam=exam, form=form,
+                                       duplicates=duplicates, math_answers=math_answers)
         try:
             # create question row
             q = ExamQuestion(
@@ -1016,6 +1179,19 @@ def edit_exam(exam_id):
     form.assigned_class.choices = [(c.name, c.name) for c in SchoolClass.query.order_by(SchoolClass.name).all()]
 
     if form.validate_on_submit():
+        class_changed = exam.assigned_class != form.assigned_class.data
+        if class_changed:
+            # Allocations and pre-warmed (unstarted) attempts were made for the
+            # old class's roster
+            ExamSetAssignment.query.filter_by(exam_id=exam.id).delete()
+            unstarted = db.select(ExamAttempt.id).where(
+                ExamAttempt.exam_id == exam.id,
+                ExamAttempt.start_time.is_(None),
+                ExamAttempt.submitted.is_(False),
+            )
+            ExamAnswerDraft.query.filter(ExamAnswerDraft.attempt_id.in_(unstarted)).delete(
+                synchronize_session=False)
+            ExamAttempt.query.filter(ExamAttempt.id.in_(unstarted)).delete(synchronize_session=False)
         exam.title = form.title.data.strip()
         exam.subject = form.subject.data.strip()
         exam.assigned_class = form.assigned_class.data
@@ -1024,6 +1200,8 @@ def edit_exam(exam_id):
         exam.duration_minutes = form.duration_minutes.data
         exam.assignment_mode = form.assignment_mode.data
         exam.assignment_seed = (form.assignment_seed.data or None)
+        if class_changed:
+            plan_set_allocation(exam)
         db.session.commit()
         flash("Exam updated successfully!", "success")
         return redirect(url_for("admin.manage_exams"))
@@ -1048,17 +1226,12 @@ def edit_exam_question(exam_id, question_id):
 
     if form.validate_on_submit():
         try:
-            # Update basic fields
-            question.question_text = form.question_text.data.strip()
-            question.question_type = form.question_type.data
-            question.marks = form.marks.data
-            db.session.commit()  # commit the basic changes first (optional)
+            qtype = form.question_type.data
+            options = []  # [{'id', 'text', 'is_correct'}] as posted
 
-            # Remove existing options (we will recreate from posted form)
-            ExamOption.query.filter_by(question_id=question.id).delete()
-            db.session.flush()
-
-            qtype = question.question_type
+            def posted_id(key):
+                raw = request.form.get(key, '')
+                return int(raw) if raw.isdigit() else None
 
             # ---------- MCQ ----------
             if qtype == "mcq":
@@ -1073,7 +1246,7 @@ def edit_exam_question(exam_id, question_id):
                         continue
                     is_correct_raw = request.form.get(f'options-{idx}-is_correct')
                     is_correct = is_checked_value(is_correct_raw)
-                    option_entries.append((idx, text, bool(is_correct)))
+                    option_entries.append((idx, text, bool(is_correct), posted_id(f'options-{idx}-id')))
 
                 # fallback to FieldList in case JS didn't post - similar approach as create
                 if not option_entries and getattr(form, 'options', None):
@@ -1082,11 +1255,11 @@ def edit_exam_question(exam_id, question_id):
                         if not text:
                             continue
                         is_correct = bool(getattr(sub.form, 'is_correct').data)
-                        option_entries.append((len(option_entries), text, is_correct))
+                        option_entries.append((len(option_entries), text, is_correct, None))
 
                 option_entries.sort(key=lambda t: t[0])
-                for _, text, is_corr in option_entries:
-                    db.session.add(ExamOption(question_id=question.id, text=text, is_correct=bool(is_corr)))
+                for _, text, is_corr, option_id in option_entries:
+                    options.append({'id': option_id, 'text': text, 'is_correct': bool(is_corr)})
 
             # ---------- TRUE / FALSE ----------
             elif qtype == "true_false":
@@ -1104,11 +1277,11 @@ def edit_exam_question(exam_id, question_id):
                         tf_options.append((idx, text, is_correct))
                     tf_options.sort(key=lambda t: t[0])
                     for _, text, is_corr in tf_options:
-                        db.session.add(ExamOption(question_id=question.id, text=text, is_correct=bool(is_corr)))
+                        options.append({'text': text, 'is_correct': bool(is_corr)})
                 else:
                     choice = request.form.get('tf_correct', 'true')
-                    db.session.add(ExamOption(question_id=question.id, text='True', is_correct=(choice == 'true')))
-                    db.session.add(ExamOption(question_id=question.id, text='False', is_correct=(choice == 'false')))
+                    options.append({'text': 'True', 'is_correct': choice == 'true'})
+                    options.append({'text': 'False', 'is_correct': choice == 'false'})
 
             # ---------- MATH (numeric answers) ----------
             elif qtype == "math":
@@ -1124,15 +1297,21 @@ def edit_exam_question(exam_id, question_id):
                     math_answers.append((idx, raw))
                 math_answers.sort(key=lambda t: t[0])
                 for _, ans in math_answers:
-                    db.session.add(ExamOption(question_id=question.id, text=ans, is_correct=True))
+                    options.append({'text': ans, 'is_correct': True})
 
             # ---------- SUBJECTIVE ----------
             elif qtype == "subjective":
                 # optional rubric/expected answer posted as 'subjective_rubric'
                 rubric = (request.form.get('subjective_rubric') or "").strip()
                 if rubric:
-                    db.session.add(ExamOption(question_id=question.id, text=rubric, is_correct=False))
-                # No further action needed: question row already created
+                    options.append({'text': rubric, 'is_correct': False})
+
+            # Write only what changed (utils/paper_edits.py)
+            save_exam_question(question, {
+                'question_text': form.question_text.data.strip(),
+                'question_type': qtype,
+                'marks': form.marks.data,
+            }, options)
 
             db.session.commit()
             flash("Question updated successfully!", "success")
@@ -1154,7 +1333,7 @@ def edit_exam_question(exam_id, question_id):
     if question.question_type == 'mcq':
         # keep order as stored
         for o in opts:
-            options.append({'text': o.text, 'is_correct': bool(o.is_correct)})
+            options.append({'id': o.id, 'text': o.text, 'is_correct': bool(o.is_correct)})
     elif question.question_type == 'true_false':
         # detect which option is correct
         for o in opts:
@@ -1224,6 +1403,153 @@ def delete_exam(exam_id):
 
     return redirect(url_for('admin.manage_exams'))
 
+# Re-score every submission after answer key edits (utils/regrade.py)
+@admin_bp.route('/exams/<int:exam_id>/regrade', methods=['POST'])
+@login_required
+def regrade_exam(exam_id):
+    admin_only()
+    exam = Exam.query.get_or_404(exam_id)
+    status = start_regrade(current_app._get_current_object(), exam.id)
+    return jsonify(status), 202
+
+@admin_bp.route('/exams/<int:exam_id>/regrade', methods=['GET'])
+@login_required
+def regrade_exam_status(exam_id):
+    admin_only()
+    status = regrade_status(exam_id)
+    if status is None:
+        return jsonify({'exam_id': exam_id, 'state': 'idle'})
+    return jsonify(status)
+
+# Question bank search across exams and quizzes (utils/question_search.py)
+@admin_bp.route('/question-bank')
+@login_required
+def question_bank():
+    admin_only()
+    if not search_available():
+        if request.args.get('format') == 'json':
+            return jsonify({'error': 'Question search is not available on this database.'}), 503
+        flash("Question search is not available on this database.", "warning")
+        return redirect(url_for('admin.manage_exams'))
+
+    query = request.args.get('q', '').strip()
+    filters = {
+        'subject': request.args.get('subject', '').strip() or None,
+        'class_name': request.args.get('class_name', '').strip() or None,
+        'kind': request.args.get('kind') or None,
+    }
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    results, has_next = search_questions(query, page=page, per_page=per_page, **filters)
+
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'query': query, 'page': page, 'per_page': per_page, 'has_next': has_next,
+            'results': results,
+        })
+
+    return render_template(
+        'admin/question_bank.html',
+        query=query,
+        filters=filters,
+        results=results,
+        page=page,
+        per_page=per_page,
+        has_next=has_next,
+        class_choices=get_class_choices(),
+    )
+
+@admin_bp.route('/question-bank/duplicates')
+@login_required
+def question_bank_duplicates():
+    """
+    Near-duplicates of ``text`` for the question forms (JSON); ``exclude``
+    (``kind:id``) leaves out the question being edited.
+    """
+    admin_only()
+    kind, _, question_id = request.args.get('exclude', '').partition(':')
+    exclude = (kind, int(question_id)) if question_id.isdigit() else None
+    return jsonify({'duplicates': near_duplicates(request.args.get('text', ''), kind=request.args.get('kind'),
+                                                  exclude=exclude)})
+
+# Bulk question import (utils/question_import.py)
+def _import_questions(back, **owner):
+    wants_json = request.args.get('format') == 'json'
+    file = request.files.get('questions_file')
+    if not file or not file.filename:
+        if wants_json:
+            return jsonify({'error': 'No file uploaded.'}), 400
+        flash("Choose a CSV, JSON or XLSX file to import.", "danger")
+        return redirect(back)
+    try:
+        result = import_file(file, dry_run=bool(request.form.get('dry_run')),
+                             chunk_size=current_app.config.get('QUESTION_IMPORT_CHUNK', 500), **owner)
+    except QuestionImportError as e:
+        if wants_json:
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), "danger")
+        return redirect(back)
+    if wants_json:
+        return jsonify(result.as_dict())
+
+    verb = "would be imported" if result.dry_run else "imported"
+    flash(f"{result.imported} questions {verb} ({result.options} options).", "success")
+    if result.error_count:
+        shown = "; ".join(f"line {line}: {message}" for line, message in result.errors[:10])
+        more = f" (and {result.error_count - 10} more)" if result.error_count > 10 else ""
+        flash(f"{result.error_count} rows rejected: {shown}{more}", "warning")
+    return redirect(back)
+
+@admin_bp.route('/exam/<int:exam_id>/questions/import', methods=['POST'])
+@login_required
+def import_exam_questions(exam_id):
+    admin_only()
+    exam = Exam.query.get_or_404(exam_id)
+    return _import_questions(url_for('admin.exam_sets', exam_id=exam.id), exam_id=exam.id)
+
+@admin_bp.route('/quiz/<int:quiz_id>/questions/import', methods=['POST'])
+@login_required
+def import_quiz_questions(quiz_id):
+    admin_only()
+    quiz = Quiz.query.get_or_404(quiz_id)
+    return _import_questions(url_for('admin.edit_quiz', quiz_id=quiz.id), quiz_id=quiz.id)
+
+# Item statistics over stored answers (utils/item_analysis.py)
+@admin_bp.route('/exams/<int:exam_id>/item-analysis')
+@login_required
+def exam_item_analysis(exam_id):
+    admin_only()
+    exam = Exam.query.get_or_404(exam_id)
+    report = item_analysis.report(exam)
+    if request.args.get('format') == 'json':
+        return jsonify(report)
+    return render_template('admin/item_analysis.html', exam=exam, report=report)
+
+# Live invigilation counts from memory (utils/exam_monitor.py)
+@admin_bp.route('/exam/<int:exam_id>/monitor')
+@login_required
+def exam_monitor_page(exam_id):
+    admin_only()
+    exam = Exam.query.get_or_404(exam_id)
+    exam_monitor.watch(exam)
+    counts = exam_monitor.snapshot(exam.id)
+    if request.args.get('format') == 'json':
+        return jsonify(counts)
+    return render_template('admin/exam_monitor.html', exam=exam, counts=counts)
+
+@admin_bp.route('/exam/<int:exam_id>/monitor/stream')
+@login_required
+def exam_monitor_stream(exam_id):
+    admin_only()
+    exam = Exam.query.get_or_404(exam_id)
+    exam_monitor.watch(exam)
+    # The generator only reads the counters; the session is done with here.
+    db.session.remove()
+    response = current_app.response_class(exam_monitor.stream(exam_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # 4. Delete a set
 @admin_bp.route('/exam/<int:exam_id>/sets/<int:set_id>/delete', methods=['POST'])
 @login_required
@@ -1258,39 +1584,22 @@ def add_questions_to_set(exam_id, set_id):
     if not isinstance(question_ids, list):
         return jsonify({"status": "error", "message": "question_ids must be a list"}), 400
 
-    added = []
-    skipped = []
     try:
-        for qid in question_ids:
-            q = ExamQuestion.query.filter_by(id=int(qid), exam_id=exam.id).first()
-            if not q:
-                skipped.append({"id": qid, "reason": "question not found or belongs to another exam"})
-                continue
-
-            # skip if already in set
-            exists = ExamSetQuestion.query.filter_by(set_id=exam_set.id, question_id=q.id).first()
-            if exists:
-                skipped.append({"id": qid, "reason": "already in set"})
-                continue
-
-            # determine order: append to end
-            max_order_row = db.session.query(db.func.max(ExamSetQuestion.order)).filter_by(set_id=exam_set.id).scalar()
-            next_order = (max_order_row or 0) + 1
-
-            sq = ExamSetQuestion(set_id=exam_set.id, question_id=q.id, order=next_order)
-            db.session.add(sq)
-            added.append(qid)
-
+        # One membership query and one bulk insert (utils/set_membership.py)
+        added, skipped, version = add_set_questions(exam_set, question_ids)
         db.session.commit()
-        return jsonify({"status": "ok", "added": added, "skipped": skipped}), 200
+        return jsonify({"status": "ok", "added": added, "skipped": skipped, "version": version}), 200
 
+    except ValueError:
+        db.session.rollback()
+        return jsonify({"status": "error", "message": "question_ids must be integers"}), 400
     except Exception as e:
         current_app.logger.exception("Failed adding questions to set")
         db.session.rollback()
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-# Remove a question from a set
+# Remove one or many questions from a set (POST JSON: {"question_id": 1} or {"question_ids": [1, 2]})
 @admin_bp.route('/exam/<int:exam_id>/sets/<int:set_id>/remove_question', methods=['POST'])
 @login_required
 def remove_question_from_set(exam_id, set_id):
@@ -1300,17 +1609,23 @@ def remove_question_from_set(exam_id, set_id):
 
     payload = request.get_json() or {}
     qid = payload.get('question_id')
-    if not qid:
+    question_ids = payload.get('question_ids') or ([qid] if qid else [])
+    if not question_ids or not isinstance(question_ids, list):
         return jsonify({"status": "error", "message": "question_id required"}), 400
 
     try:
-        sq = ExamSetQuestion.query.filter_by(set_id=exam_set.id, question_id=int(qid)).first()
-        if not sq:
+        removed, version = remove_set_questions(exam_set, question_ids)
+        if not removed:
+            db.session.rollback()
             return jsonify({"status": "error", "message": "not found in set"}), 404
 
-        db.session.delete(sq)
         db.session.commit()
-        return jsonify({"status": "ok", "removed": qid}), 200
+        # "removed" is the posted question_id (as before), or the ids removed for a list
+        return jsonify({"status": "ok", "removed": qid if qid else removed, "removed_count": len(removed),
+                        "question_ids": removed, "version": version}), 200
+    except ValueError:
+        db.session.rollback()
+        return jsonify({"status": "error", "message": "question ids must be integers"}), 400
     except Exception as e:
         current_app.logger.exception("Failed removing question from set")
         db.session.rollback()
@@ -1331,16 +1646,13 @@ def reorder_set_questions(exam_id, set_id):
         return jsonify({"status": "error", "message": "order must be a list"}), 400
 
     try:
-        # Simple pass over list and update order value
-        for idx, qid in enumerate(order_list, start=1):
-            sq = ExamSetQuestion.query.filter_by(set_id=exam_set.id, question_id=int(qid)).first()
-            if not sq:
-                # skip silently or return error
-                continue
-            sq.order = idx
-            db.session.add(sq)
+        # One CASE-based UPDATE for the whole order
+        moved, version = reorder_set(exam_set, order_list)
         db.session.commit()
-        return jsonify({"status": "ok"}), 200
+        return jsonify({"status": "ok", "moved": moved, "version": version}), 200
+    except ValueError:
+        db.session.rollback()
+        return jsonify({"status": "error", "message": "order must be a list of question ids"}), 400
     except Exception as e:
         current_app.logger.exception("Failed reordering set")
         db.session.rollback()
@@ -1739,8 +2051,10 @@ def send_notification(type, title, message, recipients, sender=None, related_typ
     db.session.flush()  # ensures notif.id is available
 
     # Create recipient links
-    for user in recipients:
-        db.session.add(NotificationRecipient(notification_id=notif.id, user_id=user.user_id))
+    recipient_ids = [user.user_id for user in recipients]
+    for user_id in recipient_ids:
+        db.session.add(NotificationRecipient(notification_id=notif.id, user_id=user_id))
+    bump_unread(recipient_ids)
 
     db.session.commit()
     return notif
@@ -6,10 +6,27 @@ from flask_migrate import Migrate
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_wtf.csrf import CSRFProtect, generate_csrf
 from datetime import datetime, timedelta
-from utils.helpers import get_class_choices
 from utils.extensions import db, mail
+from utils.answer_drafts import init_answer_drafts
+from utils.exam_monitor import init_exam_monitor
+from utils.exam_surge import init_exam_surge
+from utils.exam_timer import init_exam_timer
+from utils.bootstrap import init_bootstrap
+from utils.identity_cache import init_identity_cache, load_identity
+from utils.notification_counters import init_notification_counters
+from utils.paper_totals import init_paper_totals
+from utils.question_import import init_question_import
+from utils.question_search import init_question_search
+from utils.set_generator import init_set_generator
+from utils.scheduler import scheduler
+from utils.perf import perf_monitor
+from utils.query_audit import init_query_audit
+from utils.regrade import init_regrade
+from utils.set_allocation import init_set_allocation
+from utils.sqlite_profile import init_sqlite_profile
+from utils.write_queue import write_queue
 from config import Config
-from models import PasswordResetToken, User, Admin, SchoolClass, StudentProfile, TeacherProfile, ParentProfile, Exam, Quiz, ExamSet, PasswordResetRequest
+from models import PasswordResetToken, StudentProfile, TeacherProfile, ParentProfile, Exam, Quiz, ExamSet, PasswordResetRequest
 
 # Import blueprints after monkey patching and flask imports
 from admin_routes import admin_bp
@@ -23,7 +40,6 @@ from vclass_routes import vclass_bp
 app = Flask(__name__)
 app.config.from_object(Config)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///lms.db"  # or your DB
 #app.config['MAIL_BACKEND'] = "console" for local development testing
 app.config['MAIL_SERVER'] = "smtp.gmail.com"
 app.config['MAIL_PORT'] = 587
@@ -40,10 +56,28 @@ os.makedirs(app.config['PAYMENT_PROOF_FOLDER'], exist_ok=True)
 os.makedirs(app.config['RECEIPT_FOLDER'], exist_ok=True)
 os.makedirs(app.config['PROFILE_PICS_FOLDER'], exist_ok=True)
 
+init_sqlite_profile(app)
 db.init_app(app)
+write_queue.init_app(app)
 mail.init_app(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, render_as_batch=True)
 csrf = CSRFProtect(app)
+perf_monitor.init_app(app)
+init_bootstrap(app)
+init_identity_cache(app)
+scheduler.init_app(app)
+init_notification_counters(app, scheduler)
+init_answer_drafts(app, scheduler)
+init_exam_surge(app, scheduler)
+init_exam_timer(app, scheduler)
+init_exam_monitor(app, scheduler)
+init_query_audit(app)
+init_regrade(app)
+init_set_allocation(app)
+init_paper_totals(app)
+init_question_search(app)
+init_question_import(app)
+init_set_generator(app)
 
 @app.context_processor
 def csrf_context():
@@ -52,7 +86,9 @@ def csrf_context():
 @app.after_request
 def set_headers(response):
     response.headers['X-Content-Type-Options'] = 'nosniff'
-    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    # Private responses (e.g. exam papers) set their own revalidation policy.
+    if not response.cache_control.private:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
     return response
 
 login_manager = LoginManager(app)
@@ -76,10 +112,9 @@ app.register_blueprint(vclass_bp, url_prefix="/vclass")
 
 @login_manager.user_loader
 def load_user(user_id):
-    if user_id.startswith("admin:"):
-        return Admin.query.filter_by(admin_id=user_id.split(":", 1)[1]).first()
-    elif user_id.startswith("user:"):
-        return User.query.filter_by(user_id=user_id.split(":", 1)[1]).first()
+    # Served from utils/identity_cache.py; falls back to one joined query.
+    if user_id.startswith(("admin:", "user:")):
+        return load_identity(user_id)
     return None
 
 @app.context_processor
@@ -145,25 +180,5 @@ def logout():
     return redirect(url_for('select_portal'))
 
 
-@app.before_request
-def initialize_database():
-    db.create_all()
-
-    super_admin = Admin.query.filter_by(username='SuperAdmin').first()
-    if not super_admin:
-        admin = Admin(username='SuperAdmin', admin_id='ADM001')
-        admin.set_password('Password123')
-        db.session.add(admin)
-        db.session.commit()
-        print("SuperAdmin created.")
-
-    existing_classes = {cls.name for cls in SchoolClass.query.all()}
-    default_classes = [name for name, _ in get_class_choices()]
-    for class_name in default_classes:
-        if class_name not in existing_classes:
-            db.session.add(SchoolClass(name=class_name))
-    db.session.commit()
-
-
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=False)
@@ -0,0 +1,81 @@
+# benchmarks/bench_bootstrap.py
+"""
+Compare per-request database work before and after the bootstrap stage.
+
+    python benchmarks/bench_bootstrap.py --requests 200
+
+"legacy" replays the old per-request initialize_database() work on each
+request; "bootstrap" uses the one-time hook from utils/bootstrap.py. The
+script reports how many SQL statements each request issues on top of the
+view itself, plus wall time.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_workdir = tempfile.mkdtemp(prefix='lms-bench-')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_workdir, 'bench.db'))
+os.chdir(_workdir)  # upload folders are created relative to cwd
+
+from sqlalchemy import event  # noqa: E402
+
+from app import app  # noqa: E402
+from utils.bootstrap import bootstrap_database, ensure_bootstrapped  # noqa: E402
+from utils.extensions import db  # noqa: E402
+
+app.config['BOOTSTRAP_LOCK_FILE'] = os.path.join(_workdir, 'bootstrap.lock')
+
+PATHS = ['/portal', '/routes', '/student/results-test']
+
+
+def run(mode, n):
+    counter = {'statements': 0}
+
+    def _count(*_args, **_kwargs):
+        counter['statements'] += 1
+
+    with app.app_context():
+        ensure_bootstrapped(app)
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _count)
+
+    client = app.test_client()
+    try:
+        started = time.perf_counter()
+        for i in range(n):
+            if mode == 'legacy':
+                with app.app_context():
+                    bootstrap_database(app)
+            client.get(PATHS[i % len(PATHS)])
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(engine, 'before_cursor_execute', _count)
+
+    return {
+        'mode': mode,
+        'requests': n,
+        'statements': counter['statements'],
+        'statements_per_request': counter['statements'] / n,
+        'ms_per_request': elapsed * 1000 / n,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    for mode in ('legacy', 'bootstrap'):
+        r = run(mode, args.requests)
+        print(f"{r['mode']:10s} {r['requests']:5d} req  "
+              f"{r['statements_per_request']:6.2f} stmts/req  "
+              f"{r['ms_per_request']:7.3f} ms/req")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+# benchmarks/bench_exam_dashboard.py
+"""
+SQL statements per exam dashboard view as the number of exams grows.
+
+    python benchmarks/bench_exam_dashboard.py --exams 10 100 500 --requests 20
+
+For each size the script fills a scratch database with that many exams
+per class (12 classes, spread over two academic years, about half of
+the student's past exams submitted), then loads /exam/dashboard and
+/exam/exams as one student. "legacy" replays the old view body (every
+exam in the school, then one submission query per exam) for comparison.
+Statements are counted per request, including the login lookup, so the
+new views should show the same count at every size.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_workdir = tempfile.mkdtemp(prefix='lms-bench-')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_workdir, 'bench.db'))
+os.environ.setdefault('SCHEDULER_ENABLED', '0')
+os.chdir(_workdir)  # upload folders are created relative to cwd
+
+from sqlalchemy import event, insert  # noqa: E402
+
+from app import app  # noqa: E402
+from models import AcademicYear, Exam, ExamSubmission, StudentProfile, User  # noqa: E402
+from utils.bootstrap import bootstrap_database  # noqa: E402
+from utils.extensions import db  # noqa: E402
+from utils.helpers import get_class_choices  # noqa: E402
+
+app.config.update(BOOTSTRAP_LOCK_FILE=os.path.join(_workdir, 'bootstrap.lock'), WTF_CSRF_ENABLED=False)
+
+STUDENT = 'STD000'
+CLASS = 'JHS 1'
+
+
+def seed(exams_per_class):
+    """Fresh tables with ``exams_per_class`` exams in every class; returns the student pk."""
+    db.drop_all()
+    db.create_all()
+    bootstrap_database(app)
+
+    today = date.today()
+    for offset in (1, 0):
+        start = date(today.year - offset, 1, 1)
+        db.session.add(AcademicYear(
+            start_date=start, end_date=date(start.year, 12, 31),
+            semester_1_start=start, semester_1_end=date(start.year, 6, 30),
+            semester_2_start=date(start.year, 7, 1), semester_2_end=date(start.year, 12, 31),
+        ))
+    student = User(user_id=STUDENT, username='bench', first_name='Bench', last_name='Student',
+                   role='student')
+    student.set_password('Password123')
+    db.session.add(student)
+    db.session.add(StudentProfile(user_id=STUDENT, current_class=CLASS))
+    db.session.flush()
+
+    now = datetime.utcnow()
+    span = timedelta(days=720)
+    rows = []
+    for class_name, _ in get_class_choices():
+        for i in range(exams_per_class):
+            start = now - span + span * 1.2 * i / max(exams_per_class, 1)
+            rows.append({'subject': 'Mathematics', 'title': f'{class_name} exam {i}',
+                         'assigned_class': class_name, 'start_datetime': start,
+                         'end_datetime': start + timedelta(hours=2), 'duration_minutes': 60,
+                         'assignment_mode': 'random', 'paper_version': 1})
+    db.session.execute(insert(Exam.__table__), rows)
+
+    past = Exam.query.filter(Exam.assigned_class == CLASS, Exam.end_datetime < now).all()
+    if past:
+        db.session.execute(insert(ExamSubmission.__table__), [
+            {'exam_id': exam.id, 'student_id': student.id, 'score': 1.0, 'submitted_at': exam.end_datetime}
+            for exam in past[::2]
+        ])
+    db.session.commit()
+    return student.id
+
+
+def legacy_dashboard(student_id):
+    now = datetime.utcnow()
+    for exam in Exam.query.all():
+        ExamSubmission.query.filter_by(exam_id=exam.id, student_id=student_id).first()
+        _ = exam.start_datetime <= now <= exam.end_datetime
+
+
+def run(exams_per_class, n):
+    with app.app_context():
+        student_id = seed(exams_per_class)
+        engine = db.engine
+
+    counter = {'statements': 0}
+
+    def _count(*_args, **_kwargs):
+        counter['statements'] += 1
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = f'user:{STUDENT}'
+        sess['_fresh'] = True
+    client.get('/exam/dashboard')  # warm caches (identity, templates)
+
+    results = {}
+    event.listen(engine, 'before_cursor_execute', _count)
+    try:
+        for mode in ('legacy', 'dashboard', 'exams'):
+            counter['statements'] = 0
+            started = time.perf_counter()
+            for _ in range(n):
+                if mode == 'legacy':
+                    with app.app_context():
+                        legacy_dashboard(student_id)
+                else:
+                    response = client.get('/exam/dashboard' if mode == 'dashboard' else '/exam/exams')
+                    assert response.status_code == 200, response.status_code
+            results[mode] = (counter['statements'] / n, (time.perf_counter() - started) * 1000 / n)
+    finally:
+        event.remove(engine, 'before_cursor_execute', _count)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--exams', type=int, nargs='+', default=[10, 100, 500],
+                        help="Exams per class (12 classes).")
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'exams':>7s}  {'mode':10s} {'stmts/req':>9s} {'ms/req':>9s}")
+    for size in args.exams:
+        for mode, (statements, ms) in run(size, args.requests).items():
+            print(f"{size * 12:7d}  {mode:10s} {statements:9.2f} {ms:9.3f}")
+
+
+if __name__ == '__main__':
+    main()
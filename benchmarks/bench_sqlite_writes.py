@@ -0,0 +1,156 @@
+# benchmarks/bench_sqlite_writes.py
+"""
+Write-contention stress test for the SQLite engine profile and write queue.
+
+    python benchmarks/bench_sqlite_writes.py --processes 4 --threads 8 --seconds 10
+
+Simulates gunicorn workers: each process runs ``--threads`` request threads
+that repeatedly read a student's course registrations and then replace them
+(student_routes.replace_course_registrations), as course registration does
+at peak. Three configurations run against a fresh database each:
+
+  baseline   driver defaults (rollback journal, no pragmas), inline commits
+  profile    SQLITE_PRAGMAS profile (WAL, busy_timeout, ...), inline commits
+  queue      profile + WRITE_QUEUE single-writer group commit
+
+Reports committed writes/s, "database is locked" errors and latency.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = {
+    'baseline': {'SQLITE_PROFILE': '0', 'WRITE_QUEUE': '0'},
+    'profile': {'SQLITE_PROFILE': '1', 'WRITE_QUEUE': '0'},
+    'queue': {'SQLITE_PROFILE': '1', 'WRITE_QUEUE': '1'},
+}
+
+
+def _import_app(db_path, mode, workdir):
+    os.environ.update(MODES[mode])
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    os.environ['SCHEDULER_ENABLED'] = '0'
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    from app import app
+    return app
+
+
+def _worker(proc_index, db_path, mode, workdir, threads, seconds, out):
+    app = _import_app(db_path, mode, workdir)
+    from sqlalchemy.exc import OperationalError
+
+    from models import StudentCourseRegistration
+    from student_routes import replace_course_registrations
+    from utils.write_queue import run_write
+
+    lock = threading.Lock()
+    totals = {'ok': 0, 'locked': 0, 'errors': 0, 'latencies': []}
+    stop_at = time.monotonic() + seconds
+
+    def request_thread(thread_index):
+        student_id = proc_index * 1000 + thread_index + 1
+        n = 0
+        while time.monotonic() < stop_at:
+            n += 1
+            course_ids = {(n + k) % 12 + 1 for k in range(4)}
+            started = time.perf_counter()
+            outcome = 'ok'
+            with app.app_context():
+                try:
+                    StudentCourseRegistration.query.filter_by(student_id=student_id).all()
+                    run_write(replace_course_registrations, student_id, '1', '2025/2026', course_ids)
+                except OperationalError as exc:
+                    outcome = 'locked' if 'locked' in str(exc) else 'errors'
+                except Exception:
+                    outcome = 'errors'
+            elapsed = time.perf_counter() - started
+            with lock:
+                totals[outcome] += 1
+                if outcome == 'ok':
+                    totals['latencies'].append(elapsed)
+
+    pool = [threading.Thread(target=request_thread, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    out.put(totals)
+
+
+def run_mode(mode, processes, threads, seconds):
+    workdir = tempfile.mkdtemp(prefix=f'lms-writes-{mode}-')
+    db_path = os.path.join(workdir, 'writes.db')
+
+    ctx = multiprocessing.get_context('spawn')
+    setup = ctx.Process(target=_setup, args=(db_path, mode, workdir))
+    setup.start()
+    setup.join()
+
+    out = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(i, db_path, mode, workdir, threads, seconds, out))
+        for i in range(processes)
+    ]
+    started = time.perf_counter()
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    wall = time.perf_counter() - started
+
+    ok = sum(r['ok'] for r in results)
+    locked = sum(r['locked'] for r in results)
+    errors = sum(r['errors'] for r in results)
+    latencies = sorted(x for r in results for x in r['latencies'])
+    attempts = ok + locked + errors
+    return {
+        'mode': mode,
+        'writes_ok': ok,
+        'lock_errors': locked,
+        'other_errors': errors,
+        'lock_error_rate': round(locked / attempts, 4) if attempts else None,
+        'writes_per_sec': round(ok / wall, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else None,
+    }
+
+
+def _setup(db_path, mode, workdir):
+    app = _import_app(db_path, mode, workdir)
+    from utils.bootstrap import bootstrap_database
+    app.config['BOOTSTRAP_LOCK_FILE'] = os.path.join(workdir, 'bootstrap.lock')
+    with app.app_context():
+        bootstrap_database(app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite write-contention benchmark.")
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--json', action='store_true', help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    rows = [run_mode(m, args.processes, args.threads, args.seconds) for m in args.modes.split(',')]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    for r in rows:
+        print(f"{r['mode']:9s} {r['writes_per_sec']:8.1f} writes/s  "
+              f"locked {r['lock_errors']:5d} ({(r['lock_error_rate'] or 0) * 100:5.2f}%)  "
+              f"errors {r['other_errors']:4d}  p50 {r['p50_ms']} ms  p95 {r['p95_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,376 @@
+# benchmarks/dataset.py
+"""
+Deterministic synthetic school dataset for benchmarks.
+
+    DATABASE_URL=sqlite:////tmp/lms-bench.db python benchmarks/dataset.py --students 5000 --seed 7
+
+Fills students (spread over get_class_choices()), parents with
+ParentChildLink rows, teachers with course assignments, courses, exams with
+question pools / sets / options, quizzes, attendance history, fee
+structures, balances and transactions. Rows are written with bulk
+``INSERT ... VALUES`` batches and explicit primary keys, so a run with the
+same seed and scale always produces the same rows (dates are relative to
+the time of the run).
+
+Every generated account uses the password ``Password123`` (hashed once).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+FIRST_NAMES = ['Kwame', 'Ama', 'Kofi', 'Akosua', 'Yaw', 'Abena', 'Kojo', 'Efua', 'Kwabena', 'Adwoa',
+               'Kwaku', 'Afua', 'Joseph', 'Grace', 'Daniel', 'Esther', 'Samuel', 'Mercy', 'Isaac', 'Ruth']
+LAST_NAMES = ['Mensah', 'Owusu', 'Boateng', 'Asante', 'Osei', 'Addo', 'Appiah', 'Lamptey', 'Quaye',
+              'Tetteh', 'Agyei', 'Danso', 'Amoah', 'Ofori', 'Sarpong', 'Nkrumah']
+SUBJECTS = ['Mathematics', 'English', 'Science', 'Social Studies', 'ICT', 'French',
+            'Religious & Moral Education', 'Creative Arts']
+
+PASSWORD = 'Password123'
+ACADEMIC_YEAR = '2025/2026'
+SEMESTERS = ['1', '2']
+BATCH = 2000
+
+
+@dataclass
+class Scale:
+    students: int = 2000
+    teachers: int = 40
+    parent_ratio: float = 0.8         # parents per student
+    courses_per_class: int = len(SUBJECTS)
+    exams_per_class: int = 3
+    sets_per_exam: int = 3
+    pool_per_exam: int = 60
+    questions_per_set: int = 20
+    quizzes_per_class: int = 4
+    questions_per_quiz: int = 15
+    attendance_days: int = 20
+    fees_per_class: int = 3
+    transactions_per_student: int = 2
+    exam_submission_rate: float = 0.5  # share of students with a submission for each ended exam
+
+
+@dataclass
+class Dataset:
+    """Ids of generated rows, for benchmark drivers."""
+    seed: int
+    scale: Scale
+    classes: list = field(default_factory=list)
+    students: list = field(default_factory=list)      # (user pk, user_id, class)
+    teachers: list = field(default_factory=list)      # (user pk, user_id, teacher_profile id)
+    parents: list = field(default_factory=list)       # (user pk, user_id)
+    live_exams: dict = field(default_factory=dict)    # class -> exam id (currently open)
+    exam_sets: dict = field(default_factory=dict)     # exam id -> [set ids]
+    set_questions: dict = field(default_factory=dict)  # set id -> [(question id, [option ids], correct id)]
+    counts: dict = field(default_factory=dict)
+
+
+class _Ids:
+    """Hands out explicit primary keys above whatever is already in a table."""
+
+    def __init__(self, db):
+        self.db = db
+        self.next = {}
+
+    def take(self, model, n=1):
+        from sqlalchemy import func
+        table = model.__table__
+        if table.name not in self.next:
+            current = self.db.session.query(func.max(table.c.id)).scalar() or 0
+            self.next[table.name] = current + 1
+        start = self.next[table.name]
+        self.next[table.name] += n
+        return range(start, start + n)
+
+
+def _bulk(db, model, rows, counts):
+    if not rows:
+        return
+    table = model.__table__
+    for i in range(0, len(rows), BATCH):
+        db.session.execute(table.insert(), rows[i:i + BATCH])
+    counts[table.name] = counts.get(table.name, 0) + len(rows)
+
+
+def generate(scale=None, seed=42, now=None):
+    """Insert a dataset into the current app's database and return a ``Dataset``."""
+    from werkzeug.security import generate_password_hash
+
+    from models import (
+        User, StudentProfile, TeacherProfile, ParentProfile, ParentChildLink, Course,
+        TeacherCourseAssignment, Exam, ExamSet, ExamQuestion, ExamOption, ExamSetQuestion,
+        ExamSubmission, Quiz, Question, Option, StudentQuizSubmission, AttendanceRecord,
+        ClassFeeStructure, StudentFeeBalance, StudentFeeTransaction,
+    )
+    from utils.extensions import db
+    from utils.helpers import get_class_choices
+
+    scale = scale or Scale()
+    rng = random.Random(seed)
+    now = now or datetime.utcnow().replace(microsecond=0)
+    ids = _Ids(db)
+    data = Dataset(seed=seed, scale=scale)
+    counts = data.counts
+    password_hash = generate_password_hash(PASSWORD)
+    classes = [name for name, _ in get_class_choices()]
+    data.classes = classes
+
+    def person(prefix, n):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        user_id = f"{prefix}{seed:02d}{n:05d}"
+        return {
+            'user_id': user_id, 'username': f"{first.lower()}.{last.lower()}{n}",
+            'email': f"{user_id.lower()}@example.school", 'first_name': first,
+            'middle_name': None, 'last_name': last, 'password_hash': password_hash,
+            'profile_picture': 'default.png',
+        }
+
+    # --- users & profiles ------------------------------------------------
+    users, students, teachers, parents, links = [], [], [], [], []
+    student_ids = ids.take(User, scale.students)
+    student_profile_ids = ids.take(StudentProfile, scale.students)
+    for n, (pk, sp_id) in enumerate(zip(student_ids, student_profile_ids), 1):
+        row = person('STD', n)
+        klass = classes[n % len(classes)]
+        users.append(dict(row, id=pk, role='student'))
+        students.append({
+            'id': sp_id, 'user_id': row['user_id'], 'current_class': klass,
+            'academic_year': ACADEMIC_YEAR, 'gender': rng.choice(['Male', 'Female']),
+            'dob': date(2010, 1, 1) + timedelta(days=rng.randrange(3650)), 'is_graduated': False,
+        })
+        data.students.append((pk, row['user_id'], klass))
+
+    teacher_user_ids = ids.take(User, scale.teachers)
+    teacher_profile_ids = ids.take(TeacherProfile, scale.teachers)
+    for n, (pk, tp_id) in enumerate(zip(teacher_user_ids, teacher_profile_ids), 1):
+        row = person('TCH', n)
+        users.append(dict(row, id=pk, role='teacher'))
+        teachers.append({
+            'id': tp_id, 'user_id': row['user_id'], 'employee_id': f"EMP{seed:02d}{n:05d}",
+            'department': rng.choice(SUBJECTS), 'date_joined': date(2020, 9, 1),
+        })
+        data.teachers.append((pk, row['user_id'], tp_id))
+
+    n_parents = int(scale.students * scale.parent_ratio)
+    parent_user_ids = ids.take(User, n_parents)
+    parent_profile_ids = ids.take(ParentProfile, n_parents)
+    for n, (pk, pp_id) in enumerate(zip(parent_user_ids, parent_profile_ids), 1):
+        row = person('PAR', n)
+        users.append(dict(row, id=pk, role='parent'))
+        parents.append({'id': pp_id, 'user_id': row['user_id'], 'relationship_to_student': 'Guardian'})
+        data.parents.append((pk, row['user_id']))
+
+    # every student gets one parent; some parents end up with siblings
+    link_ids = ids.take(ParentChildLink, scale.students) if n_parents else []
+    for link_id, sp_id in zip(link_ids, student_profile_ids):
+        links.append({'id': link_id, 'parent_id': rng.choice(parent_profile_ids), 'student_id': sp_id})
+
+    _bulk(db, User, users, counts)
+    _bulk(db, StudentProfile, students, counts)
+    _bulk(db, TeacherProfile, teachers, counts)
+    _bulk(db, ParentProfile, parents, counts)
+    _bulk(db, ParentChildLink, links, counts)
+
+    # --- courses & teaching assignments -----------------------------------
+    courses, assignments, course_by_class = [], [], {}
+    subjects = SUBJECTS[:scale.courses_per_class]
+    course_ids = iter(ids.take(Course, len(classes) * len(subjects)))
+    for ci, klass in enumerate(classes):
+        for si, subject in enumerate(subjects):
+            cid = next(course_ids)
+            courses.append({
+                'id': cid, 'name': subject, 'code': f"S{seed}-C{ci:02d}-{si:02d}",
+                'assigned_class': klass, 'semester': '1', 'academic_year': ACADEMIC_YEAR,
+                'is_mandatory': si < 5,
+                'registration_start': now - timedelta(days=30), 'registration_end': now + timedelta(days=30),
+            })
+            course_by_class.setdefault(klass, []).append(cid)
+    tca_ids = iter(ids.take(TeacherCourseAssignment, len(courses)))
+    teacher_for_course = {}
+    for i, course in enumerate(courses):
+        tp_id = teacher_profile_ids[i % len(teacher_profile_ids)]
+        teacher_for_course[course['id']] = tp_id
+        assignments.append({'id': next(tca_ids), 'teacher_id': tp_id, 'course_id': course['id']})
+    _bulk(db, Course, courses, counts)
+    _bulk(db, TeacherCourseAssignment, assignments, counts)
+
+    # --- exams ------------------------------------------------------------
+    exams, sets, questions, options, set_links = [], [], [], [], []
+    exam_windows = [
+        (now - timedelta(hours=1), now + timedelta(days=2)),                      # live
+        (now - timedelta(days=20), now - timedelta(days=19)),                     # ended
+        (now + timedelta(days=10), now + timedelta(days=10, hours=2)),            # upcoming
+    ]
+    exam_ids = iter(ids.take(Exam, len(classes) * scale.exams_per_class))
+    ended_exam_sets = []
+    for klass in classes:
+        for e in range(scale.exams_per_class):
+            exam_id = next(exam_ids)
+            start, end = exam_windows[e % len(exam_windows)]
+            subject = subjects[e % len(subjects)]
+            exams.append({
+                'id': exam_id, 'subject': subject, 'title': f"{subject} Exam {e + 1} ({klass})",
+                'assigned_class': klass, 'duration_minutes': 60, 'start_datetime': start,
+                'end_datetime': end, 'created_at': now - timedelta(days=30),
+                'assignment_mode': 'hash', 'assignment_seed': str(seed),
+            })
+            if e == 0:
+                data.live_exams[klass] = exam_id
+
+            pool = []
+            q_ids = ids.take(ExamQuestion, scale.pool_per_exam)
+            for q_id in q_ids:
+                marks = rng.choice([1, 1, 2, 3])
+                questions.append({
+                    'id': q_id, 'exam_id': exam_id, 'question_type': 'mcq', 'marks': marks,
+                    'question_text': f"[{subject}] Q{q_id}: which option is correct? "
+                                     f"{rng.choice(FIRST_NAMES)} {rng.randrange(1000)}",
+                })
+                opt_ids = list(ids.take(ExamOption, 4))
+                correct = rng.choice(opt_ids)
+                for k, opt_id in enumerate(opt_ids):
+                    options.append({'id': opt_id, 'question_id': q_id, 'text': f"Option {'ABCD'[k]}",
+                                    'is_correct': opt_id == correct})
+                pool.append((q_id, opt_ids, correct))
+
+            data.exam_sets[exam_id] = []
+            for s in range(scale.sets_per_exam):
+                set_id = ids.take(ExamSet)[0]
+                chosen = rng.sample(pool, min(scale.questions_per_set, len(pool)))
+                sets.append({'id': set_id, 'exam_id': exam_id, 'name': f"Set {'ABCDEFGH'[s % 8]}",
+                             'access_password': 'pass'})
+                for order, (q_id, _, _) in enumerate(chosen, 1):
+                    set_links.append({'id': ids.take(ExamSetQuestion)[0], 'set_id': set_id,
+                                      'question_id': q_id, 'order': order})
+                data.exam_sets[exam_id].append(set_id)
+                data.set_questions[set_id] = chosen
+            if end < now:
+                ended_exam_sets.append((exam_id, klass, data.exam_sets[exam_id]))
+    _bulk(db, Exam, exams, counts)
+    _bulk(db, ExamSet, sets, counts)
+    _bulk(db, ExamQuestion, questions, counts)
+    _bulk(db, ExamOption, options, counts)
+    _bulk(db, ExamSetQuestion, set_links, counts)
+
+    submissions = []
+    for exam_id, klass, set_ids in ended_exam_sets:
+        for pk, _, sk in data.students:
+            if sk == klass and rng.random() < scale.exam_submission_rate:
+                submissions.append({
+                    'id': ids.take(ExamSubmission)[0], 'exam_id': exam_id, 'student_id': pk,
+                    'set_id': rng.choice(set_ids), 'score': float(rng.randrange(0, 30)),
+                    'submitted_at': now - timedelta(days=19, minutes=rng.randrange(60)),
+                })
+    _bulk(db, ExamSubmission, submissions, counts)
+
+    # --- quizzes ----------------------------------------------------------
+    quizzes, quiz_questions, quiz_options, quiz_subs = [], [], [], []
+    for klass in classes:
+        for z in range(scale.quizzes_per_class):
+            quiz_id = ids.take(Quiz)[0]
+            start = now - timedelta(days=7 * (z + 1))
+            quizzes.append({
+                'id': quiz_id, 'subject': subjects[z % len(subjects)], 'title': f"Quiz {z + 1} ({klass})",
+                'assigned_class': klass, 'date': start.date(), 'duration_minutes': 20,
+                'start_datetime': start, 'end_datetime': start + timedelta(days=3), 'attempts_allowed': 1,
+            })
+            for _ in range(scale.questions_per_quiz):
+                q_id = ids.take(Question)[0]
+                quiz_questions.append({'id': q_id, 'quiz_id': quiz_id, 'text': f"Quiz question {q_id}",
+                                       'points': 1.0})
+                correct = rng.randrange(4)
+                for k, opt_id in enumerate(ids.take(Option, 4)):
+                    quiz_options.append({'id': opt_id, 'question_id': q_id, 'text': f"Choice {k + 1}",
+                                         'is_correct': k == correct})
+            for pk, _, sk in data.students:
+                if sk == klass and rng.random() < 0.7:
+                    quiz_subs.append({
+                        'id': ids.take(StudentQuizSubmission)[0], 'student_id': pk, 'quiz_id': quiz_id,
+                        'score': float(rng.randrange(scale.questions_per_quiz + 1)),
+                        'submitted_at': start + timedelta(hours=rng.randrange(48)),
+                    })
+    _bulk(db, Quiz, quizzes, counts)
+    _bulk(db, Question, quiz_questions, counts)
+    _bulk(db, Option, quiz_options, counts)
+    _bulk(db, StudentQuizSubmission, quiz_subs, counts)
+
+    # --- attendance -------------------------------------------------------
+    attendance = []
+    days = [now.date() - timedelta(days=d) for d in range(1, scale.attendance_days * 7 // 5 + 2)
+            if (now.date() - timedelta(days=d)).weekday() < 5][:scale.attendance_days]
+    att_ids = iter(ids.take(AttendanceRecord, len(days) * len(data.students)))
+    for pk, _, klass in data.students:
+        course_id = course_by_class[klass][0]
+        teacher_id = teacher_for_course[course_id]
+        for day in days:
+            attendance.append({'id': next(att_ids), 'student_id': pk, 'teacher_id': teacher_id,
+                               'course_id': course_id, 'date': day, 'is_present': rng.random() < 0.9})
+    _bulk(db, AttendanceRecord, attendance, counts)
+
+    # --- fees -------------------------------------------------------------
+    fees, balances, transactions = [], [], []
+    fee_total = {}
+    for klass in classes:
+        for semester in SEMESTERS:
+            for f in range(scale.fees_per_class):
+                amount = float(rng.choice([150, 200, 250, 300, 450]))
+                fees.append({'id': ids.take(ClassFeeStructure)[0], 'class_level': klass,
+                             'academic_year': ACADEMIC_YEAR, 'semester': semester,
+                             'description': f"Fee item {f + 1}", 'amount': amount,
+                             'created_at': now - timedelta(days=60)})
+                fee_total[(klass, semester)] = fee_total.get((klass, semester), 0.0) + amount
+    for pk, _, klass in data.students:
+        for semester in SEMESTERS:
+            paid = 0.0
+            for t in range(scale.transactions_per_student):
+                amount = float(rng.choice([50, 100, 150]))
+                paid += amount
+                transactions.append({
+                    'id': ids.take(StudentFeeTransaction)[0], 'student_id': pk,
+                    'academic_year': ACADEMIC_YEAR, 'semester': semester, 'amount': amount,
+                    'description': f"Payment {t + 1}", 'is_approved': rng.random() < 0.8,
+                    'timestamp': now - timedelta(days=rng.randrange(1, 50)),
+                })
+            balances.append({'id': ids.take(StudentFeeBalance)[0], 'student_id': pk,
+                             'academic_year': ACADEMIC_YEAR, 'semester': semester,
+                             'balance': fee_total[(klass, semester)] - paid, 'updated_on': now})
+    _bulk(db, ClassFeeStructure, fees, counts)
+    _bulk(db, StudentFeeBalance, balances, counts)
+    _bulk(db, StudentFeeTransaction, transactions, counts)
+
+    db.session.commit()
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic LMS dataset.")
+    parser.add_argument('--students', type=int, default=Scale.students)
+    parser.add_argument('--teachers', type=int, default=Scale.teachers)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    os.environ.setdefault('SCHEDULER_ENABLED', '0')
+    from app import app
+    from utils.bootstrap import bootstrap_database
+
+    with app.app_context():
+        bootstrap_database(app)
+        started = time.perf_counter()
+        data = generate(Scale(students=args.students, teachers=args.teachers), seed=args.seed)
+        elapsed = time.perf_counter() - started
+
+    for table, n in sorted(data.counts.items()):
+        print(f"{table:32s} {n:8d}")
+    print(f"Generated {sum(data.counts.values())} rows in {elapsed:.1f}s "
+          f"into {app.config['SQLALCHEMY_DATABASE_URI']}")
+
+
+if __name__ == '__main__':
+    main()
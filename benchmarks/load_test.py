@@ -0,0 +1,204 @@
+# benchmarks/load_test.py
+"""
+End-to-end load benchmark over the main student/teacher routes.
+
+    python benchmarks/load_test.py --students 2000 --users 16 --iterations 10 --output run.json
+
+Builds a fresh synthetic dataset (benchmarks/dataset.py) in a scratch
+SQLite database unless DATABASE_URL is set. Then it runs ``--users``
+simulated users on threads, each with its own Flask test client and
+logged-in session. Each iteration a student hits the vclass dashboard,
+both results pages, the fee page and their open exam paper; the exam is
+submitted once at the end. Teachers load the attendance sheet for a class.
+
+The JSON report has p50/p95/p99 latency, throughput and SQL statements per
+request for each route, so runs can be diffed.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_invoked_from = os.getcwd()
+_workdir = tempfile.mkdtemp(prefix='lms-load-')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_workdir, 'load.db'))
+os.environ.setdefault('SCHEDULER_ENABLED', '0')
+os.chdir(_workdir)  # upload folders are created relative to cwd
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+from app import app  # noqa: E402
+from benchmarks.dataset import Scale, generate  # noqa: E402
+from models import ExamAttempt  # noqa: E402
+from utils.bootstrap import bootstrap_database  # noqa: E402
+from utils.extensions import db  # noqa: E402
+
+_local = threading.local()
+attempt_sets = {}  # attempt id -> set id
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(*_args, **_kwargs):
+    _local.statements = getattr(_local, 'statements', 0) + 1
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}  # route -> [(seconds, statements, status)]
+
+    def call(self, route, fn):
+        _local.statements = 0
+        started = time.perf_counter()
+        response = fn()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples.setdefault(route, []).append((elapsed, _local.statements, response.status_code))
+        return response
+
+    def report(self, wall_seconds):
+        routes = {}
+        total = 0
+        for route, samples in sorted(self.samples.items()):
+            latencies = sorted(s[0] * 1000 for s in samples)
+            total += len(samples)
+            routes[route] = {
+                'requests': len(samples),
+                'errors': sum(1 for s in samples if s[2] >= 400),
+                'redirects': sum(1 for s in samples if 300 <= s[2] < 400),
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+                'mean_ms': round(sum(latencies) / len(latencies), 2),
+                'queries_per_request': round(sum(s[1] for s in samples) / len(samples), 2),
+            }
+        return {
+            'requests': total,
+            'wall_seconds': round(wall_seconds, 3),
+            'throughput_rps': round(total / wall_seconds, 2) if wall_seconds else None,
+            'routes': routes,
+        }
+
+
+def _login(client, ident):
+    with client.session_transaction() as sess:
+        sess['_user_id'] = ident
+        sess['_fresh'] = True
+
+
+def student_session(recorder, data, student, attempt, iterations, rng):
+    pk, user_id, klass = student
+    client = app.test_client()
+    _login(client, f"user:{user_id}")
+    exam_id = data.live_exams[klass]
+
+    for _ in range(iterations):
+        recorder.call('vclass.dashboard', lambda: client.get('/vclass/dashboard'))
+        recorder.call('vclass.my_results', lambda: client.get('/vclass/my_results'))
+        recorder.call('student.my_results', lambda: client.get('/student/my_results'))
+        recorder.call('student.pay_fees', lambda: client.get(
+            '/student/pay-fees', query_string={'year': '2025/2026', 'semester': '1'}))
+        recorder.call('exam.take_exam', lambda: client.get(f'/exam/take-exam/{exam_id}/{attempt}'))
+
+    questions = data.set_questions[attempt_sets[attempt]]
+    form = {f"answers[{q_id}]": str(rng.choice(opts)) for q_id, opts, _ in questions}
+    recorder.call('exam.submit_exam', lambda: client.post(
+        f'/exam/submit_exam/{exam_id}', query_string={'attempt_id': attempt}, data=form))
+
+
+def teacher_session(recorder, data, teacher, iterations, rng):
+    _, user_id, _ = teacher
+    client = app.test_client()
+    _login(client, f"user:{user_id}")
+    for _ in range(iterations):
+        klass = rng.choice(data.classes)
+        recorder.call('teacher.attendance', lambda: client.get(
+            '/teacher/attendance', query_string={'classSelect': klass}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the LMS load benchmark.")
+    parser.add_argument('--students', type=int, default=2000, help="dataset size")
+    parser.add_argument('--users', type=int, default=16, help="concurrent simulated users")
+    parser.add_argument('--teacher-share', type=float, default=0.125,
+                        help="fraction of simulated users that are teachers")
+    parser.add_argument('--iterations', type=int, default=10, help="page loops per user")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="write the JSON report here as well as stdout")
+    args = parser.parse_args()
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        bootstrap_database(app)
+        started = time.perf_counter()
+        data = generate(Scale(students=args.students), seed=args.seed)
+        build_seconds = time.perf_counter() - started
+
+        n_teachers = max(1, int(args.users * args.teacher_share)) if data.teachers else 0
+        n_students = max(1, args.users - n_teachers)
+        students = rng.sample(data.students, min(n_students, len(data.students)))
+        attempts = []
+        for pk, _, klass in students:
+            exam_id = data.live_exams[klass]
+            set_id = rng.choice(data.exam_sets[exam_id])
+            attempt = ExamAttempt(exam_id=exam_id, set_id=set_id, student_id=pk)
+            db.session.add(attempt)
+            attempts.append(attempt)
+        db.session.commit()
+        attempt_ids = [a.id for a in attempts]
+        for a in attempts:
+            attempt_sets[a.id] = a.set_id
+        teachers = rng.sample(data.teachers, min(n_teachers, len(data.teachers)))
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        futures = [
+            pool.submit(student_session, recorder, data, s, a, args.iterations, random.Random(rng.random()))
+            for s, a in zip(students, attempt_ids)
+        ] + [
+            pool.submit(teacher_session, recorder, data, t, args.iterations, random.Random(rng.random()))
+            for t in teachers
+        ]
+        for f in futures:
+            f.result()
+    wall = time.perf_counter() - started
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'database': app.config['SQLALCHEMY_DATABASE_URI'],
+        'python': platform.python_version(),
+        'config': vars(args),
+        'dataset': {'seed': data.seed, 'rows': sum(data.counts.values()),
+                    'build_seconds': round(build_seconds, 2)},
+        **recorder.report(wall),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(os.path.join(_invoked_from, args.output), 'w') as fh:
+            fh.write(text)
+
+
+if __name__ == '__main__':
+    main()
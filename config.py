@@ -2,9 +2,94 @@ import os
 
 class Config:
     SECRET_KEY = 'secret-key-goes-here'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///lms.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///lms.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # SQLite connection profile (utils/sqlite_profile.py); SQLITE_PRAGMAS
+    # overrides the defaults there (WAL, busy_timeout, synchronous=NORMAL...).
+    SQLITE_PROFILE_ENABLED = os.environ.get('SQLITE_PROFILE', '1') != '0'
+    SQLITE_PRAGMAS = None
+
+    # Single-writer group-commit queue (utils/write_queue.py)
+    WRITE_QUEUE_ENABLED = os.environ.get('WRITE_QUEUE', '0') == '1'
+    WRITE_QUEUE_MAX_BATCH = 64
+    WRITE_QUEUE_MAX_DELAY_MS = 5
+    WRITE_QUEUE_TIMEOUT = 30
+
+    # Schema creation / seeding (see utils/bootstrap.py). Disable the
+    # first-request hook when deployments run `flask bootstrap-db` instead.
+    BOOTSTRAP_ON_FIRST_REQUEST = os.environ.get('BOOTSTRAP_ON_FIRST_REQUEST', '1') != '0'
+    BOOTSTRAP_LOCK_FILE = None  # defaults to <instance>/bootstrap.lock
+
+    # Identity cache for load_user (see utils/identity_cache.py). Point
+    # IDENTITY_CACHE_SHARED_PATH at a file to share entries across workers.
+    IDENTITY_CACHE_ENABLED = True
+    IDENTITY_CACHE_SIZE = 4096
+    IDENTITY_CACHE_TTL = 300
+    IDENTITY_CACHE_LOCAL_TTL = None
+    IDENTITY_CACHE_SHARED_PATH = os.environ.get('IDENTITY_CACHE_SHARED_PATH')
+
+    # Background jobs (utils/scheduler.py) and unread-counter reconciliation
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1') != '0'
+    NOTIFICATION_RECONCILE_INTERVAL = 900  # seconds; 0 disables the job
+
+    # Exam autosave drafts (utils/answer_drafts.py). Write-behind buffers saves
+    # per process and flushes them on the scheduler; off = write-through.
+    EXAM_DRAFT_WRITE_BEHIND = os.environ.get('EXAM_DRAFT_WRITE_BEHIND', '0') == '1'
+    EXAM_DRAFT_FLUSH_INTERVAL = 2  # seconds
+    EXAM_DRAFT_MAX_PENDING = 500
+
+    # Exam start surge control (utils/exam_surge.py). Papers are compiled and
+    # attempts pre-created this long before the start; concurrent attempt
+    # starts per process are capped, the rest get 503 + Retry-After.
+    EXAM_PREWARM_LEAD = 300  # seconds; 0 disables the job
+    EXAM_PREWARM_INTERVAL = 60
+    EXAM_ADMISSION_LIMIT = 8  # 0 disables the cap
+    EXAM_ADMISSION_WAIT = 0.5  # seconds to wait for a slot
+    EXAM_ADMISSION_RETRY_AFTER = 3
+
+    # Exam deadlines (utils/exam_timer.py): attempts still open this long past
+    # their deadline are auto-submitted from their drafts by a scheduler job.
+    EXAM_SUBMIT_GRACE = 30  # seconds; also how late a submit may still post answers
+    EXAM_SWEEP_INTERVAL = 30  # seconds; 0 disables the job
+    EXAM_SWEEP_BATCH = 200  # attempts per transaction
+
+    # Offline-capable exam delivery (utils/exam_package.py): the page loads a
+    # signed paper package once and syncs answers in compressed batches.
+    EXAM_PACKAGE_MODE = os.environ.get('EXAM_PACKAGE_MODE', '0') == '1'
+    EXAM_PACKAGE_SYNC_INTERVAL = 60  # seconds between answer syncs
+    EXAM_PACKAGE_MAX_AGE = 6 * 3600  # seconds a package token stays valid
+
+    # Live exam monitoring (utils/exam_monitor.py): in-memory counters fed by
+    # exam events, rebuilt from the database by a scheduler job.
+    EXAM_MONITOR_ACTIVE_WINDOW = 120  # seconds; keep above EXAM_PACKAGE_SYNC_INTERVAL
+    EXAM_MONITOR_RECONCILE_INTERVAL = 30  # seconds; 0 disables the job
+    EXAM_MONITOR_PUSH_INTERVAL = 2  # seconds between stream updates at most
+    EXAM_MONITOR_STREAM_MAX = 300  # seconds before a stream ends and the browser reconnects
+
+    # Request SQL instrumentation (utils/perf.py, /admin/perf). X-DB-* headers
+    # are sent when PERF_HEADERS is set, or in debug mode when left as None.
+    PERF_ENABLED = True
+    PERF_BUFFER_SIZE = 500
+    PERF_SLOW_STATEMENTS = 5
+    PERF_N_PLUS_ONE_THRESHOLD = 5
+    PERF_HEADERS = None
+
+    # `flask audit-queries` fails on full scans of tables at least this big.
+    QUERY_AUDIT_MIN_ROWS = 1000
+
+    # Exam re-grade (utils/regrade.py): submissions per transaction, and
+    # scoring processes per chunk (0 scores in the web/CLI process).
+    REGRADE_CHUNK_SIZE = 500
+    REGRADE_WORKERS = int(os.environ.get('REGRADE_WORKERS', '0'))
+
+    # Question import (utils/question_import.py): questions per bulk INSERT.
+    QUESTION_IMPORT_CHUNK = 500
+
+    # Set generator (utils/set_generator.py): default largest share of
+    # questions two generated sets may have in common.
+    EXAM_SET_MAX_OVERLAP = 0.2
+
     # Existing
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads', 'assignments')
     MATERIALS_FOLDER = os.path.join(os.getcwd(), 'uploads', 'materials')
@@ -1,10 +1,20 @@
 from flask import Blueprint, current_app, render_template, abort, redirect, url_for, flash, jsonify, session, send_from_directory, send_file
 from flask import request
 from flask_login import login_required, current_user, login_user
-from models import db, User, Quiz, StudentQuizSubmission, Question, StudentProfile, QuizAttempt, Assignment, CourseMaterial, StudentCourseRegistration, Course,  TimetableEntry, AcademicCalendar, AcademicYear, AppointmentSlot, AppointmentBooking, StudentFeeBalance, ClassFeeStructure, StudentFeeTransaction, Exam, ExamSubmission, ExamQuestion, ExamAttempt, ExamSet, ExamSetQuestion, Notification, NotificationRecipient
+from models import db, User, Quiz, StudentQuizSubmission, Question, StudentProfile, QuizAttempt, Assignment, CourseMaterial, StudentCourseRegistration, Course,  TimetableEntry, AcademicCalendar, AcademicYear, AppointmentSlot, AppointmentBooking, StudentFeeBalance, ClassFeeStructure, StudentFeeTransaction, Exam, ExamSubmission, ExamAnswer, ExamAttempt, ExamSet, Notification, NotificationRecipient
 from datetime import date, datetime, timedelta, time
-from sqlalchemy.orm import joinedload
+from sqlalchemy import insert
 from forms import ExamLoginForm   # adjust path depending on your project structure
+from utils.answer_drafts import apply_batch, exam_drafts, last_seq, parse_changes
+from utils.grading import answer_key_for_exam, answer_rows, answers_from_form
+from utils.exam_dashboard import academic_terms, select_term, student_exam_rows
+from utils.exam_monitor import exam_monitor
+from utils.exam_package import PackageError, build_package, compress, read_bundle, read_json, verify_token
+from utils.exam_papers import paper_for_exam
+from utils.exam_surge import exam_admission
+from utils.exam_timer import attempt_sweeper, seconds_left, start_attempt
+from utils.set_allocation import allocated_set
+from utils.write_queue import run_write
 
 
 exam_bp = Blueprint('exam', __name__, url_prefix='/exam')
@@ -44,48 +54,23 @@ def exam_dashboard():
         flash("Only students can access exams.", "danger")
         return redirect(url_for("exam.exam_login"))
 
-    exams = Exam.query.all()
-    now = datetime.utcnow()
-
-    # Prepare data for template
-    exam_data = []
-    for exam in exams:
-        submission = ExamSubmission.query.filter_by(
-            exam_id=exam.id,
-            student_id=current_user.id
-        ).first()
-        status = 'Upcoming'
-        if exam.start_datetime <= now <= exam.end_datetime:
-            status = 'Ongoing'
-        elif now > exam.end_datetime:
-            status = 'Ended'
-
-        exam_data.append({
-            "exam": exam,
-            "status": status,
-            "attempted": bool(submission),
-            "submission_id": submission.id if submission else None
-        })
-
-    return render_template('exam/dashboard.html', exams=exam_data)
+    exams, terms, term = _exam_listing()
+    return render_template('exam/dashboard.html', exams=exams, terms=terms, term=term)
 
 # --- EXAMS ---
 @exam_bp.route('/exams')
 @login_required
 def exams():
-    exams = Exam.query.all()
-    now = datetime.utcnow()  # or datetime.now() depending on your timezone handling
-
-    # add a temporary 'status' attribute to each exam
-    for exam in exams:
-        if exam.start_datetime <= now <= exam.end_datetime:
-            exam.status = 'Ongoing'
-        elif now < exam.start_datetime:
-            exam.status = 'Upcoming'
-        else:
-            exam.status = 'Ended'
+    exams, terms, term = _exam_listing()
+    return render_template('exam/exams.html', exams=exams, terms=terms, term=term)
 
-    return render_template('exam/exams.html', exams=exams)
+def _exam_listing():
+    """One term of exams (``?term=``) with status and the user's submission id."""
+    terms = academic_terms()
+    term = select_term(terms, request.args.get('term'))
+    # Students see their class only; staff see every class.
+    class_name = (current_user.current_class or '') if current_user.role == 'student' else None
+    return student_exam_rows(current_user.id, class_name, term), terms, term
 
 @exam_bp.route('/take-exam/<int:exam_id>/<int:attempt_id>')
 @login_required
@@ -116,43 +101,91 @@ def take_exam(exam_id, attempt_id):
         flash("You have already submitted this exam.", "danger")
         return redirect(url_for('student.exam_instructions', exam_id=exam.id, attempt_id=attempt.id))
 
-    # ✅ Load questions from assigned set (if any)
-    if attempt.set_id:
-        set_questions = (
-            db.session.query(ExamQuestion)
-            .join(ExamSetQuestion, ExamSetQuestion.question_id == ExamQuestion.id)
-            .filter(ExamSetQuestion.set_id == attempt.set_id)
-            .options(joinedload(ExamQuestion.options))
-            .order_by(ExamSetQuestion.order)
-            .all()
-        )
-    else:
-        # fallback: whole exam pool if no set assigned
-        set_questions = exam.questions
-
-    exam_data = {
-        "id": exam.id,
-        "title": exam.title,
-        "duration_minutes": exam.duration_minutes,
-        "start_datetime": exam.start_datetime.strftime("%Y-%m-%d %H:%M:%S"),
-        "end_datetime": exam.end_datetime.strftime("%Y-%m-%d %H:%M:%S"),
-        "questions": [
-            {
-                "id": q.id,
-                "question_text": q.question_text,
-                "options": [{"id": opt.id, "text": opt.text} for opt in q.options]
-            }
-            for q in set_questions
-        ]
-    }
+    if attempt_sweeper.expired(attempt, now):
+        flash("Your time for this exam is up; your saved answers will be submitted.", "warning")
+        return redirect(url_for('exam.exams'))
+
+    # The paper itself is fetched from exam_paper (cached, ETag); the page
+    # only needs its size.
+    paper = paper_for_exam(exam, attempt.set_id)
 
     return render_template(
         "exam/take_exam.html",
-        exam_json=exam_data,
+        exam=exam,
+        question_count=paper.question_count,
         session=session,
-        attempt=attempt
+        attempt=attempt,
+        seconds_left=seconds_left(attempt, now),
+        package_mode=current_app.config.get('EXAM_PACKAGE_MODE', False),
     )
 
+@exam_bp.route('/take-exam/<int:exam_id>/<int:attempt_id>/paper')
+@login_required
+def exam_paper(exam_id, attempt_id):
+    if current_user.role != 'student':
+        abort(403)
+
+    exam = Exam.query.get_or_404(exam_id)
+    now = datetime.utcnow()
+    if not (exam.start_datetime <= now <= exam.end_datetime):
+        return jsonify({"error": "This exam is not open."}), 403
+
+    attempt = ExamAttempt.query.filter_by(
+        id=attempt_id,
+        exam_id=exam.id,
+        student_id=current_user.id
+    ).first_or_404()
+    if attempt.submitted or attempt_sweeper.expired(attempt, now):
+        return jsonify({"error": "You have already submitted this exam."}), 403
+
+    exam_monitor.seen(exam.id, current_user.id)
+    paper = paper_for_exam(exam, attempt.set_id)
+    response = current_app.response_class(paper.body, mimetype='application/json')
+    response.set_etag(paper.etag)
+    # Per-student URL: keep it out of shared caches and revalidate on every load.
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@exam_bp.route('/take-exam/<int:exam_id>/<int:attempt_id>/package')
+@login_required
+def exam_package(exam_id, attempt_id):
+    """
+    The signed paper package for offline-capable delivery (utils/exam_package.py):
+    the paper, a token for sync and submit, and the deadline, in one download.
+    """
+    if current_user.role != 'student':
+        abort(403)
+
+    exam = Exam.query.get_or_404(exam_id)
+    now = datetime.utcnow()
+    if not (exam.start_datetime <= now <= exam.end_datetime):
+        return jsonify({"error": "This exam is not open."}), 403
+
+    attempt = ExamAttempt.query.filter_by(
+        id=attempt_id,
+        exam_id=exam.id,
+        student_id=current_user.id
+    ).first_or_404()
+    if attempt.submitted or attempt_sweeper.expired(attempt, now):
+        return jsonify({"error": "You have already submitted this exam."}), 403
+
+    exam_monitor.seen(exam.id, current_user.id)
+    body = build_package(
+        attempt, paper_for_exam(exam, attempt.set_id),
+        sync_url=url_for('exam.sync_exam_answers', attempt_id=attempt.id),
+        submit_url=url_for('exam.submit_exam', exam_id=exam.id, attempt_id=attempt.id),
+    )
+    body, encoding = compress(body, request.accept_encodings)
+    response = current_app.response_class(body, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # Carries a fresh token: never cached.
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
+
 @exam_bp.route('/exams/<int:exam_id>/password', methods=['GET','POST'])
 @login_required
 def exam_password(exam_id):
@@ -161,17 +194,8 @@ def exam_password(exam_id):
 
     exam = Exam.query.get_or_404(exam_id)
 
-    # ✅ First check if student manually selected a set
-    selected_set_key = f'selected_set_for_exam_{exam.id}'
-    chosen_set_obj = None
-    if selected_set_key in session:
-        chosen_set_obj = ExamSet.query.filter_by(
-            id=session[selected_set_key], exam_id=exam.id
-        ).first()
-
-    # ✅ Otherwise fallback to auto-assignment logic
-    if not chosen_set_obj:
-        chosen_set_obj = pick_set_for_student(exam, current_user)
+    # Manually selected set, else the pre-warmed assignment, else auto-assignment
+    chosen_set_obj = _assigned_set(exam)
 
     if not chosen_set_obj:
         flash("No set assigned to you yet.", "danger")
@@ -210,13 +234,7 @@ def exam_instructions(exam_id):
     can_attempt = submission is None
 
     # Determine set to preview (after password validation, this is always defined)
-    selected_set_key = f'selected_set_for_exam_{exam.id}'
-    preview_set = None
-    if selected_set_key in session:
-        sel_id = session.get(selected_set_key)
-        preview_set = ExamSet.query.filter_by(id=sel_id, exam_id=exam.id).first()
-    else:
-        preview_set = pick_set_for_student(exam, current_user)
+    preview_set = _assigned_set(exam)
 
     if request.method == 'POST':
         if not can_attempt:
@@ -229,14 +247,19 @@ def exam_instructions(exam_id):
             flash("No set assigned to you.", "danger")
             return redirect(url_for("exam.exams"))
 
-        # Create attempt
-        new_attempt = ExamAttempt(
-            exam_id=exam.id,
-            set_id=chosen_set_obj.id,
-            student_id=current_user.id
-        )
-        db.session.add(new_attempt)
-        db.session.commit()
+        # Start the pre-warmed attempt, or create one; capped per process so
+        # a class starting together does not pile up on the database lock.
+        with exam_admission.slot() as admitted:
+            if not admitted:
+                return _admission_busy(exam)
+            new_attempt = _unstarted_attempt(exam)
+            if new_attempt is None:
+                new_attempt = ExamAttempt(exam_id=exam.id, student_id=current_user.id)
+                db.session.add(new_attempt)
+            new_attempt.set_id = chosen_set_obj.id
+            start_attempt(new_attempt, exam)
+            db.session.commit()
+        exam_monitor.attempt_started(exam.id, current_user.id)
 
         # Clear verification so they can’t restart without password
         session.pop(f'exam_{exam.id}_set_verified', None)
@@ -256,11 +279,40 @@ from hashlib import sha256
 import random
 from flask import session
 
+def _unstarted_attempt(exam):
+    """The current student's pre-warmed attempt (no start time yet), if any."""
+    return ExamAttempt.query.filter_by(
+        exam_id=exam.id, student_id=current_user.id, submitted=False, start_time=None
+    ).first()
+
+def _assigned_set(exam):
+    selected_set_id = session.get(f'selected_set_for_exam_{exam.id}')
+    if selected_set_id is not None:
+        return ExamSet.query.filter_by(id=selected_set_id, exam_id=exam.id).first()
+    attempt = _unstarted_attempt(exam)
+    if attempt is not None and attempt.set_id:
+        return attempt.exam_set
+    return pick_set_for_student(exam, current_user)
+
+def _admission_busy(exam):
+    retry_after = exam_admission.retry_after_seconds()
+    response = current_app.make_response((
+        render_template("exam/admission_wait.html", exam=exam, retry_after=retry_after),
+        503,
+    ))
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
 def pick_set_for_student(exam, student_user):
     """
     Return an ExamSet object according to exam.assignment_mode.
     NOTE: does NOT persist assignment (except for deterministic hash which is stable).
+    A set allocated by the planner (utils/set_allocation.py) always wins.
     """
+    allocated = allocated_set(exam.id, student_user.id)
+    if allocated is not None:
+        return allocated
+
     sets = ExamSet.query.filter_by(exam_id=exam.id).all()
     if not sets:
         return None
@@ -326,30 +378,105 @@ def select_exam_set(exam_id):
 @exam_bp.route('/start-exam-timer/<int:exam_id>', methods=['POST'])
 @login_required
 def start_exam_timer(exam_id):
-    key = f'exam_{exam_id}_start_time'
-    if key not in session:
-        session[key] = datetime.utcnow().isoformat()
-        session.modified = True
-    return jsonify({'status': 'started'})
-
+    """Time left on the student's running attempt; the deadline is set when it starts."""
+    attempt = ExamAttempt.query.filter(
+        ExamAttempt.exam_id == exam_id,
+        ExamAttempt.student_id == current_user.id,
+        ExamAttempt.submitted.is_(False),
+        ExamAttempt.deadline.isnot(None),
+    ).first()
+    if attempt is None:
+        return jsonify({'error': 'No open attempt'}), 404
+    return jsonify({
+        'status': 'started',
+        'deadline': attempt.deadline.isoformat() + 'Z',
+        'seconds_left': seconds_left(attempt),
+    })
+
+def _open_attempt_for(attempt_id):
+    """The current student's unsubmitted attempt, or None."""
+    if not attempt_id:
+        return None
+    attempt = db.session.get(ExamAttempt, attempt_id)
+    if attempt is None or attempt.student_id != current_user.id or attempt.submitted:
+        return None
+    return attempt
+
+def _started_attempt(exam_id):
+    """The current student's started, unsubmitted attempt at an exam, or None."""
+    return ExamAttempt.query.filter(
+        ExamAttempt.exam_id == exam_id,
+        ExamAttempt.student_id == current_user.id,
+        ExamAttempt.submitted.is_(False),
+        ExamAttempt.start_time.isnot(None),
+    ).order_by(ExamAttempt.start_time.desc()).first()
+
+@exam_bp.route('/autosave', methods=['POST'])
 @exam_bp.route('/autosave_exam_answer', methods=['POST'])
 @login_required
 def autosave_exam_answer():
-    data = request.get_json()
-    exam_id = data.get('exam_id')
-    question_id = str(data.get('question_id'))
-    selected_option_id = str(data.get('selected_option_id'))
+    """
+    Apply a batch of changed answers: ``{attempt_id, seq, changes: [...]}``.
+    Replies with the last acknowledged ``seq`` and whether this batch was
+    applied (a resend or an overtaken batch is not).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        attempt_id = int(data.get('attempt_id'))
+        seq, changes = parse_changes(data)
+    except (TypeError, ValueError, KeyError):
+        return jsonify({'error': 'Incomplete data'}), 400
+
+    attempt = _open_attempt_for(attempt_id)
+    if attempt is None or attempt_sweeper.expired(attempt):
+        return jsonify({'error': 'No open attempt'}), 404
+
+    ack, applied = apply_batch(exam_drafts, attempt.id, seq, changes)
+    exam_monitor.seen(attempt.exam_id, attempt.student_id)
+    return jsonify({'status': 'saved' if applied else 'duplicate', 'ack': ack, 'applied': applied})
+
 
-    if not all([exam_id, question_id, selected_option_id]):
+@exam_bp.route('/attempts/<int:attempt_id>/sync', methods=['POST'])
+@login_required
+def sync_exam_answers(attempt_id):
+    """
+    Package-mode answer sync: one gzip/deflate-compressed batch
+    ``{token, seq, changes: [...]}``, applied like an autosave batch.
+    """
+    try:
+        data = read_json(request.get_data(cache=False), request.headers.get('Content-Encoding'))
+        verify_token(data.get('token'), attempt_id=attempt_id, student_id=current_user.id)
+        seq, changes = parse_changes(data)
+    except PackageError as e:
+        return jsonify({'error': str(e)}), 400
+    except (TypeError, ValueError, KeyError):
         return jsonify({'error': 'Incomplete data'}), 400
 
-    session_key = f'autosaved_exam_{exam_id}_{current_user.user_id}'
-    if session_key not in session:
-        session[session_key] = {}
+    attempt = _open_attempt_for(attempt_id)
+    if attempt is None or attempt_sweeper.expired(attempt):
+        return jsonify({'error': 'No open attempt'}), 404
 
-    session[session_key][question_id] = selected_option_id
-    session.modified = True
-    return jsonify({'status': 'saved'})
+    ack, applied = apply_batch(exam_drafts, attempt.id, seq, changes)
+    exam_monitor.seen(attempt.exam_id, attempt.student_id)
+    return jsonify({'status': 'saved' if applied else 'duplicate', 'ack': ack, 'applied': applied})
+
+
+@exam_bp.route('/attempts/<int:attempt_id>/answers')
+@login_required
+def restore_exam_answers(attempt_id):
+    """Autosaved answers for an open attempt, so the exam page can restore them."""
+    attempt = _open_attempt_for(attempt_id)
+    if attempt is None:
+        abort(404)
+    drafts = exam_drafts.get(attempt.id)
+    return jsonify({
+        'attempt_id': attempt.id,
+        'last_seq': last_seq(drafts),
+        'answers': {
+            str(q_id): d['selected_option_id']
+            for q_id, d in drafts.items() if d['selected_option_id'] is not None
+        },
+    })
 
 
 @exam_bp.route('/submit_exam/<int:exam_id>', methods=['POST'])
@@ -366,45 +493,94 @@ def submit_exam(exam_id):
         flash("You have already submitted this exam. Only one submission is allowed.", "warning")
         return redirect(url_for('exam.exam_result', submission_id=existing.id))
 
-    autosaved_key = f'autosaved_exam_{exam.id}_{current_user.user_id}'
-    autosaved_answers = session.get(autosaved_key, {})
+    # Package mode posts a signed bundle with every answer; one that does not
+    # verify is ignored and the posted form counts as usual.
+    attempt_id, bundle_answers = request.args.get('attempt_id', type=int), None
+    if request.form.get('bundle'):
+        try:
+            claims, bundle_answers = read_bundle(request.form['bundle'], current_user.id)
+        except PackageError as e:
+            current_app.logger.warning("Exam %s: submission bundle rejected: %s", exam.id, e)
+        else:
+            if claims['e'] == exam.id:
+                attempt_id = claims['a']
+            else:
+                bundle_answers = None
+
+    # The deadline is the started attempt's, whatever attempt id was posted:
+    # a missing or foreign id falls back to the student's own started attempt.
+    attempt = _open_attempt_for(attempt_id)
+    if attempt is None or attempt.exam_id != exam.id:
+        attempt = _started_attempt(exam.id)
+    if attempt is None or attempt.start_time is None:
+        flash("You have not started this exam.", "warning")
+        return redirect(url_for('exam.exams'))
+    # Posted answers win over autosaved ones, unless the attempt is past its
+    # deadline (plus grace): then only what was autosaved in time counts.
+    drafts = exam_drafts.get(attempt.id)
+    answers = {q_id: d['selected_option_id'] for q_id, d in drafts.items()}
+    if not attempt_sweeper.expired(attempt):
+        answers.update(bundle_answers if bundle_answers is not None else answers_from_form(request.form))
+    answer_key = answer_key_for_exam(exam, attempt.set_id)
+    score = answer_key.grade(answers)
+
+    # One stored answer per question on the paper, for re-grading later.
+    submission_id = run_write(
+        record_exam_submission, exam.id, current_user.id, score,
+        attempt_id=attempt.id,
+        set_id=attempt.set_id,
+        answers=answer_rows(answer_key, answers, drafts),
+    )
+    exam_monitor.submitted(exam.id, current_user.id)
+
+    return redirect(url_for('exam.exam_result', submission_id=submission_id))
 
-    score = 0
-    for q in exam.questions:
-        submitted_option_id = request.form.get(f"answers[{q.id}]")
-        if not submitted_option_id:
-            submitted_option_id = autosaved_answers.get(str(q.id))
 
-        if submitted_option_id:
-            try:
-                submitted_option_id = int(submitted_option_id)
-                correct_option = next((opt for opt in q.options if opt.is_correct), None)
-                if correct_option and submitted_option_id == correct_option.id:
-                    score += q.marks
-            except (ValueError, TypeError):
-                continue
+def record_exam_submission(exam_id, student_id, score, attempt_id=None, set_id=None, answers=()):
+    """
+    Write unit: store the submission, its ``(question_id, option_id, text)``
+    answers and close its attempt; returns the submission id. Without
+    ``attempt_id`` a new (already submitted) attempt row is created, as before.
+    """
+    attempt = db.session.get(ExamAttempt, attempt_id) if attempt_id else None
+    if attempt is not None and attempt.submitted:
+        # Closed by the deadline sweeper while this request was on its way.
+        existing = ExamSubmission.query.filter_by(exam_id=exam_id, student_id=student_id).first()
+        if existing is not None:
+            return existing.id
 
+    now = datetime.utcnow()
     submission = ExamSubmission(
-        student_id=current_user.id,
-        exam_id=exam.id,
+        student_id=student_id,
+        exam_id=exam_id,
+        set_id=set_id,
         score=score,
-        submitted_at=datetime.utcnow()
+        submitted_at=now
     )
     db.session.add(submission)
 
-    attempt = ExamAttempt(
-        student_id=current_user.id,
-        exam_id=exam.id,
-        score=score,
-        submitted_at=datetime.utcnow()
-    )
-    db.session.add(attempt)
-
-    session.pop(autosaved_key, None)
-    session.pop(f'exam_{exam.id}_start_time', None)
-
-    db.session.commit()
-    return redirect(url_for('exam.exam_result', submission_id=submission.id))
+    if attempt is None:
+        attempt = ExamAttempt(
+            student_id=student_id,
+            exam_id=exam_id,
+            set_id=set_id,
+        )
+        db.session.add(attempt)
+    attempt.submitted = True
+    attempt.submitted_at = now
+    attempt.end_time = now
+    attempt.score = score
+    db.session.flush()
+
+    if answers:
+        db.session.execute(insert(ExamAnswer), [
+            {'submission_id': submission.id, 'question_id': q_id,
+             'selected_option_id': option_id, 'answer_text': answer_text}
+            for q_id, option_id, answer_text in answers
+        ])
+    if attempt_id:
+        exam_drafts.discard(attempt_id)
+    return submission.id
 
 @exam_bp.route('/has-submitted-exam/<int:exam_id>')
 @login_required
@@ -439,9 +615,9 @@ def exam_result(submission_id):
         if not exam_set:
             abort(404, description="Exam set not found")
         set_name = exam_set.name
-        max_score = exam_set.computed_max_score
+        max_score = exam_set.total_marks
     else:
-        max_score = sum((q.marks or 0) for q in exam.questions)
+        max_score = exam.total_marks
 
     max_score = float(max_score or 0)
     pass_percent = getattr(exam, "pass_percent", 0.5)
@@ -0,0 +1,51 @@
+"""paper total marks
+
+Stored totals on exams, exam sets and quizzes, maintained on flush.
+
+Revision ID: 2c8e5d7f1a93
+Revises: 9d3f6a2b8e14
+Create Date: 2026-10-18 19:46:05.917342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c8e5d7f1a93'
+down_revision = '9d3f6a2b8e14'
+branch_labels = None
+depends_on = None
+
+TABLES = ('exams', 'exam_sets', 'quiz')
+
+
+def _has_column(table, column):
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    for table in TABLES:
+        if not _has_column(table, 'total_marks'):
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.add_column(sa.Column('total_marks', sa.Float(), nullable=False, server_default='0'))
+
+    op.execute(
+        "UPDATE exams SET total_marks = "
+        "(SELECT COALESCE(SUM(q.marks), 0) FROM exam_questions q WHERE q.exam_id = exams.id)"
+    )
+    op.execute(
+        "UPDATE exam_sets SET total_marks = "
+        "(SELECT COALESCE(SUM(q.marks), 0) FROM exam_set_questions sq "
+        "JOIN exam_questions q ON q.id = sq.question_id WHERE sq.set_id = exam_sets.id)"
+    )
+    op.execute(
+        "UPDATE quiz SET total_marks = "
+        "(SELECT COALESCE(SUM(q.points), 0) FROM question q WHERE q.quiz_id = quiz.id)"
+    )
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('total_marks')
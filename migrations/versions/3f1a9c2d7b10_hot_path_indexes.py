@@ -0,0 +1,89 @@
+"""hot path indexes
+
+Composite indexes for the filter/sort columns the routes actually query
+on, plus unique indexes where the code already assumes one row per key
+(attendance per student/teacher/day, course registrations, parent-child
+links, teacher-course assignments).
+
+Databases created by ``flask bootstrap-db`` already have these from the
+models, so every index is created with IF NOT EXISTS; on older databases
+duplicate rows are removed (keeping the first) before a unique index is
+built.
+
+Revision ID: 3f1a9c2d7b10
+Revises:
+Create Date: 2026-10-18 09:12:41.207113
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a9c2d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns, unique)
+INDEXES = [
+    ('ix_user_role', 'user', ['role'], False),
+    ('ix_student_profile_current_class', 'student_profile', ['current_class'], False),
+    ('uq_parent_child', 'parent_child_link', ['parent_id', 'student_id'], True),
+    ('ix_parent_child_link_student', 'parent_child_link', ['student_id'], False),
+    ('ix_fee_txn_student_term', 'student_fee_transaction',
+     ['student_id', 'academic_year', 'semester', 'is_approved'], False),
+    ('ix_fee_txn_timestamp', 'student_fee_transaction', ['timestamp'], False),
+    ('ix_quiz_class_start', 'quiz', ['assigned_class', 'start_datetime'], False),
+    ('ix_question_quiz', 'question', ['quiz_id'], False),
+    ('ix_option_question', 'option', ['question_id'], False),
+    ('ix_student_answers_attempt', 'student_answers', ['attempt_id'], False),
+    ('ix_quiz_submission_student', 'student_quiz_submissions', ['student_id', 'submitted_at'], False),
+    ('ix_quiz_submission_quiz_student', 'student_quiz_submissions', ['quiz_id', 'student_id'], False),
+    ('ix_quiz_attempt_quiz_student', 'quiz_attempt', ['quiz_id', 'student_id'], False),
+    ('ix_assignments_class_due', 'assignments', ['assigned_class', 'due_date'], False),
+    ('ix_assignment_submissions_assignment', 'assignment_submissions', ['assignment_id', 'student_id'], False),
+    ('ix_assignment_submissions_student', 'assignment_submissions', ['student_id'], False),
+    ('ix_course_material_class', 'course_material', ['assigned_class'], False),
+    ('ix_course_class_term', 'course', ['assigned_class', 'semester', 'academic_year'], False),
+    ('uq_course_registration', 'student_course_registration',
+     ['student_id', 'academic_year', 'semester', 'course_id'], True),
+    ('ix_course_registration_course', 'student_course_registration', ['course_id'], False),
+    ('ix_timetable_entry_class', 'timetable_entry', ['assigned_class'], False),
+    ('uq_teacher_course', 'teacher_course_assignment', ['teacher_id', 'course_id'], True),
+    ('ix_teacher_course_course', 'teacher_course_assignment', ['course_id'], False),
+    ('uq_attendance_teacher_date_student', 'attendance_record', ['teacher_id', 'date', 'student_id'], True),
+    ('ix_attendance_student_date', 'attendance_record', ['student_id', 'date'], False),
+    ('ix_appointment_slot_teacher_date', 'appointment_slot', ['teacher_id', 'date'], False),
+    ('ix_exams_class_start', 'exams', ['assigned_class', 'start_datetime'], False),
+    ('ix_exam_sets_exam', 'exam_sets', ['exam_id'], False),
+    ('ix_exam_questions_exam', 'exam_questions', ['exam_id'], False),
+    ('ix_exam_set_questions_question', 'exam_set_questions', ['question_id'], False),
+    ('ix_exam_options_question', 'exam_options', ['question_id'], False),
+    ('ix_exam_attempts_exam_student', 'exam_attempts', ['exam_id', 'student_id', 'submitted'], False),
+    ('ix_exam_attempts_student', 'exam_attempts', ['student_id'], False),
+    ('ix_exam_submissions_student', 'exam_submissions', ['student_id', 'submitted_at'], False),
+    ('ix_exam_answers_submission', 'exam_answers', ['submission_id'], False),
+    ('ix_notification_recipients_user_read', 'notification_recipients', ['user_id', 'is_read'], False),
+    ('ix_notification_recipients_notification', 'notification_recipients', ['notification_id'], False),
+]
+
+
+def _drop_duplicates(table, columns):
+    key = ', '.join(columns)
+    op.execute(
+        f"DELETE FROM {table} WHERE id NOT IN "
+        f"(SELECT MIN(id) FROM {table} GROUP BY {key})"
+    )
+
+
+def upgrade():
+    for name, table, columns, unique in INDEXES:
+        if unique:
+            _drop_duplicates(table, columns)
+        op.create_index(name, table, columns, unique=unique, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,35 @@
+"""paper version
+
+Version stamps on exams and quizzes for the cached answer keys.
+
+Revision ID: 5e8a1b3c9d27
+Revises: c7d2e9a41f08
+Create Date: 2026-10-18 15:21:48.660917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8a1b3c9d27'
+down_revision = 'c7d2e9a41f08'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    for table in ('exams', 'quiz'):
+        if not _has_column(table, 'paper_version'):
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.add_column(sa.Column('paper_version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    for table in ('quiz', 'exams'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('paper_version')
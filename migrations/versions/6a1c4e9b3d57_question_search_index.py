@@ -0,0 +1,48 @@
+"""question search index
+
+FTS5 index over exam and quiz question and option text (SQLite only).
+
+Revision ID: 6a1c4e9b3d57
+Revises: 2c8e5d7f1a93
+Create Date: 2026-10-18 20:31:44.105829
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '6a1c4e9b3d57'
+down_revision = '2c8e5d7f1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    exists = bind.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'question_search'").first()
+    if exists:
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE question_search USING fts5("
+        "body, kind UNINDEXED, question_id UNINDEXED, tokenize='porter unicode61')"
+    )
+    op.execute(
+        "INSERT INTO question_search (rowid, body, kind, question_id) "
+        "SELECT q.id * 2, q.question_text || ' ' || COALESCE("
+        "(SELECT group_concat(o.text, ' ') FROM exam_options o WHERE o.question_id = q.id), ''), "
+        "'exam', q.id FROM exam_questions q"
+    )
+    op.execute(
+        "INSERT INTO question_search (rowid, body, kind, question_id) "
+        "SELECT q.id * 2 + 1, q.text || ' ' || COALESCE("
+        "(SELECT group_concat(o.text, ' ') FROM option o WHERE o.question_id = q.id), ''), "
+        "'quiz', q.id FROM question q"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS question_search")
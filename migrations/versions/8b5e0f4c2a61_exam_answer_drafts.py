@@ -0,0 +1,41 @@
+"""exam answer drafts
+
+Server-side autosave store for in-progress exam attempts, replacing the
+cookie session.
+
+Revision ID: 8b5e0f4c2a61
+Revises: 3f1a9c2d7b10
+Create Date: 2026-10-18 11:02:17.530214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b5e0f4c2a61'
+down_revision = '3f1a9c2d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'exam_answer_drafts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('attempt_id', sa.Integer(), nullable=False),
+        sa.Column('question_id', sa.Integer(), nullable=False),
+        sa.Column('selected_option_id', sa.Integer(), nullable=True),
+        sa.Column('answer_text', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['attempt_id'], ['exam_attempts.id']),
+        sa.ForeignKeyConstraint(['question_id'], ['exam_questions.id']),
+        sa.ForeignKeyConstraint(['selected_option_id'], ['exam_options.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('attempt_id', 'question_id', name='uq_exam_answer_draft'),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table('exam_answer_drafts', if_exists=True)
@@ -0,0 +1,64 @@
+"""exam attempt deadline
+
+Server-side deadline on exam attempts, indexed for the auto-submit sweeper.
+
+Revision ID: 9d3f6a2b8e14
+Revises: e4b7c1d90a35
+Create Date: 2026-10-18 19:04:12.381950
+
+"""
+from datetime import timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3f6a2b8e14'
+down_revision = 'e4b7c1d90a35'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if not _has_column('exam_attempts', 'deadline'):
+        with op.batch_alter_table('exam_attempts') as batch_op:
+            batch_op.add_column(sa.Column('deadline', sa.DateTime(), nullable=True))
+    op.create_index('ix_exam_attempts_open_deadline', 'exam_attempts', ['submitted', 'deadline'],
+                    if_not_exists=True)
+
+    # Deadlines for attempts already running (start + duration, capped at the exam end).
+    bind = op.get_bind()
+    attempts = sa.table('exam_attempts', sa.column('id', sa.Integer), sa.column('exam_id', sa.Integer),
+                        sa.column('start_time', sa.DateTime), sa.column('submitted', sa.Boolean),
+                        sa.column('deadline', sa.DateTime))
+    exams = sa.table('exams', sa.column('id', sa.Integer), sa.column('duration_minutes', sa.Integer),
+                     sa.column('end_datetime', sa.DateTime))
+    rows = bind.execute(
+        sa.select(attempts.c.id, attempts.c.start_time, exams.c.duration_minutes, exams.c.end_datetime)
+        .join(exams, exams.c.id == attempts.c.exam_id)
+        .where(attempts.c.submitted.is_(False), attempts.c.start_time.isnot(None),
+               attempts.c.deadline.is_(None))
+    ).all()
+    updates = []
+    for attempt_id, start, duration, end in rows:
+        deadline = start + timedelta(minutes=duration or 0)
+        if end is not None:
+            deadline = min(deadline, end)
+        updates.append({'b_id': attempt_id, 'b_deadline': deadline})
+    if updates:
+        bind.execute(
+            attempts.update().where(attempts.c.id == sa.bindparam('b_id'))
+            .values(deadline=sa.bindparam('b_deadline')),
+            updates,
+        )
+
+
+def downgrade():
+    op.drop_index('ix_exam_attempts_open_deadline', table_name='exam_attempts', if_exists=True)
+    with op.batch_alter_table('exam_attempts') as batch_op:
+        batch_op.drop_column('deadline')
@@ -0,0 +1,33 @@
+"""exam set version
+
+Version stamp on exam sets, bumped when their questions or order change.
+
+Revision ID: b3e9f2a7c615
+Revises: 6a1c4e9b3d57
+Create Date: 2026-10-18 21:12:37.480216
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e9f2a7c615'
+down_revision = '6a1c4e9b3d57'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if not _has_column('exam_sets', 'version'):
+        with op.batch_alter_table('exam_sets') as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('exam_sets') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,53 @@
+"""batched autosave
+
+Sequence numbers on exam answer drafts and a draft table for quizzes.
+
+Revision ID: c7d2e9a41f08
+Revises: 8b5e0f4c2a61
+Create Date: 2026-10-18 13:40:05.118392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2e9a41f08'
+down_revision = '8b5e0f4c2a61'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if not _has_column('exam_answer_drafts', 'seq'):
+        with op.batch_alter_table('exam_answer_drafts') as batch_op:
+            batch_op.add_column(sa.Column('seq', sa.Integer(), nullable=False, server_default='0'))
+
+    op.create_table(
+        'quiz_answer_drafts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('quiz_id', sa.Integer(), nullable=False),
+        sa.Column('question_id', sa.Integer(), nullable=False),
+        sa.Column('selected_option_id', sa.Integer(), nullable=True),
+        sa.Column('answer_text', sa.Text(), nullable=True),
+        sa.Column('seq', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['student_id'], ['user.id']),
+        sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id']),
+        sa.ForeignKeyConstraint(['question_id'], ['question.id']),
+        sa.ForeignKeyConstraint(['selected_option_id'], ['option.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('student_id', 'quiz_id', 'question_id', name='uq_quiz_answer_draft'),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table('quiz_answer_drafts', if_exists=True)
+    with op.batch_alter_table('exam_answer_drafts') as batch_op:
+        batch_op.drop_column('seq')
@@ -0,0 +1,43 @@
+"""exam set assignments
+
+Planned set allocations per exam and student.
+
+Revision ID: e4b7c1d90a35
+Revises: 5e8a1b3c9d27
+Create Date: 2026-10-18 17:52:31.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7c1d90a35'
+down_revision = '5e8a1b3c9d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'exam_set_assignments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('exam_id', sa.Integer(), nullable=False),
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('set_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['exam_id'], ['exams.id']),
+        sa.ForeignKeyConstraint(['student_id'], ['user.id']),
+        sa.ForeignKeyConstraint(['set_id'], ['exam_sets.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('exam_id', 'student_id', name='uq_exam_set_assignment'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_exam_set_assignments_set', 'exam_set_assignments', ['set_id'],
+                    if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_exam_set_assignments_set', table_name='exam_set_assignments', if_exists=True)
+    op.drop_table('exam_set_assignments', if_exists=True)
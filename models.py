@@ -5,10 +5,10 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 from sqlalchemy.orm import relationship, backref
-from sqlalchemy.ext.hybrid import hybrid_property
 import secrets, hashlib
 
 from utils.extensions import db
+from utils.identity_cache import invalidate_identity
 class Admin(db.Model, UserMixin):
     __tablename__ = 'admin'
 
@@ -19,6 +19,7 @@ class Admin(db.Model, UserMixin):
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
+        invalidate_identity(self.get_id())
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -53,8 +54,13 @@ class User(db.Model, UserMixin):
     # ✅ New column for profile picture (stores filename/path)
     profile_picture = db.Column(db.String(255), nullable=True, default="default.png")
 
+    __table_args__ = (
+        db.Index('ix_user_role', 'role'),
+    )
+
     def set_password(self, password: str):
         self.password_hash = generate_password_hash(password)
+        invalidate_identity(self.get_id())
 
     def check_password(self, password: str) -> bool:
         return check_password_hash(self.password_hash, password)
@@ -189,6 +195,10 @@ class StudentProfile(db.Model):
     user = db.relationship('User', backref=db.backref('student_profile', uselist=False), foreign_keys=[user_id])
     bookings = db.relationship('AppointmentBooking', back_populates='student', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_student_profile_current_class', 'current_class'),
+    )
+
 class TeacherProfile(db.Model):
     __tablename__ = 'teacher_profile'
 
@@ -229,6 +239,11 @@ class ParentChildLink(db.Model):
     parent = db.relationship('ParentProfile', backref='children_links')
     student = db.relationship('StudentProfile', backref='parent_links')
 
+    __table_args__ = (
+        db.Index('uq_parent_child', 'parent_id', 'student_id', unique=True),
+        db.Index('ix_parent_child_link_student', 'student_id'),
+    )
+
 class ParentProfile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(50), db.ForeignKey('user.user_id'), unique=True, nullable=False)
@@ -289,6 +304,11 @@ class StudentFeeTransaction(db.Model):
     # Optional: relationships
     student = db.relationship('User', backref='fee_transactions')
     reviewer = db.relationship('Admin', backref='approved_payments', foreign_keys=[reviewed_by_admin_id])
+
+    __table_args__ = (
+        db.Index('ix_fee_txn_student_term', 'student_id', 'academic_year', 'semester', 'is_approved'),
+        db.Index('ix_fee_txn_timestamp', 'timestamp'),
+    )
         
 # Stores cumulative balance per student
 class StudentFeeBalance(db.Model):
@@ -320,6 +340,14 @@ class Quiz(db.Model):
     end_datetime = db.Column(db.DateTime, nullable=False)
     attempts_allowed = db.Column(db.Integer, nullable=False, default=1)
     content_file = db.Column(db.String(255), nullable=True)
+    # Bumped whenever a question or option changes (utils/grading.py)
+    paper_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Sum of question points, kept current on flush (utils/paper_totals.py)
+    total_marks = db.Column(db.Float, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        db.Index('ix_quiz_class_start', 'assigned_class', 'start_datetime'),
+    )
 
     # ✅ cascade so deleting a quiz deletes its questions (and their options)
     questions = db.relationship(
@@ -331,7 +359,7 @@ class Quiz(db.Model):
 
     @property
     def max_score(self):
-        return sum(q.points for q in self.questions)
+        return self.total_marks or 0
 
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -341,6 +369,10 @@ class Question(db.Model):
 
     options = db.relationship('Option', backref='question', cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_question_quiz', 'quiz_id'),
+    )
+
     @property
     def max_score(self):
         # For a single question where the question has a points value:
@@ -352,6 +384,10 @@ class Option(db.Model):
     text = db.Column(db.String(255), nullable=False)
     is_correct = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        db.Index('ix_option_question', 'question_id'),
+    )
+
 class StudentAnswer(db.Model):
     __tablename__ = 'student_answers'
     id = db.Column(db.Integer, primary_key=True)
@@ -363,6 +399,10 @@ class StudentAnswer(db.Model):
     attempt = db.relationship('QuizAttempt', backref='answers')
     question = db.relationship('Question', backref='student_answers')
 
+    __table_args__ = (
+        db.Index('ix_student_answers_attempt', 'attempt_id'),
+    )
+
 class StudentQuizSubmission(db.Model):
     __tablename__ = 'student_quiz_submissions'
     
@@ -375,7 +415,28 @@ class StudentQuizSubmission(db.Model):
     # Relationships
     student = db.relationship('User', backref='quiz_submissions')
     quiz = db.relationship('Quiz', backref='submissions')
+
+    __table_args__ = (
+        db.Index('ix_quiz_submission_student', 'student_id', 'submitted_at'),
+        db.Index('ix_quiz_submission_quiz_student', 'quiz_id', 'student_id'),
+    )
     
+class QuizAnswerDraft(db.Model):
+    """Autosaved quiz answer; quizzes have no attempt row until submission."""
+    __tablename__ = 'quiz_answer_drafts'
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
+    selected_option_id = db.Column(db.Integer, db.ForeignKey('option.id'), nullable=True)
+    answer_text = db.Column(db.Text, nullable=True)
+    seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'quiz_id', 'question_id', name='uq_quiz_answer_draft'),
+    )
+
 class QuizAttempt(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
@@ -383,6 +444,10 @@ class QuizAttempt(db.Model):
     score = db.Column(db.Float)
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_quiz_attempt_quiz_student', 'quiz_id', 'student_id'),
+    )
+
 class Assignment(db.Model):
     __tablename__ = 'assignments'
     id = db.Column(db.Integer, primary_key=True)
@@ -397,6 +462,10 @@ class Assignment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     max_score = db.Column(db.Float, nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_assignments_class_due', 'assigned_class', 'due_date'),
+    )
+
 class AssignmentSubmission(db.Model):
     __tablename__ = 'assignment_submissions'
     id = db.Column(db.Integer, primary_key=True)
@@ -419,6 +488,11 @@ class AssignmentSubmission(db.Model):
     student = db.relationship("User", backref="assignment_submissions")
     assignment = db.relationship("Assignment", backref="submissions")
 
+    __table_args__ = (
+        db.Index('ix_assignment_submissions_assignment', 'assignment_id', 'student_id'),
+        db.Index('ix_assignment_submissions_student', 'student_id'),
+    )
+
 class GradingScale(db.Model):
     __tablename__ = 'grading_scales'
     id = db.Column(db.Integer, primary_key=True)
@@ -440,6 +514,10 @@ class CourseMaterial(db.Model):
     file_type = db.Column(db.String(20), nullable=False)
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_course_material_class', 'assigned_class'),
+    )
+
 from sqlalchemy.sql import func
 
 class Course(db.Model):
@@ -456,6 +534,10 @@ class Course(db.Model):
     registration_start  = db.Column(db.DateTime, nullable=True)
     registration_end    = db.Column(db.DateTime, nullable=True)
 
+    __table_args__ = (
+        db.Index('ix_course_class_term', 'assigned_class', 'semester', 'academic_year'),
+    )
+
     @classmethod
     def get_registration_window(cls):
         """Return a tuple (start, end) of the global registration window."""
@@ -493,6 +575,11 @@ class StudentCourseRegistration(db.Model):
     course = db.relationship('Course', backref='registrations')
     student = db.relationship('User', backref='registered_courses')
 
+    __table_args__ = (
+        db.Index('uq_course_registration', 'student_id', 'academic_year', 'semester', 'course_id', unique=True),
+        db.Index('ix_course_registration_course', 'course_id'),
+    )
+
 class TimetableEntry(db.Model):
     __tablename__ = 'timetable_entry'
     id = db.Column(db.Integer, primary_key=True)
@@ -504,6 +591,10 @@ class TimetableEntry(db.Model):
 
     course = db.relationship('Course', backref='timetable_entries')
 
+    __table_args__ = (
+        db.Index('ix_timetable_entry_class', 'assigned_class'),
+    )
+
 
 class TeacherCourseAssignment(db.Model):
     __tablename__ = 'teacher_course_assignment'
@@ -518,6 +609,11 @@ class TeacherCourseAssignment(db.Model):
     teacher = db.relationship("TeacherProfile", backref="assignments")
     course  = db.relationship("Course")
 
+    __table_args__ = (
+        db.Index('uq_teacher_course', 'teacher_id', 'course_id', unique=True),
+        db.Index('ix_teacher_course_course', 'course_id'),
+    )
+
 class AttendanceRecord(db.Model):
     __tablename__ = 'attendance_record'
     id = db.Column(db.Integer, primary_key=True)
@@ -531,6 +627,14 @@ class AttendanceRecord(db.Model):
     teacher = db.relationship('TeacherProfile')
     course = db.relationship('Course')
 
+    # One mark per student per teacher per day (the attendance sheet skips
+    # students already recorded); the unique index also serves the sheet's
+    # (teacher_id, date) lookup.
+    __table_args__ = (
+        db.Index('uq_attendance_teacher_date_student', 'teacher_id', 'date', 'student_id', unique=True),
+        db.Index('ix_attendance_student_date', 'student_id', 'date'),
+    )
+
 class AcademicCalendar(db.Model):
     __tablename__ = 'academic_calendar'
     id = db.Column(db.Integer, primary_key=True)
@@ -561,6 +665,10 @@ class AppointmentSlot(db.Model):
     teacher = db.relationship('TeacherProfile', back_populates='slots')
     booking = db.relationship('AppointmentBooking', back_populates='slot', uselist=False)
 
+    __table_args__ = (
+        db.Index('ix_appointment_slot_teacher_date', 'teacher_id', 'date'),
+    )
+
 class AppointmentBooking(db.Model):
     __tablename__ = 'appointment_booking'
     id = db.Column(db.Integer, primary_key=True)
@@ -597,16 +705,25 @@ class Exam(db.Model):
     assignment_mode = db.Column(db.String(20), default='random', nullable=False)
     assignment_seed = db.Column(db.String(255), nullable=True)
 
+    # Bumped whenever a question, option or set membership changes (utils/grading.py)
+    paper_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Sum of question marks in the pool, kept current on flush (utils/paper_totals.py)
+    total_marks = db.Column(db.Float, nullable=False, default=0, server_default='0')
+
     # Relationships
     questions = db.relationship('ExamQuestion', backref='exam', cascade="all, delete-orphan")
     sets = db.relationship("ExamSet", backref="exam", cascade="all, delete-orphan")
     submissions = db.relationship('ExamSubmission', backref='exam', cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_exams_class_start', 'assigned_class', 'start_datetime'),
+    )
+
     def __repr__(self):
         return f"<Exam {self.title}>"
-    @hybrid_property
+    @property
     def max_score(self):
-        return sum(q.marks for q in self.questions)
+        return self.total_marks or 0
 
 class ExamSet(db.Model):
     __tablename__ = "exam_sets"
@@ -614,6 +731,10 @@ class ExamSet(db.Model):
     name = db.Column(db.String(50), nullable=False)
     exam_id = db.Column(db.Integer, db.ForeignKey("exams.id"), nullable=False)
     max_score = db.Column(db.Float, nullable=True)
+    # Sum of the set's question marks, kept current on flush (utils/paper_totals.py)
+    total_marks = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    # Bumped whenever the set's questions or their order change (utils/set_membership.py)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     # actual column
     access_password = db.Column(db.String(128), nullable=True)
@@ -621,6 +742,10 @@ class ExamSet(db.Model):
     # relationship
     set_questions = db.relationship("ExamSetQuestion", backref="set", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_exam_sets_exam', 'exam_id'),
+    )
+
     @property
     def password(self):
         return self.access_password
@@ -630,7 +755,7 @@ class ExamSet(db.Model):
 
     @property
     def computed_max_score(self):
-        return sum(q.question.marks or 0 for q in self.set_questions)
+        return self.total_marks or 0
 
 class ExamQuestion(db.Model):
     __tablename__ = "exam_questions"
@@ -646,6 +771,10 @@ class ExamQuestion(db.Model):
 
     in_sets = db.relationship("ExamSetQuestion", backref="question", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_exam_questions_exam', 'exam_id'),
+    )
+
     def __repr__(self):
         return f"<ExamQuestion {self.question_text[:30]}...>"
 
@@ -658,8 +787,29 @@ class ExamSetQuestion(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("set_id", "question_id", name="uix_set_question"),
+        db.Index('ix_exam_set_questions_question', 'question_id'),
     )
 
+class ExamSetAssignment(db.Model):
+    """Set allocated to a student by the planner (utils/set_allocation.py)."""
+    __tablename__ = 'exam_set_assignments'
+    id = db.Column(db.Integer, primary_key=True)
+    exam_id = db.Column(db.Integer, db.ForeignKey('exams.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    set_id = db.Column(db.Integer, db.ForeignKey('exam_sets.id'), nullable=False)
+    position = db.Column(db.Integer, nullable=True)  # place in the class roster when planned
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    exam_set = db.relationship('ExamSet', backref=db.backref('allocations', cascade="all, delete-orphan"))
+
+    __table_args__ = (
+        db.UniqueConstraint('exam_id', 'student_id', name='uq_exam_set_assignment'),
+        db.Index('ix_exam_set_assignments_set', 'set_id'),
+    )
+
+    def __repr__(self):
+        return f"<ExamSetAssignment exam={self.exam_id} student={self.student_id} set={self.set_id}>"
+
 class ExamOption(db.Model):
     __tablename__ = 'exam_options'
     id = db.Column(db.Integer, primary_key=True)
@@ -667,6 +817,10 @@ class ExamOption(db.Model):
     text = db.Column(db.String(255), nullable=False)
     is_correct = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        db.Index('ix_exam_options_question', 'question_id'),
+    )
+
     def __repr__(self):
         return f"<ExamOption {self.text}>"
 
@@ -684,6 +838,7 @@ class ExamAttempt(db.Model):
 
     start_time = db.Column(db.DateTime, default=datetime.utcnow)
     end_time = db.Column(db.DateTime, nullable=True)
+    deadline = db.Column(db.DateTime, nullable=True)  # start + duration, capped at the exam end
 
     submitted = db.Column(db.Boolean, default=False)
     submitted_at = db.Column(db.DateTime, nullable=True)   # exact submission time
@@ -693,6 +848,12 @@ class ExamAttempt(db.Model):
     exam = db.relationship("Exam", backref="attempts")
     exam_set = db.relationship("ExamSet", backref="attempts")
 
+    __table_args__ = (
+        db.Index('ix_exam_attempts_exam_student', 'exam_id', 'student_id', 'submitted'),
+        db.Index('ix_exam_attempts_student', 'student_id'),
+        db.Index('ix_exam_attempts_open_deadline', 'submitted', 'deadline'),
+    )
+
     def __repr__(self):
         return f"<ExamAttempt exam={self.exam_id} student={self.student_id} submitted={self.submitted}>"
 
@@ -711,6 +872,7 @@ class ExamSubmission(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('exam_id', 'student_id', name='uix_exam_student'),
+        db.Index('ix_exam_submissions_student', 'student_id', 'submitted_at'),
     )
 
     def __repr__(self):
@@ -719,7 +881,7 @@ class ExamSubmission(db.Model):
     @property
     def max_score(self):
         if self.exam_set:  # ✅ always prioritize the set
-            return self.exam_set.computed_max_score or 0
+            return self.exam_set.total_marks or 0
         return 0  # if no set was assigned, don't fall back to exam pool
 
 class ExamAnswer(db.Model):
@@ -730,9 +892,28 @@ class ExamAnswer(db.Model):
     selected_option_id = db.Column(db.Integer, db.ForeignKey('exam_options.id'), nullable=True)
     answer_text = db.Column(db.Text, nullable=True)  # for subjective answers
 
+    __table_args__ = (
+        db.Index('ix_exam_answers_submission', 'submission_id'),
+    )
+
     def __repr__(self):
         return f"<ExamAnswer Q{self.question_id} -> Option {self.selected_option_id or 'text'}>"
 
+class ExamAnswerDraft(db.Model):
+    """Autosaved answer for an in-progress attempt; one row per question."""
+    __tablename__ = 'exam_answer_drafts'
+    id = db.Column(db.Integer, primary_key=True)
+    attempt_id = db.Column(db.Integer, db.ForeignKey('exam_attempts.id'), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey('exam_questions.id'), nullable=False)
+    selected_option_id = db.Column(db.Integer, db.ForeignKey('exam_options.id'), nullable=True)
+    answer_text = db.Column(db.Text, nullable=True)
+    seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # autosave batch that wrote it
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('attempt_id', 'question_id', name='uq_exam_answer_draft'),
+    )
+
 class Notification(db.Model):
     __tablename__ = 'notifications'
 
@@ -769,6 +950,20 @@ class NotificationRecipient(db.Model):
     notification = db.relationship('Notification', back_populates='recipients')
     user = db.relationship('User', backref='notifications_received')
 
+    __table_args__ = (
+        db.Index('ix_notification_recipients_user_read', 'user_id', 'is_read'),
+        db.Index('ix_notification_recipients_notification', 'notification_id'),
+    )
+
+
+class NotificationUnreadCounter(db.Model):
+    """Unread notifications per user; user_id '*' holds the global total."""
+    __tablename__ = 'notification_unread_counters'
+
+    user_id = db.Column(db.String(20), primary_key=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 
 # -----------------------
 # DB Model (simple)
@@ -3,6 +3,8 @@ from flask_login import login_required, current_user, login_user
 from forms import ChangePasswordForm, ParentLoginForm
 from models import db, User, ParentProfile, ParentChildLink, StudentProfile, Assignment, StudentQuizSubmission, Quiz, AttendanceRecord, StudentFeeBalance, StudentFeeTransaction , ClassFeeStructure , Notification, NotificationRecipient
 from datetime import datetime
+from sqlalchemy.orm import contains_eager
+from utils.notification_counters import get_unread_count as unread_count_for, mark_read
 import os
 from werkzeug.utils import secure_filename
 
@@ -50,10 +52,7 @@ def dashboard():
     total_children = len(children)
 
     # Optional: compute unread notifications for parent (if you have a Notification model)
-    try:
-        unread_notifications_count = db.session.query(Notification).filter_by(user_id=current_user.user_id, read=False).count()
-    except Exception:
-        unread_notifications_count = 0
+    unread_notifications_count = unread_count_for(current_user.user_id)
 
     # Optional: compute upcoming items across children (exams/assignments/events)
     try:
@@ -227,6 +226,7 @@ def view_student_report(child_id):
     quiz_results = (
         StudentQuizSubmission.query
         .join(Quiz, StudentQuizSubmission.quiz_id == Quiz.id)
+        .options(contains_eager(StudentQuizSubmission.quiz))
         .filter(StudentQuizSubmission.student_id == user.id)
         .all()
     )
@@ -235,7 +235,7 @@ def view_student_report(child_id):
     total_quiz_max = 0
 
     for q in quiz_results:
-        quiz_max = q.quiz.max_score  # property that sums question points
+        quiz_max = q.quiz.total_marks  # stored sum of question points
         total_quiz_score += q.score
         total_quiz_max += quiz_max
 
@@ -305,16 +305,6 @@ def reports_list():
     return render_template('parent/reports_list.html', children=children)
 
 
-@parent_bp.app_context_processor
-def inject_parent_notification_count():
-    unread_count = 0
-    if current_user.is_authenticated and hasattr(current_user, "user_id"):
-        unread_count = NotificationRecipient.query.filter_by(
-            user_id=current_user.user_id,
-            is_read=False
-        ).count()
-    return dict(unread_count=unread_count)
-
 @parent_bp.route('/notifications')
 @login_required
 def notifications():
@@ -341,6 +331,7 @@ def view_parent_notification(recipient_id):
     if not recipient.is_read:
         recipient.is_read = True
         recipient.read_at = datetime.utcnow()
+        mark_read(recipient.user_id)
         db.session.commit()
 
     return render_template('parent/notification_detail.html', recipient=recipient)
@@ -355,6 +346,7 @@ def mark_parent_notification_read(recipient_id):
     if not recipient.is_read:
         recipient.is_read = True
         recipient.read_at = datetime.utcnow()
+        mark_read(recipient.user_id)
         db.session.commit()
 
     return jsonify({"success": True, "id": recipient_id})
@@ -362,10 +354,7 @@ def mark_parent_notification_read(recipient_id):
 @parent_bp.route('/notifications/unread_count')
 @login_required
 def get_unread_count():
-    unread_count = NotificationRecipient.query.filter_by(
-        user_id=current_user.user_id,
-        is_read=False
-    ).count()
+    unread_count = unread_count_for(current_user.user_id)
     return jsonify({"unread_count": unread_count})
 
 @parent_bp.route('/fees')
@@ -6,6 +6,8 @@ from sqlalchemy import func
 from werkzeug.utils import safe_join, secure_filename
 from models import db, User, Quiz, StudentQuizSubmission, Question, StudentProfile, QuizAttempt, Assignment, CourseMaterial, StudentCourseRegistration, Course,  TimetableEntry, AcademicCalendar, AcademicYear, AppointmentSlot, AppointmentBooking, StudentFeeBalance, ClassFeeStructure, StudentFeeTransaction, Exam, ExamSubmission, ExamQuestion, ExamAttempt, ExamSet, ExamSetQuestion, Notification, NotificationRecipient, Meeting, StudentAnswer
 from datetime import datetime
+from utils.notification_counters import get_unread_count as unread_count_for, mark_read
+from utils.write_queue import run_write
 from forms import CourseRegistrationForm, ChangePasswordForm, StudentLoginForm
 from io import BytesIO
 from reportlab.lib.pagesizes import A4, landscape, letter
@@ -48,18 +50,13 @@ def dashboard():
 def inject_notification_count():
     unread_count = 0
     if current_user.is_authenticated:
-        from models import NotificationRecipient
-
         if hasattr(current_user, "user_id"):  
             # Regular User (student, teacher, parent)
-            unread_count = NotificationRecipient.query.filter_by(
-                user_id=current_user.user_id,
-                is_read=False
-            ).count()
+            unread_count = unread_count_for(current_user.user_id)
 
         elif hasattr(current_user, "admin_id"):  
             # Admin → get all unread notifications
-            unread_count = NotificationRecipient.query.filter_by(is_read=False).count()
+            unread_count = unread_count_for(None)
 
     return dict(unread_count=unread_count)
 
@@ -128,21 +125,7 @@ def register_courses():
         mandatory_ids = {c.id for c in mandatory_courses}
         final_course_ids = selected_ids | mandatory_ids
 
-        StudentCourseRegistration.query.filter_by(
-            student_id=student.id,
-            semester=selected_sem,
-            academic_year=selected_year
-        ).delete()
-        db.session.commit()
-
-        for cid in final_course_ids:
-            db.session.add(StudentCourseRegistration(
-                student_id=student.id,
-                course_id=cid,
-                semester=selected_sem,
-                academic_year=selected_year
-            ))
-        db.session.commit()
+        run_write(replace_course_registrations, student.id, selected_sem, selected_year, final_course_ids)
 
         flash("Courses registered successfully!", "success")
         return redirect(url_for("student.register_courses"))
@@ -160,6 +143,23 @@ def register_courses():
         deadline_passed=deadline_passed
     )
 
+def replace_course_registrations(student_id, semester, academic_year, course_ids):
+    """Write unit: swap a student's registrations for a term in one transaction."""
+    StudentCourseRegistration.query.filter_by(
+        student_id=student_id,
+        semester=semester,
+        academic_year=academic_year
+    ).delete()
+    db.session.add_all([
+        StudentCourseRegistration(
+            student_id=student_id,
+            course_id=cid,
+            semester=semester,
+            academic_year=academic_year
+        )
+        for cid in course_ids
+    ])
+
 @student_bp.route('/courses/reset', methods=['POST'])
 @login_required
 def reset_registration():
@@ -189,7 +189,9 @@ def my_results():
     user_id = current_user.id
 
     # --- QUIZ RESULTS ---
-    quiz_results = StudentQuizSubmission.query.filter_by(student_id=user_id).order_by(StudentQuizSubmission.submitted_at.asc()).all()
+    quiz_results = (StudentQuizSubmission.query.filter_by(student_id=user_id)
+                    .options(joinedload(StudentQuizSubmission.quiz))
+                    .order_by(StudentQuizSubmission.submitted_at.asc()).all())
 
     # Build chart data: label = date (short), score = numeric (assume percent)
     quiz_chart_data = []
@@ -231,7 +233,10 @@ def my_results():
     assignments_pending = sum(1 for a in assignments if a.due_date and a.due_date.date() >= today)
 
     # --- EXAMS ---
-    exam_submissions = ExamSubmission.query.filter_by(student_id=user_id).order_by(ExamSubmission.submitted_at.desc()).all()
+    # Totals are stored on the set (utils/paper_totals.py); load exam and set with the rows.
+    exam_submissions = (ExamSubmission.query.filter_by(student_id=user_id)
+                        .options(joinedload(ExamSubmission.exam), joinedload(ExamSubmission.exam_set))
+                        .order_by(ExamSubmission.submitted_at.desc()).all())
     exams_total = len(exam_submissions)
     exams_graded = sum(1 for e in exam_submissions if e.score is not None)
     exams_passed = sum(1 for e in exam_submissions if (e.score is not None and e.max_score and e.score >= (e.max_score * 0.5)))
@@ -670,6 +675,7 @@ def view_notification(recipient_id):
     if not recipient.is_read:
         recipient.is_read = True
         recipient.read_at = datetime.utcnow()
+        mark_read(recipient.user_id)
         db.session.commit()
 
     return render_template('student/notification_detail.html', recipient=recipient)
@@ -685,6 +691,7 @@ def mark_notification_read(recipient_id):
     if not recipient.is_read:
         recipient.is_read = True
         recipient.read_at = datetime.utcnow()
+        mark_read(recipient.user_id)
         db.session.commit()
 
     return jsonify({"success": True, "id": recipient_id})
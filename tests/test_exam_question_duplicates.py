@@ -0,0 +1,72 @@
+"""Near-duplicate warning on the exam question form (admin_routes.create_exam_question)."""
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+_tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp, 'lms.db')}"
+os.environ['SCHEDULER_ENABLED'] = '0'
+
+import pytest  # noqa: E402
+
+from app import app  # noqa: E402
+from models import Exam, ExamOption, ExamQuestion, User  # noqa: E402
+from utils.bootstrap import bootstrap_database  # noqa: E402
+from utils.extensions import db  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False,
+                      BOOTSTRAP_LOCK_FILE=os.path.join(_tmp, 'bootstrap.lock'))
+    with app.app_context():
+        bootstrap_database(app)
+        admin = User(user_id='ADM900', username='dup-admin', first_name='A', last_name='D', role='admin')
+        admin.set_password('x')
+        now = datetime.utcnow()
+        exam = Exam(subject='Science', title='Mid-term', assigned_class='JHS 1', duration_minutes=60,
+                    start_datetime=now, end_datetime=now + timedelta(hours=1))
+        db.session.add_all([admin, exam])
+        db.session.commit()
+        exam_id = exam.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = 'user:ADM900'
+        session['_fresh'] = True
+    client.exam_id = exam_id
+    yield client
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def test_duplicate_true_false_keeps_the_posted_answer(client):
+    url = f'/admin/exam/{client.exam_id}/questions/create'
+    data = {'question_text': 'Water boils at 100 degrees Celsius at sea level.',
+            'question_type': 'true_false', 'marks': 1, 'tf_correct': 'false',
+            'options-0-text': 'True', 'options-1-text': 'False'}
+    assert client.post(url, data=data).status_code == 302
+
+    page = client.post(url, data=data)
+    assert page.status_code == 200
+    assert b'name="confirm_duplicate"' in page.data
+    assert b'id="tf_false" value="false" checked' in page.data
+
+    assert client.post(url, data=dict(data, confirm_duplicate='1')).status_code == 302
+    with app.app_context():
+        questions = ExamQuestion.query.filter_by(exam_id=client.exam_id).order_by(ExamQuestion.id).all()
+        assert len(questions) == 2
+        correct = ExamOption.query.filter_by(question_id=questions[1].id, is_correct=True).one()
+        assert correct.text == 'False'
+
+
+def test_duplicate_subjective_keeps_the_rubric(client):
+    url = f'/admin/exam/{client.exam_id}/questions/create'
+    data = {'question_text': 'Explain why the sky looks blue.', 'question_type': 'subjective',
+            'marks': 2, 'subjective_rubric': 'Rayleigh scattering', 'math_answer-0': '42',
+            'options-0-text': 'a', 'options-1-text': 'b'}
+    assert client.post(url, data=data).status_code == 302
+    page = client.post(url, data=data)
+    assert b'name="confirm_duplicate"' in page.data
+    assert b'>Rayleigh scattering</textarea>' in page.data
+    assert b'name="math_answer-0" class="form-control" placeholder="Numeric answer #1" value="42"' in page.data
@@ -0,0 +1,328 @@
+# utils/answer_drafts.py
+"""
+Server-side store for answers saved while an exam or quiz is in progress.
+
+Autosaved answers used to live in the signed cookie session, which grew
+with every question and was lost when a student changed device. They now
+go to ``exam_answer_drafts`` (keyed by attempt) and ``quiz_answer_drafts``
+(keyed by student and quiz, since quizzes only get an attempt row on
+submission): one row per question, written with an upsert.
+
+The pages send changes in batches: ``{seq, changes: [...]}`` where ``seq``
+increases per batch. ``apply_batch`` coalesces the changes (last one per
+question wins), writes them in one transaction and stamps each row with
+the batch's ``seq``. The highest stamped ``seq`` is the acknowledged one; a
+batch at or below it is a resend and is not applied again. Each buffer
+remembers the acknowledged ``seq`` of recent owners, so an autosave does
+not re-read the owner's drafts; an owner it has not seen costs one
+``max(seq)`` over the drafts' unique index. A value remembered here can
+lag a save handled by another process; that only lets a stale batch
+through, and the upsert still never moves a row back to an older ``seq``.
+
+With ``EXAM_DRAFT_WRITE_BEHIND`` on, saves land in a per-process buffer
+(a burst of saves to one question becomes one row) and a scheduler job
+writes the buffer out every ``EXAM_DRAFT_FLUSH_INTERVAL`` seconds. Reads in
+this process merge the buffer over the stored rows. Without the scheduler
+the buffer is off and every batch writes through.
+"""
+import atexit
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import click
+from sqlalchemy import func
+
+from models import ExamAnswerDraft, QuizAnswerDraft
+from utils.extensions import db, insert_for_dialect
+
+MAX_BATCH_CHANGES = 500
+MAX_ACKED_OWNERS = 10000
+
+
+class DraftBuffer:
+    """Draft rows for one table, keyed by ``owner_columns`` + question_id."""
+
+    def __init__(self, model, owner_columns, name):
+        self.model = model
+        self.owner_columns = owner_columns
+        self.name = name
+        self.enabled = False
+        self.max_pending = 500
+        self._pending = {}  # owner + (question_id,) -> row dict
+        self._inflight = {}  # rows taken by a flush that has not committed yet
+        self._discarded = set()  # owners discarded while a flush was in flight
+        self._flushing = False
+        self._acked = OrderedDict()  # owner -> highest saved seq, most recent last
+        self._lock = threading.Lock()
+        self._app = None
+        self.saves = self.flushes = self.rows_written = 0
+
+    def init_app(self, app, scheduler=None):
+        self._app = app
+        self.max_pending = app.config.get('EXAM_DRAFT_MAX_PENDING', 500)
+        interval = app.config.get('EXAM_DRAFT_FLUSH_INTERVAL', 2)
+        self.enabled = bool(
+            app.config.get('EXAM_DRAFT_WRITE_BEHIND', False)
+            and scheduler is not None
+            and app.config.get('SCHEDULER_ENABLED', True)
+            and interval
+        )
+        if self.enabled:
+            scheduler.add_job(f'flush_{self.name}', interval, self.flush)
+            atexit.register(self._flush_at_exit)
+
+    # --- public API ----------------------------------------------------------
+
+    def save(self, owner, changes, seq=0):
+        """
+        Record the latest answers for an owner (attempt id, or
+        (student_id, quiz_id)). ``changes`` maps question_id to
+        ``(selected_option_id, answer_text)``.
+        """
+        owner = _as_tuple(owner)
+        now = datetime.utcnow()
+        rows = [
+            dict(zip(self.owner_columns, owner),
+                 question_id=question_id,
+                 selected_option_id=option_id,
+                 answer_text=answer_text,
+                 seq=seq,
+                 updated_at=now)
+            for question_id, (option_id, answer_text) in changes.items()
+        ]
+        if not rows:
+            return
+        self.saves += len(rows)
+        if not self.enabled:
+            self._upsert(rows)
+            db.session.commit()
+            with self._lock:
+                self._ack(owner, seq)
+            return
+
+        with self._lock:
+            for row in rows:
+                self._pending[owner + (row['question_id'],)] = row
+            self._ack(owner, seq)
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush()
+
+    def get(self, owner):
+        """``{question_id: row}`` for an owner, including unflushed saves."""
+        owner = _as_tuple(owner)
+        columns = [getattr(self.model, c) for c in self.owner_columns]
+        query = self.model.query.filter(*[c == v for c, v in zip(columns, owner)])
+        drafts = {
+            d.question_id: {
+                'question_id': d.question_id,
+                'selected_option_id': d.selected_option_id,
+                'answer_text': d.answer_text,
+                'seq': d.seq,
+                'updated_at': d.updated_at,
+            }
+            for d in query
+        }
+        n = len(owner)
+        with self._lock:
+            for buffered in (self._inflight, self._pending):
+                for key, row in buffered.items():
+                    if key[:n] == owner:
+                        drafts[key[n]] = dict(row)
+        return drafts
+
+    def _ack(self, owner, seq):
+        # Only owners already remembered; others are looked up when needed.
+        if owner in self._acked:
+            self._acked[owner] = max(self._acked[owner], seq)
+
+    def acked_seq(self, owner):
+        """Highest ``seq`` saved for an owner (0 without drafts)."""
+        owner = _as_tuple(owner)
+        with self._lock:
+            seq = self._acked.get(owner)
+            if seq is not None:
+                self._acked.move_to_end(owner)
+                return seq
+        columns = [getattr(self.model, c) for c in self.owner_columns]
+        stored = db.session.query(func.max(self.model.seq)).filter(
+            *[c == v for c, v in zip(columns, owner)]).scalar() or 0
+        n = len(owner)
+        with self._lock:
+            seq = max([stored, self._acked.get(owner, 0)] + [
+                row['seq'] for buffered in (self._inflight, self._pending)
+                for key, row in buffered.items() if key[:n] == owner])
+            self._acked[owner] = seq
+            self._acked.move_to_end(owner)
+            while len(self._acked) > MAX_ACKED_OWNERS:
+                self._acked.popitem(last=False)
+        return seq
+
+    def discard(self, owner):
+        """Delete an owner's drafts (buffered and stored); the caller commits."""
+        owner = _as_tuple(owner)
+        n = len(owner)
+        with self._lock:
+            self._acked.pop(owner, None)
+            for buffered in (self._pending, self._inflight):
+                for key in [k for k in buffered if k[:n] == owner]:
+                    del buffered[key]
+            # A flush may already hold this owner's rows: it deletes them
+            # again before it commits (see flush).
+            self._discarded.add(owner)
+        self._delete_stored(owner)
+
+    def _delete_stored(self, owner):
+        columns = [getattr(self.model, c) for c in self.owner_columns]
+        self.model.query.filter(*[c == v for c, v in zip(columns, owner)]).delete(
+            synchronize_session=False)
+
+    def flush(self):
+        """Write every buffered save in one transaction; returns the row count."""
+        with self._lock:
+            if self._flushing:
+                return 0  # another thread is flushing
+            self._inflight, self._pending = self._pending, {}
+            self._discarded = set()
+            rows = list(self._inflight.values())
+            if not rows:
+                return 0
+            self._flushing = True
+        try:
+            self._upsert(rows)
+            # Owners discarded (e.g. submitted) since the swap: their rows
+            # must not come back with this flush.
+            with self._lock:
+                discarded = set(self._discarded)
+            for owner in discarded:
+                self._delete_stored(owner)
+            rows = [row for row in rows
+                    if tuple(row[c] for c in self.owner_columns) not in discarded]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Put the rows back unless a newer save arrived meanwhile.
+            with self._lock:
+                for key, row in self._inflight.items():
+                    self._pending.setdefault(key, row)
+                self._inflight = {}
+                self._flushing = False
+            raise
+        with self._lock:
+            self._inflight = {}
+            self._flushing = False
+        self.flushes += 1
+        self.rows_written += len(rows)
+        return len(rows)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'pending': len(self._pending),
+            'saves': self.saves,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+        }
+
+    def _upsert(self, rows):
+        # A row only moves forward: an older batch never overwrites a newer one.
+        table = self.model.__table__
+        insert = insert_for_dialect()
+        if insert is None:
+            for row in rows:
+                draft = self.model.query.filter_by(
+                    **{c: row[c] for c in self.owner_columns + ('question_id',)}).first()
+                if draft is None:
+                    db.session.add(self.model(**row))
+                elif draft.seq <= row['seq']:
+                    draft.selected_option_id = row['selected_option_id']
+                    draft.answer_text = row['answer_text']
+                    draft.seq = row['seq']
+                    draft.updated_at = row['updated_at']
+            return
+
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[c] for c in self.owner_columns + ('question_id',)],
+            set_={
+                'selected_option_id': stmt.excluded.selected_option_id,
+                'answer_text': stmt.excluded.answer_text,
+                'seq': stmt.excluded.seq,
+                'updated_at': stmt.excluded.updated_at,
+            },
+            where=table.c.seq <= stmt.excluded.seq,
+        )
+        db.session.execute(stmt)
+
+    def _flush_at_exit(self):
+        if self._pending and self._app is not None:
+            with self._app.app_context():
+                self.flush()
+
+
+def _as_tuple(owner):
+    return owner if isinstance(owner, tuple) else (owner,)
+
+
+def parse_changes(data):
+    """
+    Read an autosave payload into ``(seq, {question_id: (option_id, text)})``.
+
+    Accepts a batch (``{"seq": 3, "changes": [{"question_id": .., "selected_option_id": ..}]}``)
+    or a single change at the top level (``seq`` is then None). Changes are
+    applied in order, so the last one per question wins. Raises ValueError
+    on a malformed payload.
+    """
+    items = data.get('changes')
+    if items is None:
+        items = [data]
+    if not isinstance(items, list) or len(items) > MAX_BATCH_CHANGES:
+        raise ValueError("changes must be a list")
+
+    changes = {}
+    for item in items:
+        question_id = int(item['question_id'])
+        option_id = item.get('selected_option_id')
+        option_id = int(option_id) if option_id not in (None, '') else None
+        answer_text = item.get('answer_text')
+        changes[question_id] = (option_id, answer_text)
+
+    seq = data.get('seq')
+    return (int(seq) if seq is not None else None), changes
+
+
+def last_seq(drafts):
+    return max((d['seq'] for d in drafts.values()), default=0)
+
+
+def apply_batch(buffer, owner, seq, changes):
+    """
+    Apply one autosave batch idempotently; returns ``(ack, applied)``.
+
+    A batch whose ``seq`` is not above the last acknowledged one has already
+    been applied (or was overtaken) and is skipped. Without a ``seq`` the
+    changes are applied at the current acknowledged sequence number.
+    """
+    ack = buffer.acked_seq(owner)
+    if seq is None:
+        seq = ack
+    elif seq <= ack:
+        return ack, False
+    buffer.save(owner, changes, seq)
+    return seq, True
+
+
+def init_answer_drafts(app, scheduler=None):
+    exam_drafts.init_app(app, scheduler)
+    quiz_drafts.init_app(app, scheduler)
+
+    @app.cli.command('flush-answer-drafts')
+    def flush_answer_drafts_command():
+        """Write buffered exam and quiz answer drafts to the database."""
+        flushed = exam_drafts.flush() + quiz_drafts.flush()
+        click.echo(f"Flushed {flushed} answer drafts.")
+
+
+exam_drafts = DraftBuffer(ExamAnswerDraft, ('attempt_id',), 'exam_answer_drafts')
+quiz_drafts = DraftBuffer(QuizAnswerDraft, ('student_id', 'quiz_id'), 'quiz_answer_drafts')
@@ -0,0 +1,114 @@
+# utils/bootstrap.py
+"""
+One-time database bootstrap: schema creation and default seed data.
+
+Runs either from the CLI (``flask bootstrap-db``) or lazily on the first
+request a worker process serves. The work is idempotent and serialised
+across gunicorn workers with a file lock, so any number of processes can
+start at once without racing on the SuperAdmin / SchoolClass inserts.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+import click
+from flask import current_app
+
+from utils.extensions import db
+from utils.helpers import get_class_choices
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_bootstrapped = False
+_bootstrap_guard = threading.Lock()
+
+
+@contextmanager
+def _file_lock(path):
+    """Hold an exclusive, cross-process lock on ``path`` for the block."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a+') as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _lock_path(app):
+    return app.config.get('BOOTSTRAP_LOCK_FILE') or os.path.join(app.instance_path, 'bootstrap.lock')
+
+
+def bootstrap_database(app=None):
+    """
+    Create tables and seed the SuperAdmin and default classes.
+
+    Safe to call repeatedly; returns a dict describing what was created.
+    """
+    from models import Admin, SchoolClass
+
+    app = app or current_app._get_current_object()
+    created = {'admin': False, 'classes': []}
+
+    with _file_lock(_lock_path(app)):
+        db.create_all()
+
+        if not Admin.query.filter_by(username='SuperAdmin').first():
+            admin = Admin(username='SuperAdmin', admin_id='ADM001')
+            admin.set_password('Password123')
+            db.session.add(admin)
+            created['admin'] = True
+
+        existing_classes = {name for (name,) in db.session.query(SchoolClass.name)}
+        for class_name, _ in get_class_choices():
+            if class_name not in existing_classes:
+                db.session.add(SchoolClass(name=class_name))
+                created['classes'].append(class_name)
+
+        db.session.commit()
+
+    return created
+
+
+def ensure_bootstrapped(app=None):
+    """Run the bootstrap once per process; later calls return immediately."""
+    global _bootstrapped
+    if _bootstrapped:
+        return
+    with _bootstrap_guard:
+        if _bootstrapped:
+            return
+        bootstrap_database(app)
+        _bootstrapped = True
+
+
+def init_bootstrap(app):
+    """Register the ``bootstrap-db`` command and the first-request hook."""
+
+    @app.cli.command('bootstrap-db')
+    def bootstrap_db_command():
+        """Create tables and seed default records."""
+        created = bootstrap_database(app)
+        if created['admin']:
+            click.echo("SuperAdmin created.")
+        if created['classes']:
+            click.echo(f"Added classes: {', '.join(created['classes'])}")
+        click.echo("Database bootstrap complete.")
+
+    if app.config.get('BOOTSTRAP_ON_FIRST_REQUEST', True):
+        @app.before_request
+        def bootstrap_on_first_request():
+            if not _bootstrapped:
+                ensure_bootstrapped(app)
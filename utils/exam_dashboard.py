@@ -0,0 +1,82 @@
+# utils/exam_dashboard.py
+"""
+Student exam listings (``exam.exam_dashboard`` and ``exam.exams``).
+
+Both pages used to load every exam in the school and then query the
+student's submission once per exam. They now run one query: the exams of
+the student's class in the selected term, left-joined to the student's
+submission, with the Upcoming/Ongoing/Ended status computed in SQL.
+
+Terms are the two semesters of each ``AcademicYear``: semester 1 runs
+from the start of the year to the start of semester 2, semester 2 to the
+end of the year, so exams set during a break still fall in a term.
+Without any academic year configured the listing is not split by term.
+"""
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import and_, case, literal, select
+
+from models import AcademicYear, Exam, ExamSubmission
+from utils.extensions import db
+
+Term = namedtuple('Term', 'key label start end')
+
+
+def academic_terms():
+    """Every term, oldest first; ``start``/``end`` are datetimes, end exclusive."""
+    terms = []
+    years = AcademicYear.query.order_by(AcademicYear.start_date).all()
+    for year in years:
+        label = f"{year.start_date.year}/{year.end_date.year}"
+        s2 = datetime.combine(year.semester_2_start, time.min)
+        end = datetime.combine(year.end_date + timedelta(days=1), time.min)
+        terms.append(Term(f"{year.id}-1", f"{label} Semester 1",
+                          datetime.combine(year.start_date, time.min), s2))
+        terms.append(Term(f"{year.id}-2", f"{label} Semester 2", s2, end))
+    return terms
+
+
+def select_term(terms, key=None, today=None):
+    """The term named by ``key``, else the current one, else the latest."""
+    if not terms:
+        return None
+    for term in terms:
+        if term.key == key:
+            return term
+    now = datetime.combine(today or date.today(), time.min)
+    for term in terms:
+        if term.start <= now < term.end:
+            return term
+    past = [t for t in terms if t.start <= now]
+    return past[-1] if past else terms[0]
+
+
+def student_exams_stmt(student_id, class_name=None, term=None, now=None):
+    """
+    Exams with ``status`` and the student's ``submission_id`` (or None),
+    newest first. ``class_name`` None lists every class.
+    """
+    now = now or datetime.utcnow()
+    status = case(
+        (Exam.start_datetime > literal(now), 'Upcoming'),
+        (Exam.end_datetime >= literal(now), 'Ongoing'),
+        else_='Ended',
+    ).label('status')
+    stmt = (
+        select(Exam.id, Exam.title, Exam.subject, Exam.start_datetime, Exam.end_datetime,
+               Exam.assignment_mode, Exam.duration_minutes,
+               ExamSubmission.id.label('submission_id'), status)
+        .outerjoin(ExamSubmission, and_(ExamSubmission.exam_id == Exam.id,
+                                        ExamSubmission.student_id == student_id))
+        .order_by(Exam.start_datetime.desc())
+    )
+    if class_name is not None:
+        stmt = stmt.where(Exam.assigned_class == class_name)
+    if term is not None:
+        stmt = stmt.where(Exam.start_datetime >= term.start, Exam.start_datetime < term.end)
+    return stmt
+
+
+def student_exam_rows(student_id, class_name=None, term=None, now=None):
+    return db.session.execute(student_exams_stmt(student_id, class_name, term, now)).all()
@@ -0,0 +1,275 @@
+# utils/exam_monitor.py
+"""
+Live exam monitoring from in-memory counters.
+
+Invigilators had no live view of an exam; refreshing the admin pages to
+see who had started or submitted re-ran full-table queries each time.
+``exam_monitor`` keeps, per exam and in process, which students have
+started, when each was last seen and who has submitted. The exam routes
+report to it as things happen (attempt start, paper/package load,
+autosave and sync batches, submission, the deadline sweeper), so a
+snapshot is a few set operations and costs nothing at the database.
+
+Counts:
+
+* ``expected``: students in the exam's class
+* ``started``: students with a started attempt or a submission
+* ``active``: started, not submitted and seen in the last
+  ``EXAM_MONITOR_ACTIVE_WINDOW`` seconds; ``idle`` is the rest still open
+* ``submitted`` and ``not_started``
+
+Events only reach the process that handled them, and rows can change
+behind the app's back, so a scheduler job (``EXAM_MONITOR_RECONCILE_INTERVAL``)
+rebuilds the counters of exams that are running or being watched from
+``ExamAttempt``, ``ExamSubmission`` and recent answer drafts, with one
+grouped query per table for all of them. Events recorded while it runs
+are kept.
+
+The admin stream (``/admin/exam/<id>/monitor/stream``) is Server-Sent
+Events: it waits on a condition that events notify, sends a snapshot
+when the counts change (at most every ``EXAM_MONITOR_PUSH_INTERVAL``
+seconds) and a keep-alive comment otherwise, and ends after
+``EXAM_MONITOR_STREAM_MAX`` seconds so the browser reconnects and no
+worker is held indefinitely.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import func, select
+
+from models import Exam, ExamAnswerDraft, ExamAttempt, ExamSubmission, StudentProfile, User
+from utils.extensions import db
+
+
+class _ExamCounters:
+    __slots__ = ('exam_id', 'expected', 'started', 'submitted', 'last_seen',
+                 'version', 'watched_at', 'reconciled_at')
+
+    def __init__(self, exam_id):
+        self.exam_id = exam_id
+        self.expected = None
+        self.started = {}  # student_id -> time of the local event (0 if from the database)
+        self.submitted = {}
+        self.last_seen = {}  # student_id -> time.time()
+        self.version = 0
+        self.watched_at = 0.0
+        self.reconciled_at = None
+
+
+class ExamMonitor:
+    def __init__(self):
+        self.active_window = 120
+        self.push_interval = 2
+        self.keepalive = 15
+        self.stream_max = 300
+        self._exams = {}
+        self._changed = threading.Condition()
+        self.events = self.reconciles = 0
+
+    def init_app(self, app, scheduler=None):
+        self.active_window = app.config.get('EXAM_MONITOR_ACTIVE_WINDOW', 120)
+        self.push_interval = app.config.get('EXAM_MONITOR_PUSH_INTERVAL', 2)
+        self.stream_max = app.config.get('EXAM_MONITOR_STREAM_MAX', 300)
+        interval = app.config.get('EXAM_MONITOR_RECONCILE_INTERVAL', 30)
+        if scheduler is not None and interval:
+            scheduler.add_job('exam_monitor_reconcile', interval, self.reconcile)
+
+    # --- events --------------------------------------------------------------
+
+    def _record(self, exam_id, student_id, started=False, submitted=False):
+        if not exam_id or not student_id:
+            return
+        now = time.time()
+        with self._changed:
+            counters = self._exams.get(exam_id)
+            if counters is None:
+                counters = self._exams[exam_id] = _ExamCounters(exam_id)
+            changed = False
+            if started or submitted:
+                changed |= counters.started.setdefault(student_id, now) == now
+            if submitted:
+                changed |= counters.submitted.setdefault(student_id, now) == now
+            else:
+                # Only a newly active student changes the counts.
+                last = counters.last_seen.get(student_id, 0)
+                changed |= now - last > self.active_window
+                counters.last_seen[student_id] = now
+            self.events += 1
+            if changed:
+                counters.version += 1
+                self._changed.notify_all()
+
+    def attempt_started(self, exam_id, student_id):
+        self._record(exam_id, student_id, started=True)
+
+    def seen(self, exam_id, student_id):
+        """Activity on an attempt: paper load, autosave or sync."""
+        self._record(exam_id, student_id, started=True)
+
+    def submitted(self, exam_id, student_id):
+        self._record(exam_id, student_id, submitted=True)
+
+    # --- reads ---------------------------------------------------------------
+
+    def _snapshot(self, counters, now):
+        cutoff = now - self.active_window
+        started = counters.started.keys()
+        submitted = counters.submitted.keys()
+        open_ = started - submitted
+        active = sum(1 for sid in open_ if counters.last_seen.get(sid, 0) >= cutoff)
+        expected = counters.expected
+        return {
+            'exam_id': counters.exam_id,
+            'expected': expected,
+            'started': len(started),
+            'active': active,
+            'idle': len(open_) - active,
+            'submitted': len(submitted),
+            'not_started': max(0, expected - len(started)) if expected is not None else None,
+            'reconciled_at': (counters.reconciled_at.isoformat() + 'Z'
+                              if counters.reconciled_at else None),
+        }
+
+    def watch(self, exam):
+        """Start following an exam (counted from the database the first time)."""
+        counters = self._exams.get(exam.id)
+        if counters is None or counters.reconciled_at is None:
+            self.reconcile(exam_ids=[exam.id])
+            counters = self._exams[exam.id]
+        counters.watched_at = time.time()
+
+    def snapshot(self, exam_id):
+        with self._changed:
+            counters = self._exams.get(exam_id)
+            if counters is None:
+                counters = self._exams[exam_id] = _ExamCounters(exam_id)
+            return self._snapshot(counters, time.time())
+
+    def stream(self, exam_id):
+        """Server-Sent Events for one exam; uses no database connection."""
+        ends = time.monotonic() + self.stream_max
+        sent, version = None, -1
+        yield f"retry: {int(self.push_interval * 1000)}\n\n"
+        while time.monotonic() < ends:
+            with self._changed:
+                counters = self._exams.get(exam_id)
+                if counters is None:
+                    counters = self._exams[exam_id] = _ExamCounters(exam_id)
+                if counters.version == version:
+                    self._changed.wait_for(lambda: counters.version != version, timeout=self.keepalive)
+                counters.watched_at = time.time()
+                version = counters.version
+                snapshot = self._snapshot(counters, time.time())
+            if snapshot != sent:
+                sent = snapshot
+                yield f"event: counts\ndata: {json.dumps(snapshot)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            time.sleep(self.push_interval)  # coalesce bursts of events
+
+    # --- reconciliation ------------------------------------------------------
+
+    def _live_exam_ids(self, now):
+        watched_since = time.time() - 2 * self.stream_max
+        watched = [eid for eid, c in list(self._exams.items()) if c.watched_at >= watched_since]
+        running = db.session.execute(
+            select(Exam.id).where(Exam.start_datetime <= now + timedelta(minutes=10),
+                                  Exam.end_datetime >= now - timedelta(minutes=10))
+        ).scalars().all()
+        return set(running) | set(watched)
+
+    def reconcile(self, exam_ids=None):
+        """
+        Rebuild the counters of running and watched exams (or of
+        ``exam_ids``) from the database; returns how many exams changed.
+        """
+        began = time.time()
+        now = datetime.utcnow()
+        full = exam_ids is None
+        exam_ids = sorted(set(exam_ids) if exam_ids is not None else self._live_exam_ids(now))
+        if not exam_ids:
+            return 0
+
+        classes = dict(db.session.execute(
+            select(Exam.id, Exam.assigned_class).where(Exam.id.in_(exam_ids))).all())
+        expected = dict(db.session.execute(
+            select(StudentProfile.current_class, func.count(User.id))
+            .join(User, User.user_id == StudentProfile.user_id)
+            .where(User.role == 'student', StudentProfile.current_class.in_(set(classes.values())))
+            .group_by(StudentProfile.current_class)).all())
+        started, submitted, seen = {}, {}, {}
+        for exam_id, student_id in db.session.execute(
+                select(ExamAttempt.exam_id, ExamAttempt.student_id)
+                .where(ExamAttempt.exam_id.in_(exam_ids), ExamAttempt.start_time.isnot(None))):
+            started.setdefault(exam_id, {})[student_id] = 0
+        for exam_id, student_id in db.session.execute(
+                select(ExamSubmission.exam_id, ExamSubmission.student_id)
+                .where(ExamSubmission.exam_id.in_(exam_ids))):
+            started.setdefault(exam_id, {})[student_id] = 0
+            submitted.setdefault(exam_id, {})[student_id] = 0
+        window_start = now - timedelta(seconds=self.active_window)
+        for exam_id, student_id, updated_at in db.session.execute(
+                select(ExamAttempt.exam_id, ExamAttempt.student_id, func.max(ExamAnswerDraft.updated_at))
+                .join(ExamAnswerDraft, ExamAnswerDraft.attempt_id == ExamAttempt.id)
+                .where(ExamAttempt.exam_id.in_(exam_ids), ExamAnswerDraft.updated_at >= window_start)
+                .group_by(ExamAttempt.exam_id, ExamAttempt.student_id)):
+            if isinstance(updated_at, str):  # SQLite returns max() of a DateTime as text
+                updated_at = datetime.fromisoformat(updated_at)
+            seen.setdefault(exam_id, {})[student_id] = began - (now - updated_at).total_seconds()
+
+        changed = 0
+        with self._changed:
+            for exam_id in exam_ids:
+                counters = self._exams.get(exam_id)
+                if counters is None:
+                    counters = self._exams[exam_id] = _ExamCounters(exam_id)
+                before = self._snapshot(counters, began)
+                before.pop('reconciled_at')
+                # Keep events recorded here while the queries ran.
+                counters.started = {**started.get(exam_id, {}), **{
+                    sid: t for sid, t in counters.started.items() if t >= began}}
+                counters.submitted = {**submitted.get(exam_id, {}), **{
+                    sid: t for sid, t in counters.submitted.items() if t >= began}}
+                for sid, t in seen.get(exam_id, {}).items():
+                    counters.last_seen[sid] = max(t, counters.last_seen.get(sid, 0))
+                cutoff = began - self.active_window
+                counters.last_seen = {sid: t for sid, t in counters.last_seen.items() if t >= cutoff}
+                counters.expected = expected.get(classes.get(exam_id), 0) if exam_id in classes else None
+                after = self._snapshot(counters, began)
+                after.pop('reconciled_at')
+                counters.reconciled_at = now
+                if after != before:
+                    counters.version += 1
+                    changed += 1
+            # Forget exams nobody runs or watches any more.
+            if full:
+                live = set(exam_ids)
+                idle_since = began - 2 * self.stream_max
+                for exam_id in [eid for eid, c in self._exams.items()
+                                if eid not in live and c.watched_at < idle_since
+                                and (c.reconciled_at is None or c.reconciled_at < now - timedelta(hours=1))]:
+                    del self._exams[exam_id]
+            self.reconciles += 1
+            if changed:
+                self._changed.notify_all()
+        return changed
+
+    def stats(self):
+        return {'exams': len(self._exams), 'events': self.events, 'reconciles': self.reconciles}
+
+
+exam_monitor = ExamMonitor()
+
+
+def init_exam_monitor(app, scheduler=None):
+    exam_monitor.init_app(app, scheduler)
+
+    @app.cli.command('exam-monitor')
+    @click.argument('exam_id', type=int)
+    def exam_monitor_command(exam_id):
+        """Print an exam's live counts (rebuilt from the database)."""
+        exam_monitor.reconcile(exam_ids=[exam_id])
+        click.echo(json.dumps(exam_monitor.snapshot(exam_id), indent=2))
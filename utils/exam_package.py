@@ -0,0 +1,152 @@
+# utils/exam_package.py
+"""
+Offline-capable exam delivery: a signed paper package, compressed answer
+sync and a signed submission bundle.
+
+On a congested school network every click on ``take_exam`` was a
+round-trip that could fail: the paper, each autosave batch and the final
+submit all had to get through while the student was answering. In package
+mode (``EXAM_PACKAGE_MODE``) the page instead downloads one package when
+it opens:
+
+* the compiled paper (utils/exam_papers.py: questions and options, never
+  the answer key), gzip-compressed on the wire
+* a token signed with the app's secret (itsdangerous) that names the
+  attempt, exam, student and set and carries the paper's ETag, so the
+  package can be checked against the paper it was built from
+* the attempt's deadline and how often to sync
+
+Answers are kept in the browser and synced every
+``EXAM_PACKAGE_SYNC_INTERVAL`` seconds (and when the page is hidden) as
+one gzip- or deflate-compressed batch of changes, applied through
+``apply_batch`` exactly like autosave (utils/answer_drafts.py), so a lost
+sync costs nothing but the next one. The final submit posts a ``bundle``
+field with the token, the last ``seq`` and every answer; ``submit_exam``
+verifies the token before trusting it. A sync or bundle that fails
+verification is rejected, and the submit falls back to the autosaved
+drafts plus the posted form.
+
+Tokens are only good for ``EXAM_PACKAGE_MAX_AGE`` seconds; the attempt's
+deadline and the sweeper (utils/exam_timer.py) still decide what counts.
+"""
+import gzip
+import json
+import zlib
+
+from flask import current_app
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from utils.answer_drafts import MAX_BATCH_CHANGES
+
+SALT = 'exam-package'
+MAX_BODY_BYTES = 1024 * 1024  # decompressed sync / bundle payload
+
+
+class PackageError(ValueError):
+    """A package token, sync batch or submission bundle that cannot be trusted."""
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=SALT)
+
+
+def package_token(attempt, paper):
+    """Signed token tying an attempt to the paper it was given."""
+    return _serializer().dumps({
+        'a': attempt.id, 'e': attempt.exam_id, 'u': attempt.student_id,
+        's': attempt.set_id, 'p': paper.etag,
+    })
+
+
+def verify_token(token, attempt_id=None, student_id=None):
+    """
+    Claims of a package token (``a``ttempt, ``e``xam, ``u``ser, ``s``et,
+    ``p``aper ETag); raises PackageError when it is forged, expired or for
+    another attempt or student.
+    """
+    if not isinstance(token, str) or not token:
+        raise PackageError("missing package token")
+    try:
+        claims = _serializer().loads(token, max_age=current_app.config.get('EXAM_PACKAGE_MAX_AGE', 6 * 3600))
+    except SignatureExpired:
+        raise PackageError("package token expired")
+    except BadSignature:
+        raise PackageError("package token is not valid")
+    if attempt_id is not None and claims.get('a') != attempt_id:
+        raise PackageError("package token is for another attempt")
+    if student_id is not None and claims.get('u') != student_id:
+        raise PackageError("package token is for another student")
+    return claims
+
+
+def build_package(attempt, paper, sync_url, submit_url):
+    """
+    The package body as JSON bytes. The compiled paper's bytes are spliced
+    in as they are, so a cached paper is not parsed or re-encoded per student.
+    """
+    head = json.dumps({
+        'attempt_id': attempt.id,
+        'token': package_token(attempt, paper),
+        'paper_etag': paper.etag,
+        'deadline': attempt.deadline.isoformat() + 'Z' if attempt.deadline else None,
+        'sync_url': sync_url,
+        'submit_url': submit_url,
+        'sync_interval': current_app.config.get('EXAM_PACKAGE_SYNC_INTERVAL', 60),
+    }, separators=(',', ':'))
+    return head[:-1].encode('utf-8') + b',"paper":' + paper.body + b'}'
+
+
+def compress(body, accept_encodings):
+    """``(body, encoding)``: gzip when the client accepts it."""
+    if 'gzip' in accept_encodings:
+        return gzip.compress(body, compresslevel=6), 'gzip'
+    return body, None
+
+
+def _inflate(data, encoding):
+    if encoding in (None, '', 'identity'):
+        inflated = data
+    elif encoding in ('gzip', 'deflate'):
+        # 'deflate' from the browser's CompressionStream is zlib-wrapped.
+        wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+        try:
+            inflater = zlib.decompressobj(wbits)
+            inflated = inflater.decompress(data, MAX_BODY_BYTES + 1)
+        except zlib.error:
+            raise PackageError("body could not be decompressed")
+    else:
+        raise PackageError(f"unsupported content encoding: {encoding}")
+    if len(inflated) > MAX_BODY_BYTES:
+        raise PackageError("body too large")
+    return inflated
+
+
+def read_json(data, encoding=None):
+    """A (possibly compressed) JSON object body; PackageError when it is not one."""
+    try:
+        payload = json.loads(_inflate(data, (encoding or '').strip().lower()))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise PackageError("body is not JSON")
+    if not isinstance(payload, dict):
+        raise PackageError("body is not a JSON object")
+    return payload
+
+
+def read_bundle(value, student_id):
+    """
+    Verify a submission bundle (``{token, seq, answers: {question_id:
+    option_id}}``) posted as JSON text; returns ``(claims, answers)``.
+    """
+    bundle = read_json(value.encode('utf-8') if isinstance(value, str) else value)
+    claims = verify_token(bundle.get('token'), student_id=student_id)
+    items = bundle.get('answers') or {}
+    if not isinstance(items, dict) or len(items) > MAX_BATCH_CHANGES:
+        raise PackageError("answers must be an object")
+    try:
+        answers = {
+            int(q_id): int(option_id) if option_id not in (None, '') else None
+            for q_id, option_id in items.items()
+        }
+    except (TypeError, ValueError):
+        raise PackageError("answers must map question ids to option ids")
+    return claims, answers
@@ -0,0 +1,113 @@
+# utils/exam_papers.py
+"""
+Compiled exam papers for ``take_exam``.
+
+Every load of the exam page used to re-join the set's questions, load
+their options and build the same nested dicts, so a class opening an exam
+at its start time built one paper per student. A paper is now compiled
+once per (exam, set) with a single query, serialized to JSON bytes and
+kept in process together with a strong ETag (a hash of the bytes).
+
+A cached paper is used while its version matches the exam row just
+loaded: ``Exam.paper_version`` (bumped by ``utils.grading`` on any change
+to questions, options, sets or set membership) plus the exam fields that
+are part of the payload. The paper endpoint answers ``If-None-Match``
+with 304, so a reload only transfers the paper again after an edit.
+"""
+import json
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+
+from sqlalchemy import select
+
+from models import ExamOption, ExamQuestion, ExamSetQuestion
+from utils.extensions import db
+
+
+class CompiledPaper:
+    __slots__ = ('version', 'body', 'etag', 'question_count')
+
+    def __init__(self, version, payload):
+        self.version = version
+        self.body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        self.etag = sha256(self.body).hexdigest()[:32]
+        self.question_count = len(payload['questions'])
+
+
+class PaperCache:
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._papers = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, cache_key, version, compile_fn):
+        with self._lock:
+            cached = self._papers.get(cache_key)
+            if cached is not None and cached.version == version:
+                self._papers.move_to_end(cache_key)
+                self.hits += 1
+                return cached
+        self.misses += 1
+        paper = CompiledPaper(version, compile_fn())
+        with self._lock:
+            self._papers[cache_key] = paper
+            self._papers.move_to_end(cache_key)
+            while len(self._papers) > self.maxsize:
+                self._papers.popitem(last=False)
+        return paper
+
+    def clear(self):
+        with self._lock:
+            self._papers.clear()
+
+    def stats(self):
+        return {'size': len(self._papers), 'hits': self.hits, 'misses': self.misses}
+
+
+paper_cache = PaperCache()
+
+
+def _exam_version(exam):
+    return (exam.paper_version, exam.title, exam.duration_minutes,
+            exam.start_datetime, exam.end_datetime)
+
+
+def paper_for_exam(exam, set_id=None):
+    """Paper for the student's set, or for the whole pool when no set is assigned."""
+    def compile_paper():
+        stmt = (
+            select(ExamQuestion.id, ExamQuestion.question_text, ExamOption.id, ExamOption.text)
+            .outerjoin(ExamOption, ExamOption.question_id == ExamQuestion.id)
+        )
+        if set_id:
+            stmt = (stmt.join(ExamSetQuestion, ExamSetQuestion.question_id == ExamQuestion.id)
+                    .where(ExamSetQuestion.set_id == set_id)
+                    .order_by(ExamSetQuestion.order, ExamQuestion.id, ExamOption.id))
+        else:
+            stmt = (stmt.where(ExamQuestion.exam_id == exam.id)
+                    .order_by(ExamQuestion.id, ExamOption.id))
+
+        questions = {}
+        for question_id, question_text, option_id, option_text in db.session.execute(stmt):
+            question = questions.get(question_id)
+            if question is None:
+                question = questions[question_id] = {
+                    "id": question_id,
+                    "question_text": question_text,
+                    "options": [],
+                }
+            if option_id is not None:
+                question["options"].append({"id": option_id, "text": option_text})
+
+        return {
+            "id": exam.id,
+            "title": exam.title,
+            "duration_minutes": exam.duration_minutes,
+            "start_datetime": exam.start_datetime.strftime("%Y-%m-%d %H:%M:%S"),
+            "end_datetime": exam.end_datetime.strftime("%Y-%m-%d %H:%M:%S"),
+            "questions": list(questions.values()),
+        }
+
+    return paper_cache.get((exam.id, set_id), _exam_version(exam), compile_paper)
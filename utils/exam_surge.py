@@ -0,0 +1,183 @@
+# utils/exam_surge.py
+"""
+Exam start-time surge control.
+
+A whole class opens an exam within the same minute, and every student
+used to compile the paper and insert an attempt row at once; on SQLite
+the inserts queue on the write lock until some fail.
+
+Pre-warm: a scheduler job looks for exams starting within
+``EXAM_PREWARM_LEAD`` seconds. For each it tops up the planned set
+allocations (utils/set_allocation.py), compiles the paper and answer key
+of every set (and the pool) into this process's caches, and inserts one
+*unstarted* attempt (``start_time`` NULL) with the planned set for every
+student of ``assigned_class`` who has none yet. Starting the exam
+then only stamps ``start_time`` on that row. The inserts use
+``INSERT ... SELECT ... WHERE NOT EXISTS`` so workers running the job at
+the same time do not create duplicates. ``choice`` exams get attempts
+without a set; the student still picks one.
+
+Admission: ``exam_admission`` caps how many attempt starts run at once in
+a process. A request that cannot get a slot within
+``EXAM_ADMISSION_WAIT`` seconds is answered 503 with ``Retry-After``
+instead of waiting on the database lock.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import Boolean, Integer, bindparam, exists, insert, literal, select
+
+from models import Exam, ExamAttempt, ExamSet, ExamSubmission, StudentProfile, User
+from utils.extensions import db
+from utils.exam_papers import paper_for_exam
+from utils.grading import answer_key_for_exam
+from utils.set_allocation import allocation_map, plan_set_allocation
+
+
+# --- pre-warm ----------------------------------------------------------------
+
+def _insert_missing_attempts():
+    table = ExamAttempt.__table__
+    exam_id = bindparam('b_exam_id', type_=Integer)
+    student_id = bindparam('b_student_id', type_=Integer)
+    source = select(
+        exam_id, bindparam('b_set_id', type_=Integer), student_id, literal(False, Boolean),
+    ).where(~exists().where(table.c.exam_id == exam_id, table.c.student_id == student_id))
+    return insert(table).from_select(
+        ['exam_id', 'set_id', 'student_id', 'submitted'], source, include_defaults=False)
+
+
+def prewarm_exam(exam):
+    """
+    Plan set allocations, warm the exam's papers and answer keys and
+    pre-create attempts; returns the attempt count.
+    """
+    plan_set_allocation(exam)
+    db.session.commit()
+
+    set_ids = db.session.execute(select(ExamSet.id).where(ExamSet.exam_id == exam.id)).scalars().all()
+    for set_id in [None] + set_ids:
+        paper_for_exam(exam, set_id)
+        answer_key_for_exam(exam, set_id)
+
+    started = select(ExamAttempt.student_id).where(ExamAttempt.exam_id == exam.id)
+    submitted = select(ExamSubmission.student_id).where(ExamSubmission.exam_id == exam.id)
+    students = db.session.execute(
+        select(User.id)
+        .join(StudentProfile, StudentProfile.user_id == User.user_id)
+        .where(User.role == 'student',
+               StudentProfile.current_class == exam.assigned_class,
+               User.id.not_in(started),
+               User.id.not_in(submitted))
+    ).scalars().all()
+    if not students:
+        return 0
+
+    allocations = allocation_map(exam.id)  # empty for 'choice' exams
+    rows = [
+        {'b_exam_id': exam.id, 'b_student_id': student_id, 'b_set_id': allocations.get(student_id)}
+        for student_id in students
+    ]
+    result = db.session.execute(_insert_missing_attempts(), rows)
+    db.session.commit()
+    return max(result.rowcount, 0)
+
+
+class ExamPrewarmer:
+    def __init__(self):
+        self.lead = 300
+        self._warmed = set()  # (exam_id, paper_version) already warmed in this process
+        self._app = None
+        self.runs = self.attempts_created = 0
+
+    def init_app(self, app, scheduler=None):
+        self._app = app
+        self.lead = app.config.get('EXAM_PREWARM_LEAD', 300)
+        interval = app.config.get('EXAM_PREWARM_INTERVAL', 60)
+        if scheduler is not None and interval and self.lead:
+            scheduler.add_job('exam_prewarm', interval, self.run)
+
+    def run(self):
+        """Warm every exam starting within the lead time (or running now)."""
+        now = datetime.utcnow()
+        exams = Exam.query.filter(
+            Exam.start_datetime <= now + timedelta(seconds=self.lead),
+            Exam.end_datetime >= now,
+        ).all()
+        for exam in exams:
+            key = (exam.id, exam.paper_version)
+            if key in self._warmed:
+                continue
+            self.attempts_created += prewarm_exam(exam)
+            self._warmed.add(key)
+        self.runs += 1
+
+    def stats(self):
+        return {'runs': self.runs, 'warmed': len(self._warmed),
+                'attempts_created': self.attempts_created}
+
+
+exam_prewarmer = ExamPrewarmer()
+
+
+# --- admission ---------------------------------------------------------------
+
+class AdmissionGate:
+    """Per-process cap on concurrent exam starts."""
+
+    def __init__(self):
+        self.limit = 0
+        self.wait = 0.5
+        self.retry_after = 3
+        self._slots = None
+        self.admitted = self.rejected = 0
+
+    def init_app(self, app):
+        self.limit = app.config.get('EXAM_ADMISSION_LIMIT', 8)
+        self.wait = app.config.get('EXAM_ADMISSION_WAIT', 0.5)
+        self.retry_after = app.config.get('EXAM_ADMISSION_RETRY_AFTER', 3)
+        self._slots = threading.BoundedSemaphore(self.limit) if self.limit else None
+
+    @contextmanager
+    def slot(self):
+        """Yield True with a slot held, or False when the gate is full."""
+        if self._slots is None:
+            yield True
+            return
+        if not self._slots.acquire(timeout=self.wait):
+            self.rejected += 1
+            yield False
+            return
+        self.admitted += 1
+        try:
+            yield True
+        finally:
+            self._slots.release()
+
+    def retry_after_seconds(self):
+        # Jitter so rejected clients do not all come back in the same second.
+        return self.retry_after + random.randint(0, self.retry_after)
+
+    def stats(self):
+        return {'limit': self.limit, 'admitted': self.admitted, 'rejected': self.rejected}
+
+
+exam_admission = AdmissionGate()
+
+
+def init_exam_surge(app, scheduler=None):
+    exam_admission.init_app(app)
+    exam_prewarmer.init_app(app, scheduler)
+
+    @app.cli.command('prewarm-exam')
+    @click.argument('exam_id', type=int)
+    def prewarm_exam_command(exam_id):
+        """Pre-create attempts (with sets) for an exam's class and compile its papers."""
+        exam = db.session.get(Exam, exam_id)
+        if exam is None:
+            raise click.ClickException(f"Exam {exam_id} not found")
+        created = prewarm_exam(exam)
+        click.echo(f"Pre-created {created} attempts for exam {exam_id}.")
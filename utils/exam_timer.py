@@ -0,0 +1,198 @@
+# utils/exam_timer.py
+"""
+Server-side exam deadlines and the auto-submit sweeper.
+
+The exam timer used to live in the session (``exam_<id>_start_time``) and
+in the page's countdown; nothing closed an attempt whose student closed
+the tab, so such attempts stayed open and a late POST was graded like any
+other. Starting an attempt now stores its ``deadline`` (start plus the
+exam's duration, capped at the exam's end), so every timing check in the
+request path is a column comparison.
+
+A scheduler job sweeps attempts that are still open ``EXAM_SUBMIT_GRACE``
+seconds past their deadline, found through ``ix_exam_attempts_open_deadline``
+(submitted, deadline). Each batch loads the attempts' autosaved drafts
+with one query, grades them against the cached answer keys and, in one
+transaction, stores the submissions and their answers, closes the
+attempts and deletes the drafts. The grace period covers the
+write-behind draft buffers of other workers (see utils/answer_drafts.py)
+and a submit that was already on its way.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import bindparam, insert, select, update
+
+from models import Exam, ExamAnswer, ExamAnswerDraft, ExamAttempt, ExamSubmission
+from utils.answer_drafts import exam_drafts
+from utils.exam_monitor import exam_monitor
+from utils.extensions import db
+from utils.grading import answer_key_for_exam, answer_rows
+
+
+def attempt_deadline(exam, start):
+    """When an attempt started at ``start`` runs out of time."""
+    deadline = start + timedelta(minutes=exam.duration_minutes or 0)
+    if exam.end_datetime is not None:
+        deadline = min(deadline, exam.end_datetime)
+    return deadline
+
+
+def start_attempt(attempt, exam, now=None):
+    """Stamp the start time and deadline on an attempt; the caller commits."""
+    attempt.start_time = now or datetime.utcnow()
+    attempt.deadline = attempt_deadline(exam, attempt.start_time)
+
+
+def seconds_left(attempt, now=None):
+    """Whole seconds until the attempt's deadline (0 when past), or None without one."""
+    if attempt.deadline is None:
+        return None
+    return max(0, int((attempt.deadline - (now or datetime.utcnow())).total_seconds()))
+
+
+def sweep_expired_attempts(now=None, batch_size=200, grace=30):
+    """
+    Submit every open attempt more than ``grace`` seconds past its deadline;
+    returns a summary dict. Each batch is its own transaction.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=grace)
+    summary = {'closed': 0, 'submitted': 0, 'batches': 0}
+
+    att_table = ExamAttempt.__table__
+    close_attempts = (
+        update(att_table)
+        .where(att_table.c.id == bindparam('b_id'), att_table.c.submitted.is_(False))
+        .values(submitted=True, submitted_at=bindparam('b_now'),
+                end_time=bindparam('b_end'), score=bindparam('b_score'))
+    )
+    insert_submissions = insert(ExamSubmission.__table__).returning(
+        ExamSubmission.__table__.c.id, sort_by_parameter_order=True)
+
+    exam_drafts.flush()  # this worker's buffered saves; others flush within the grace
+    exams = {}
+    while True:
+        attempts = db.session.execute(
+            select(ExamAttempt.id, ExamAttempt.exam_id, ExamAttempt.set_id,
+                   ExamAttempt.student_id, ExamAttempt.deadline)
+            .where(ExamAttempt.submitted.is_(False), ExamAttempt.deadline < cutoff)
+            .order_by(ExamAttempt.deadline)
+            .limit(batch_size)
+        ).all()
+        if not attempts:
+            break
+
+        ids = [a.id for a in attempts]
+        drafts = defaultdict(dict)
+        for draft in db.session.execute(
+            select(ExamAnswerDraft.attempt_id, ExamAnswerDraft.question_id,
+                   ExamAnswerDraft.selected_option_id, ExamAnswerDraft.answer_text)
+            .where(ExamAnswerDraft.attempt_id.in_(ids))
+        ):
+            drafts[draft.attempt_id][draft.question_id] = {
+                'selected_option_id': draft.selected_option_id, 'answer_text': draft.answer_text}
+
+        # A student may already hold a submission (e.g. one made without an attempt id).
+        exam_ids = {a.exam_id for a in attempts}
+        submitted = set(db.session.execute(
+            select(ExamSubmission.exam_id, ExamSubmission.student_id)
+            .where(ExamSubmission.exam_id.in_(exam_ids),
+                   ExamSubmission.student_id.in_({a.student_id for a in attempts}))
+        ).tuples())
+        missing = exam_ids - exams.keys()
+        if missing:
+            exams.update((e.id, e) for e in Exam.query.filter(Exam.id.in_(missing)))
+
+        now = datetime.utcnow()
+        closes, scripts = [], []
+        for a in attempts:
+            if (a.exam_id, a.student_id) in submitted:
+                closes.append({'b_id': a.id, 'b_now': now, 'b_end': a.deadline, 'b_score': None})
+                continue
+            key = answer_key_for_exam(exams[a.exam_id], a.set_id)
+            script = drafts.get(a.id, {})
+            answers = {q_id: d['selected_option_id'] for q_id, d in script.items()}
+            score = key.grade(answers)
+            closes.append({'b_id': a.id, 'b_now': now, 'b_end': a.deadline, 'b_score': score})
+            scripts.append((a, score, answer_rows(key, answers, script)))
+
+        db.session.execute(close_attempts, closes)
+        if scripts:
+            # Re-checked under the write lock: a submit may have landed since the read.
+            submitted = set(db.session.execute(
+                select(ExamSubmission.exam_id, ExamSubmission.student_id)
+                .where(ExamSubmission.exam_id.in_(exam_ids),
+                       ExamSubmission.student_id.in_({a.student_id for a, _, _ in scripts}))
+            ).tuples())
+            scripts = [s for s in scripts if (s[0].exam_id, s[0].student_id) not in submitted]
+        if scripts:
+            submission_ids = db.session.execute(insert_submissions, [
+                {'exam_id': a.exam_id, 'student_id': a.student_id, 'set_id': a.set_id,
+                 'score': score, 'submitted_at': now}
+                for a, score, _ in scripts
+            ]).scalars().all()
+            answer_values = [
+                {'submission_id': sid, 'question_id': q_id,
+                 'selected_option_id': option_id, 'answer_text': answer_text}
+                for sid, (_, _, rows) in zip(submission_ids, scripts)
+                for q_id, option_id, answer_text in rows
+            ]
+            if answer_values:
+                db.session.execute(insert(ExamAnswer), answer_values)
+        ExamAnswerDraft.query.filter(ExamAnswerDraft.attempt_id.in_(ids)).delete(
+            synchronize_session=False)
+        db.session.commit()
+        for a, _, _ in scripts:
+            exam_monitor.submitted(a.exam_id, a.student_id)
+
+        summary['batches'] += 1
+        summary['closed'] += len(closes)
+        summary['submitted'] += len(scripts)
+        if len(attempts) < batch_size:
+            break
+    return summary
+
+
+class AttemptSweeper:
+    def __init__(self):
+        self.grace = 30
+        self.batch_size = 200
+        self.runs = self.closed = self.submitted = 0
+
+    def init_app(self, app, scheduler=None):
+        self.grace = app.config.get('EXAM_SUBMIT_GRACE', 30)
+        self.batch_size = app.config.get('EXAM_SWEEP_BATCH', 200)
+        interval = app.config.get('EXAM_SWEEP_INTERVAL', 30)
+        if scheduler is not None and interval:
+            scheduler.add_job('exam_attempt_sweep', interval, self.run)
+
+    def expired(self, attempt, now=None):
+        """True once an attempt is past its deadline plus the grace period."""
+        if attempt.deadline is None:
+            return False
+        return (now or datetime.utcnow()) > attempt.deadline + timedelta(seconds=self.grace)
+
+    def run(self):
+        summary = sweep_expired_attempts(batch_size=self.batch_size, grace=self.grace)
+        self.runs += 1
+        self.closed += summary['closed']
+        self.submitted += summary['submitted']
+        return summary
+
+    def stats(self):
+        return {'runs': self.runs, 'closed': self.closed, 'submitted': self.submitted}
+
+
+attempt_sweeper = AttemptSweeper()
+
+
+def init_exam_timer(app, scheduler=None):
+    attempt_sweeper.init_app(app, scheduler)
+
+    @app.cli.command('sweep-exam-attempts')
+    def sweep_exam_attempts_command():
+        """Auto-submit open exam attempts that are past their deadline."""
+        summary = attempt_sweeper.run()
+        click.echo(f"Closed {summary['closed']} attempts ({summary['submitted']} submitted) "
+                   f"in {summary['batches']} batches.")
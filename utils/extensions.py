@@ -4,3 +4,15 @@ from flask_socketio import SocketIO
 
 db = SQLAlchemy()
 mail = Mail()
+
+
+def insert_for_dialect():
+    """The bound dialect's ``insert`` with ``on_conflict_do_update``, or None."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert
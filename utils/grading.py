@@ -0,0 +1,258 @@
+# utils/grading.py
+"""
+Compiled answer keys for grading exams and quizzes.
+
+Grading used to walk ``exam.questions`` and lazy-load each question's
+options to find the correct one (an N+1 per submission). An answer key is
+now compiled once per exam set / exam pool / quiz with a single query and
+kept in process, so grading is one pass over a dict.
+
+``Exam.paper_version`` and ``Quiz.paper_version`` are bumped in the same
+flush as any insert, update or delete of a question, an option or (for
+exams) a set or set membership. A cached key is only used while its
+version matches the row just loaded, so edits made by another worker
+are picked up on the next submission. The same hook refreshes the stored
+totals (utils/paper_totals.py).
+"""
+import threading
+from collections import OrderedDict
+from itertools import chain
+
+from sqlalchemy import and_, event, select, update
+from sqlalchemy.orm import Session
+
+from models import (
+    Exam, ExamOption, ExamQuestion, ExamSet, ExamSetQuestion, Option, Question, Quiz,
+)
+from utils.extensions import db
+from utils.paper_totals import refresh_totals
+
+_PENDING_KEY = 'paper_versions_pending'
+
+
+class AnswerKey:
+    """question_id -> (correct option ids, marks) for one paper."""
+    __slots__ = ('version', 'items', 'max_score')
+
+    def __init__(self, version, items):
+        self.version = version
+        self.items = items
+        self.max_score = sum(marks for _, marks in items.values())
+
+    def __contains__(self, question_id):
+        return question_id in self.items
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def grade(self, answers):
+        """Total marks for ``{question_id: selected option id}``."""
+        return score_answers(self.items, answers)
+
+
+def score_answers(items, answers):
+    """
+    Plain-data scoring shared by ``AnswerKey.grade`` and the re-grade
+    workers, which receive ``items`` pickled instead of an ``AnswerKey``.
+    """
+    score = 0
+    for question_id, (correct, marks) in items.items():
+        selected = answers.get(question_id)
+        if selected is None:
+            continue
+        try:
+            if int(selected) in correct:
+                score += marks
+        except (TypeError, ValueError):
+            continue
+    return score
+
+
+class AnswerKeyCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, cache_key, version, compile_fn):
+        with self._lock:
+            cached = self._keys.get(cache_key)
+            if cached is not None and cached.version == version:
+                self._keys.move_to_end(cache_key)
+                self.hits += 1
+                return cached
+        self.misses += 1
+        key = AnswerKey(version, compile_fn())
+        with self._lock:
+            self._keys[cache_key] = key
+            self._keys.move_to_end(cache_key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+        return key
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+    def stats(self):
+        return {'size': len(self._keys), 'hits': self.hits, 'misses': self.misses}
+
+
+answer_keys = AnswerKeyCache()
+
+
+def _collect(rows):
+    items = {}
+    for question_id, marks, option_id in rows:
+        correct, _ = items.get(question_id, (frozenset(), marks))
+        if option_id is not None:
+            correct = correct | {option_id}
+        items[question_id] = (correct, marks or 0)
+    return items
+
+
+def answer_key_for_exam(exam, set_id=None):
+    """Key for the student's set, or for the whole pool when no set is assigned."""
+    def compile_key():
+        stmt = (
+            select(ExamQuestion.id, ExamQuestion.marks, ExamOption.id)
+            .outerjoin(ExamOption, and_(ExamOption.question_id == ExamQuestion.id,
+                                        ExamOption.is_correct.is_(True)))
+        )
+        if set_id:
+            stmt = (stmt.join(ExamSetQuestion, ExamSetQuestion.question_id == ExamQuestion.id)
+                    .where(ExamSetQuestion.set_id == set_id))
+        else:
+            stmt = stmt.where(ExamQuestion.exam_id == exam.id)
+        return _collect(db.session.execute(stmt))
+
+    return answer_keys.get(('exam', exam.id, set_id), exam.paper_version, compile_key)
+
+
+def answer_key_for_quiz(quiz):
+    def compile_key():
+        stmt = (
+            select(Question.id, Question.points, Option.id)
+            .outerjoin(Option, and_(Option.question_id == Question.id, Option.is_correct.is_(True)))
+            .where(Question.quiz_id == quiz.id)
+        )
+        return _collect(db.session.execute(stmt))
+
+    return answer_keys.get(('quiz', quiz.id), quiz.paper_version, compile_key)
+
+
+def answers_from_form(form):
+    """``{question_id: option id}`` from ``answers[<question_id>]`` form fields."""
+    answers = {}
+    for name, value in form.items():
+        if name.startswith('answers[') and name.endswith(']') and value:
+            try:
+                answers[int(name[8:-1])] = value
+            except ValueError:
+                continue
+    return answers
+
+
+def answer_rows(answer_key, answers, drafts=None):
+    """
+    ``(question_id, option_id, answer_text)`` for every question on the
+    paper, as stored in ``exam_answers``; text comes from the drafts.
+    """
+    drafts = drafts or {}
+    rows = []
+    for question_id in answer_key:
+        option_id = answers.get(question_id)
+        try:
+            option_id = int(option_id) if option_id is not None else None
+        except (TypeError, ValueError):
+            option_id = None
+        answer_text = drafts[question_id]['answer_text'] if question_id in drafts else None
+        rows.append((question_id, option_id, answer_text))
+    return rows
+
+
+# --- version stamps ----------------------------------------------------------
+
+def _changed(session):
+    for obj in chain(session.new, session.deleted):
+        yield obj
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            yield obj
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_paper_changes(session, flush_context):
+    exam_ids, quiz_ids = set(), set()
+    exam_question_ids, quiz_question_ids, set_ids = set(), set(), set()
+
+    for obj in _changed(session):
+        if isinstance(obj, ExamQuestion) or isinstance(obj, ExamSet):
+            exam_ids.add(obj.exam_id)
+        elif isinstance(obj, ExamOption):
+            exam_question_ids.add(obj.question_id)
+        elif isinstance(obj, ExamSetQuestion):
+            set_ids.add(obj.set_id)
+        elif isinstance(obj, Question):
+            quiz_ids.add(obj.quiz_id)
+        elif isinstance(obj, Option):
+            quiz_question_ids.add(obj.question_id)
+
+    if not (exam_ids or quiz_ids or exam_question_ids or quiz_question_ids or set_ids):
+        return
+
+    conn = session.connection()
+    pending = session.info.setdefault(_PENDING_KEY, {'exam': set(), 'quiz': set(), 'set': set()})
+    if exam_question_ids:
+        exam_ids.update(conn.execute(
+            select(ExamQuestion.exam_id).where(ExamQuestion.id.in_(exam_question_ids))).scalars())
+    if set_ids:
+        exam_ids.update(conn.execute(
+            select(ExamSet.exam_id).where(ExamSet.id.in_(set_ids))).scalars())
+        sets = ExamSet.__table__
+        conn.execute(update(sets).where(sets.c.id.in_(set_ids)).values(version=sets.c.version + 1))
+        pending['set'].update(set_ids)
+    if quiz_question_ids:
+        quiz_ids.update(conn.execute(
+            select(Question.quiz_id).where(Question.id.in_(quiz_question_ids))).scalars())
+    exam_ids.discard(None)
+    quiz_ids.discard(None)
+
+    for model, ids, kind in ((Exam, exam_ids, 'exam'), (Quiz, quiz_ids, 'quiz')):
+        if ids:
+            table = model.__table__
+            conn.execute(update(table).where(table.c.id.in_(ids))
+                         .values(paper_version=table.c.paper_version + 1))
+            pending[kind].update(ids)
+    refresh_totals(conn, exam_ids, quiz_ids)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expire_paper_versions(session, flush_context):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    for model, kind in ((Exam, 'exam'), (Quiz, 'quiz')):
+        for pk in pending[kind]:
+            obj = session.identity_map.get(session.identity_key(model, pk))
+            if obj is not None:
+                session.expire(obj, ['paper_version', 'total_marks'])
+    if pending['exam'] or pending['set']:
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, ExamSet) and (obj.exam_id in pending['exam'] or obj.id in pending['set']):
+                session.expire(obj, ['total_marks', 'version'])
+
+
+def bump_paper_version(exam_id=None, quiz_id=None):
+    """Bump a version (and refresh totals) by hand after a bulk query that skips the flush hooks."""
+    for model, pk in ((Exam, exam_id), (Quiz, quiz_id)):
+        if pk is not None:
+            db.session.execute(update(model).where(model.id == pk)
+                               .values(paper_version=model.paper_version + 1))
+    refresh_totals(db.session.connection(),
+                   [exam_id] if exam_id is not None else (),
+                   [quiz_id] if quiz_id is not None else ())
@@ -0,0 +1,441 @@
+# utils/identity_cache.py
+"""
+Identity cache for Flask-Login's ``user_loader``.
+
+Every authenticated request used to query ``User``/``Admin`` and then
+lazily touch the profile tables. The cache keeps a compact ``Principal``
+per login id (``"user:STD001"`` / ``"admin:ADM001"``) in a bounded LRU,
+optionally backed by a small SQLite file shared between gunicorn workers.
+
+``load_user`` returns a ``CachedIdentity`` built from the principal. It
+answers the attributes views and templates read on every page (role, ids,
+names, class) without touching the database, and only loads the ORM row
+if something else is asked for (``set_password``, relationships, ...).
+
+Entries are dropped on ``set_password``, promotion and any update/delete
+of ``User``/``Admin`` or a profile row, and expire after a TTL regardless.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import url_for
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from utils.extensions import db
+
+
+class Principal:
+    """Plain, ORM-free snapshot of a logged-in account."""
+
+    __slots__ = (
+        'kind', 'pk', 'ident', 'login_id', 'role', 'username', 'email',
+        'first_name', 'middle_name', 'last_name', 'profile_picture',
+        'current_class', 'student_profile_id', 'teacher_profile_id',
+        'parent_profile_id', 'expires_at',
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class CachedIdentity(UserMixin):
+    """
+    ``current_user`` backed by a ``Principal``.
+
+    Cheap attributes come from the principal; anything else falls through
+    to the real ``User``/``Admin`` row, loaded once per request.
+    """
+
+    def __init__(self, principal):
+        self._principal = principal
+        self._row = None
+
+    def _load_row(self):
+        if self._row is None:
+            from models import Admin, User
+            p = self._principal
+            model = Admin if p.kind == 'admin' else User
+            self._row = db.session.get(model, p.pk)
+            if self._row is None:
+                raise AttributeError(f"{p.ident} no longer exists")
+        return self._row
+
+    def __getattr__(self, name):
+        # Reached for attributes not defined on this class, and when one of
+        # the properties below raises AttributeError (e.g. ``user_id`` on an
+        # admin). The latter must not cost a query.
+        if name.startswith('_') or name in _PRINCIPAL_ATTRS:
+            raise AttributeError(name)
+        return getattr(self._load_row(), name)
+
+    def __eq__(self, other):
+        if isinstance(other, CachedIdentity):
+            return self.get_id() == other.get_id()
+        get_id = getattr(other, 'get_id', None)
+        return callable(get_id) and get_id() == self.get_id()
+
+    def __hash__(self):
+        return hash(self.get_id())
+
+    def __repr__(self):
+        return f"<CachedIdentity {self._principal.ident}>"
+
+    def get_id(self):
+        return self._principal.ident
+
+    @property
+    def id(self):
+        return self._principal.pk
+
+    @property
+    def role(self):
+        return self._principal.role
+
+    @property
+    def username(self):
+        return self._principal.username
+
+    @property
+    def is_admin(self):
+        if self._principal.kind != 'admin':
+            raise AttributeError('is_admin')
+        return True
+
+    @property
+    def admin_id(self):
+        if self._principal.kind != 'admin':
+            raise AttributeError('admin_id')
+        return self._principal.login_id
+
+    @property
+    def user_id(self):
+        if self._principal.kind != 'user':
+            raise AttributeError('user_id')
+        return self._principal.login_id
+
+    def _user_field(self, name):
+        if self._principal.kind != 'user':
+            raise AttributeError(name)
+        return getattr(self._principal, name)
+
+    email = property(lambda self: self._user_field('email'))
+    first_name = property(lambda self: self._user_field('first_name'))
+    middle_name = property(lambda self: self._user_field('middle_name'))
+    last_name = property(lambda self: self._user_field('last_name'))
+    profile_picture = property(lambda self: self._user_field('profile_picture'))
+    current_class = property(lambda self: self._user_field('current_class'))
+    student_profile_id = property(lambda self: self._user_field('student_profile_id'))
+    teacher_profile_id = property(lambda self: self._user_field('teacher_profile_id'))
+    parent_profile_id = property(lambda self: self._user_field('parent_profile_id'))
+
+    @property
+    def is_student(self):
+        return self._user_field('role') == 'student'
+
+    @property
+    def is_teacher(self):
+        return self._user_field('role') == 'teacher'
+
+    @property
+    def full_name(self):
+        names = [self.first_name]
+        if self.middle_name:
+            names.append(self.middle_name)
+        names.append(self.last_name)
+        return ' '.join(names)
+
+    @property
+    def profile_picture_url(self):
+        if self.profile_picture:
+            return url_for("static", filename=f"uploads/profile_pictures/{self.profile_picture}")
+        return url_for("static", filename="uploads/profile_pictures/default.png")
+
+
+_PRINCIPAL_ATTRS = frozenset(
+    name for name, value in vars(CachedIdentity).items() if isinstance(value, property)
+)
+
+
+class _SharedTier:
+    """Cross-process tier: one SQLite table keyed by login id."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS identity_cache ("
+                " ident TEXT PRIMARY KEY, payload TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, ident, now):
+        row = self._conn().execute(
+            "SELECT payload, expires_at FROM identity_cache WHERE ident = ?", (ident,)
+        ).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        return Principal.from_dict(json.loads(row[0]))
+
+    def put(self, principal):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO identity_cache (ident, payload, expires_at) VALUES (?, ?, ?)",
+            (principal.ident, json.dumps(principal.to_dict()), principal.expires_at),
+        )
+
+    def delete(self, ident):
+        self._conn().execute("DELETE FROM identity_cache WHERE ident = ?", (ident,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM identity_cache")
+
+
+class IdentityCache:
+    """Bounded LRU of principals with TTL, plus an optional shared tier."""
+
+    def __init__(self, maxsize=4096, ttl=300, local_ttl=None, shared_path=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # ident -> (principal, local_expiry)
+        self.configure(maxsize=maxsize, ttl=ttl, local_ttl=local_ttl, shared_path=shared_path)
+
+    def configure(self, maxsize=4096, ttl=300, local_ttl=None, shared_path=None, enabled=True):
+        self.enabled = enabled
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = _SharedTier(shared_path) if shared_path else None
+        # With a shared tier, other workers can invalidate an entry, so the
+        # local copy is only trusted briefly before re-reading the shared row.
+        if local_ttl is None:
+            local_ttl = 5 if self.shared else ttl
+        self.local_ttl = min(local_ttl, ttl)
+        self.hits = self.shared_hits = self.misses = 0
+        self.invalidations = self.evictions = 0
+        with self._lock:
+            self._entries.clear()
+
+    # --- lookups -----------------------------------------------------------
+
+    def get(self, ident):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(ident)
+            if entry is not None:
+                principal, local_expiry = entry
+                if local_expiry > now and principal.expires_at > now:
+                    self._entries.move_to_end(ident)
+                    self.hits += 1
+                    return principal
+                del self._entries[ident]
+
+        if self.shared is not None:
+            try:
+                principal = self.shared.get(ident, now)
+            except sqlite3.Error:
+                principal = None
+            if principal is not None:
+                self._store_local(principal, now)
+                self.shared_hits += 1
+                return principal
+
+        self.misses += 1
+        return None
+
+    def put(self, principal):
+        if not self.enabled:
+            return
+        now = time.time()
+        principal.expires_at = now + self.ttl
+        self._store_local(principal, now)
+        if self.shared is not None:
+            try:
+                self.shared.put(principal)
+            except sqlite3.Error:
+                pass
+
+    def _store_local(self, principal, now):
+        with self._lock:
+            self._entries[principal.ident] = (principal, now + self.local_ttl)
+            self._entries.move_to_end(principal.ident)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, ident):
+        if not ident:
+            return
+        with self._lock:
+            self._entries.pop(ident, None)
+            self.invalidations += 1
+        if self.shared is not None:
+            try:
+                self.shared.delete(ident)
+            except sqlite3.Error:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'local_ttl': self.local_ttl,
+            'shared': self.shared.path if self.shared else None,
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'evictions': self.evictions,
+            'hit_ratio': round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+        }
+
+
+identity_cache = IdentityCache()
+
+
+def _build_principal(ident):
+    from models import Admin, User, StudentProfile, TeacherProfile, ParentProfile
+
+    kind, _, login_id = ident.partition(':')
+    if kind == 'admin':
+        admin = Admin.query.filter_by(admin_id=login_id).first()
+        if admin is None:
+            return None
+        return Principal(
+            kind='admin', pk=admin.id, ident=ident, login_id=admin.admin_id,
+            role='admin', username=admin.username,
+        )
+
+    if kind == 'user':
+        row = (
+            db.session.query(
+                User.id, User.user_id, User.role, User.username, User.email,
+                User.first_name, User.middle_name, User.last_name, User.profile_picture,
+                StudentProfile.id, StudentProfile.current_class,
+                TeacherProfile.id, ParentProfile.id,
+            )
+            .outerjoin(StudentProfile, StudentProfile.user_id == User.user_id)
+            .outerjoin(TeacherProfile, TeacherProfile.user_id == User.user_id)
+            .outerjoin(ParentProfile, ParentProfile.user_id == User.user_id)
+            .filter(User.user_id == login_id)
+            .first()
+        )
+        if row is None:
+            return None
+        return Principal(
+            kind='user', pk=row[0], ident=ident, login_id=row[1], role=row[2],
+            username=row[3], email=row[4], first_name=row[5], middle_name=row[6],
+            last_name=row[7], profile_picture=row[8], student_profile_id=row[9],
+            current_class=row[10], teacher_profile_id=row[11], parent_profile_id=row[12],
+        )
+
+    return None
+
+
+def load_identity(ident):
+    """``user_loader`` body: principal from cache, else one joined query."""
+    principal = identity_cache.get(ident)
+    if principal is None:
+        principal = _build_principal(ident)
+        if principal is None:
+            return None
+        identity_cache.put(principal)
+    return CachedIdentity(principal)
+
+
+def invalidate_identity(ident):
+    identity_cache.invalidate(ident)
+
+
+def invalidate_user(user_id):
+    """Drop the cached principal for a ``User.user_id``."""
+    if user_id:
+        identity_cache.invalidate(f"user:{user_id}")
+
+
+# --- ORM hooks ---------------------------------------------------------------
+
+_PENDING_KEY = 'identity_cache_pending'
+
+
+def _ident_for(target):
+    from models import Admin, User
+
+    if isinstance(target, Admin):
+        return f"admin:{target.admin_id}"
+    if isinstance(target, User):
+        return f"user:{target.user_id}"
+    user_id = getattr(target, 'user_id', None)
+    return f"user:{user_id}" if user_id else None
+
+
+def _on_change(mapper, connection, target):
+    ident = _ident_for(target)
+    if not ident:
+        return
+    # Drop now, and again after commit so a request that re-read the old row
+    # mid-transaction can't leave a stale principal behind.
+    identity_cache.invalidate(ident)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add(ident)
+
+
+@event.listens_for(Session, 'after_commit')
+def _flush_pending_invalidations(session):
+    for ident in session.info.pop(_PENDING_KEY, ()):
+        identity_cache.invalidate(ident)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending_invalidations(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def init_identity_cache(app):
+    """Configure the cache from app config and hook the identity models."""
+    from models import Admin, User, StudentProfile, TeacherProfile, ParentProfile
+
+    identity_cache.configure(
+        enabled=app.config.get('IDENTITY_CACHE_ENABLED', True),
+        maxsize=app.config.get('IDENTITY_CACHE_SIZE', 4096),
+        ttl=app.config.get('IDENTITY_CACHE_TTL', 300),
+        local_ttl=app.config.get('IDENTITY_CACHE_LOCAL_TTL'),
+        shared_path=app.config.get('IDENTITY_CACHE_SHARED_PATH'),
+    )
+
+    for model in (Admin, User, StudentProfile, TeacherProfile, ParentProfile):
+        for evt in ('after_insert', 'after_update', 'after_delete'):
+            if not event.contains(model, evt, _on_change):
+                event.listen(model, evt, _on_change)
@@ -0,0 +1,279 @@
+# utils/item_analysis.py
+"""
+Item analysis for exams: difficulty, discrimination, distractors and
+reliability, computed with NumPy over the stored ``exam_answers``.
+
+An exam's answers are loaded with one query into flat arrays
+``(submission, set, question, option)`` and turned into a student x
+question matrix of chosen option indexes (``NOT_PRESENTED`` where the
+question was not on the student's paper, ``BLANK`` where it was left
+unanswered). Every statistic is then a vectorized operation on that
+matrix:
+
+* difficulty: share of students presented with a question who got it right
+* discrimination: upper 27% minus lower 27% difficulty (by total score),
+  and the point-biserial correlation of the item with the rest score
+* distractors: how often each option (and blank) was chosen
+* reliability: KR-20 and Cronbach's alpha per paper (set), over the
+  questions every student of that set answered
+
+Results are cached per exam. The raw answer arrays are independent of the
+key, so when ``Exam.paper_version`` changes only the question/option
+metadata is reloaded; when new submissions arrive only their rows are
+loaded and appended. A deleted submission forces a full reload.
+
+Subjective questions (no options) are left out. Quiz submissions do not store per-question answers yet, so only exams are
+analysed; ``analyse`` itself only needs the arrays and the item metadata.
+"""
+import threading
+
+import numpy as np
+from sqlalchemy import func, select
+
+from models import ExamAnswer, ExamOption, ExamQuestion, ExamSubmission
+from utils.extensions import db
+
+NOT_PRESENTED = -2
+BLANK = -1
+GROUP_SHARE = 0.27  # size of the upper and lower groups for the discrimination index
+
+
+class _Items:
+    """Question and option metadata for one paper version."""
+
+    def __init__(self, rows):
+        self.question_ids, self.texts, self.marks = [], [], []
+        self.options = []  # per question: [(option id, text, is_correct)]
+        index = {}
+        for question_id, question_text, marks, option_id, option_text, is_correct in rows:
+            if question_id not in index:
+                index[question_id] = len(self.question_ids)
+                self.question_ids.append(question_id)
+                self.texts.append(question_text)
+                self.marks.append(marks or 0)
+                self.options.append([])
+            self.options[index[question_id]].append((option_id, option_text, bool(is_correct)))
+
+        self.question_index = index
+        self.width = max((len(o) for o in self.options), default=0)
+        self.option_index = {
+            option_id: k for opts in self.options for k, (option_id, _, _) in enumerate(opts)
+        }
+        self.correct = np.zeros((len(self.question_ids), max(self.width, 1)), dtype=bool)
+        for j, opts in enumerate(self.options):
+            for k, (_, _, is_correct) in enumerate(opts):
+                self.correct[j, k] = is_correct
+
+
+def _load_items(exam_id):
+    stmt = (
+        select(ExamQuestion.id, ExamQuestion.question_text, ExamQuestion.marks,
+               ExamOption.id, ExamOption.text, ExamOption.is_correct)
+        .join(ExamOption, ExamOption.question_id == ExamQuestion.id)  # objective questions only
+        .where(ExamQuestion.exam_id == exam_id)
+        .order_by(ExamQuestion.id, ExamOption.id)
+    )
+    return _Items(db.session.execute(stmt))
+
+
+def _load_answers(exam_id, after_id=0):
+    """``(submission, set, question, option)`` int64 columns; -1 for NULL set/option."""
+    stmt = (
+        select(ExamSubmission.id, ExamSubmission.set_id,
+               ExamAnswer.question_id, ExamAnswer.selected_option_id)
+        .join(ExamAnswer, ExamAnswer.submission_id == ExamSubmission.id)
+        .where(ExamSubmission.exam_id == exam_id, ExamSubmission.id > after_id)
+    )
+    rows = db.session.execute(stmt).all()
+    if not rows:
+        return np.empty((0, 4), dtype=np.int64)
+    return np.array([[s, -1 if g is None else g, q, -1 if o is None else o] for s, g, q, o in rows],
+                    dtype=np.int64)
+
+
+def _safe_div(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(b > 0, a / np.where(b > 0, b, 1), np.nan)
+
+
+def _col_nanmean(x, mask, counts):
+    return _safe_div(np.where(mask, x, 0.0).sum(axis=0), counts)
+
+
+def _reliability(correct, weighted, complete):
+    """KR-20 and Cronbach's alpha over fully presented columns; None when undefined."""
+    x = correct[:, complete]
+    w = weighted[:, complete]
+    k = x.shape[1]
+    if k < 2 or x.shape[0] < 2:
+        return None, None
+    total_var = x.sum(axis=1).var()
+    p = x.mean(axis=0)
+    kr20 = k / (k - 1) * (1 - (p * (1 - p)).sum() / total_var) if total_var > 0 else None
+    w_var = w.sum(axis=1).var(ddof=1)
+    alpha = k / (k - 1) * (1 - w.var(axis=0, ddof=1).sum() / w_var) if w_var > 0 else None
+    return kr20, alpha
+
+
+def _round(value, digits=4):
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value), digits)
+
+
+def analyse(answers, items):
+    """Item statistics for the answer arrays against ``items``; returns a JSON-ready dict."""
+    n_questions = len(items.question_ids)
+    submissions, rows = np.unique(answers[:, 0], return_inverse=True)
+    n_students = len(submissions)
+
+    # Student x question matrix of option indexes.
+    choice = np.full((n_students, n_questions), NOT_PRESENTED, dtype=np.int32)
+    groups = np.full(n_students, -1, dtype=np.int64)
+    if n_students and n_questions:
+        cols = np.array([items.question_index.get(q, -1) for q in answers[:, 2]], dtype=np.int64)
+        opts = np.array([items.option_index.get(o, BLANK) for o in answers[:, 3]], dtype=np.int32)
+        known = cols >= 0  # answers to questions deleted since are ignored
+        choice[rows[known], cols[known]] = opts[known]
+        groups[rows] = answers[:, 1]
+
+    presented = choice != NOT_PRESENTED
+    answered = choice >= 0
+    correct = np.zeros(choice.shape, dtype=float)
+    if n_questions and items.width:
+        j_idx = np.broadcast_to(np.arange(n_questions), choice.shape)
+        correct[answered] = items.correct[j_idx[answered], choice[answered]]
+
+    marks = np.asarray(items.marks, dtype=float)
+    weighted = correct * marks
+    score = weighted.sum(axis=1)
+    possible = (presented * marks).sum(axis=1)
+    pct = _safe_div(score, possible)
+    counts = presented.sum(axis=0)
+
+    difficulty = _col_nanmean(correct, presented, counts)
+
+    # Upper/lower groups by percentage score.
+    order = np.argsort(pct, kind='stable')
+    size = max(1, int(round(n_students * GROUP_SHARE))) if n_students >= 2 else 0
+    if size:
+        lower, upper = order[:size], order[-size:]
+        discrimination = (_col_nanmean(correct[upper], presented[upper], presented[upper].sum(axis=0))
+                          - _col_nanmean(correct[lower], presented[lower], presented[lower].sum(axis=0)))
+    else:
+        discrimination = np.full(n_questions, np.nan)
+
+    # Point-biserial: item against the rest of the student's score.
+    rest = score[:, None] - weighted
+    mx = _col_nanmean(correct, presented, counts)
+    mr = _col_nanmean(rest, presented, counts)
+    dx = np.where(presented, correct - mx, 0.0)
+    dr = np.where(presented, rest - mr, 0.0)
+    cov = _safe_div((dx * dr).sum(axis=0), counts)
+    sd = np.sqrt(_safe_div((dx ** 2).sum(axis=0), counts) * _safe_div((dr ** 2).sum(axis=0), counts))
+    point_biserial = _safe_div(cov, sd)
+
+    # Distractor counts: one column per option plus one for blank.
+    width = items.width + 1
+    picked = np.where(answered, choice, items.width)
+    flat = (np.arange(n_questions)[None, :] * width + picked)[presented]
+    frequencies = np.bincount(flat, minlength=n_questions * width).reshape(n_questions, width)
+
+    report_groups = []
+    for group in np.unique(groups):
+        members = groups == group
+        complete = presented[members].all(axis=0)
+        kr20, alpha = _reliability(correct[members], weighted[members], complete)
+        report_groups.append({
+            'set_id': None if group < 0 else int(group),
+            'students': int(members.sum()),
+            'items': int(complete.sum()),
+            'kr20': _round(kr20),
+            'alpha': _round(alpha),
+        })
+
+    report_items = []
+    for j, question_id in enumerate(items.question_ids):
+        n = int(counts[j])
+        report_items.append({
+            'question_id': question_id,
+            'question_text': items.texts[j],
+            'marks': items.marks[j],
+            'presented': n,
+            'difficulty': _round(difficulty[j]),
+            'discrimination': _round(discrimination[j]),
+            'point_biserial': _round(point_biserial[j]),
+            'options': [
+                {'option_id': option_id, 'text': text, 'is_correct': is_correct,
+                 'count': int(frequencies[j, k]), 'share': _round(frequencies[j, k] / n) if n else None}
+                for k, (option_id, text, is_correct) in enumerate(items.options[j])
+            ],
+            'blank': int(frequencies[j, items.width]),
+        })
+
+    return {
+        'scripts': n_students,
+        'mean_score': _round(np.nanmean(pct)) if n_students else None,
+        'sd_score': _round(np.nanstd(pct)) if n_students else None,
+        'groups': report_groups,
+        'items': report_items,
+    }
+
+
+class _Entry:
+    __slots__ = ('version', 'items', 'answers', 'count', 'last_id', 'report')
+
+
+class ItemAnalysisCache:
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = self.incremental = self.rebuilds = 0
+
+    def report(self, exam):
+        """The item analysis of ``exam``, reusing whatever is still current."""
+        count, last_id = db.session.execute(
+            select(func.count(ExamSubmission.id), func.coalesce(func.max(ExamSubmission.id), 0))
+            .where(ExamSubmission.exam_id == exam.id)
+        ).one()
+
+        with self._lock:
+            entry = self._entries.get(exam.id)
+        if entry is not None and entry.version == exam.paper_version \
+                and entry.count == count and entry.last_id == last_id:
+            self.hits += 1
+            return entry.report
+
+        fresh = _Entry()
+        fresh.version = exam.paper_version
+        fresh.count, fresh.last_id = count, last_id
+        if entry is not None and entry.count <= count and entry.last_id <= last_id:
+            new_rows = _load_answers(exam.id, entry.last_id)
+            if entry.count + len(np.unique(new_rows[:, 0])) == count:
+                # Only new submissions since the cached run (no deletions).
+                fresh.answers = np.concatenate([entry.answers, new_rows])
+                self.incremental += 1
+            else:
+                fresh.answers = _load_answers(exam.id)
+                self.rebuilds += 1
+            fresh.items = entry.items if entry.version == exam.paper_version else _load_items(exam.id)
+        else:
+            fresh.answers = _load_answers(exam.id)
+            fresh.items = _load_items(exam.id)
+            self.rebuilds += 1
+
+        fresh.report = dict(analyse(fresh.answers, fresh.items),
+                            exam_id=exam.id, paper_version=exam.paper_version)
+        with self._lock:
+            self._entries[exam.id] = fresh
+            while len(self._entries) > self.maxsize:
+                self._entries.pop(next(iter(self._entries)))
+        return fresh.report
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits,
+                'incremental': self.incremental, 'rebuilds': self.rebuilds}
+
+
+item_analysis = ItemAnalysisCache()
@@ -0,0 +1,191 @@
+# utils/notification_counters.py
+"""
+Per-user unread notification counters.
+
+Badges used to run a ``NotificationRecipient`` COUNT on every template
+render (and, for admins, a COUNT over the whole table). Counters are now
+kept in ``notification_unread_counters`` and updated in the same
+transaction that creates recipients or marks them read, so a badge is a
+primary-key lookup. The row keyed ``'*'`` holds the global total admins
+see. A counter row that does not exist yet is seeded from a COUNT the
+first time it is bumped or read, so it starts from the real number. A
+periodic job recomputes everything to correct any
+drift (e.g. rows removed through the database browser).
+"""
+from collections import Counter
+from datetime import datetime
+
+import click
+from sqlalchemy import case, func, literal, select, update
+
+from models import NotificationRecipient, NotificationUnreadCounter
+from utils.extensions import db, insert_for_dialect
+
+GLOBAL_KEY = '*'
+
+
+def bump_unread(user_ids):
+    """
+    Add one unread notification per occurrence of each user id.
+
+    Call inside the transaction that adds the ``NotificationRecipient``
+    rows; the caller commits. Those rows are flushed first, so a counter
+    that does not exist yet is seeded with the full unread count
+    (including them) rather than just this delta.
+    """
+    deltas = Counter(uid for uid in user_ids if uid)
+    if not deltas:
+        return
+    deltas[GLOBAL_KEY] = sum(deltas.values())
+    db.session.flush()
+
+    table = NotificationUnreadCounter.__table__
+    now = datetime.utcnow()
+    insert = insert_for_dialect()
+    if insert is None:
+        for uid, n in deltas.items():
+            row = db.session.get(NotificationUnreadCounter, uid)
+            if row is None:
+                db.session.add(NotificationUnreadCounter(
+                    user_id=uid, unread_count=_count_unread(uid), updated_at=now))
+            else:
+                row.unread_count += n
+                row.updated_at = now
+        return
+
+    stmt = insert(table).values([
+        {'user_id': uid, 'unread_count': _unread_subquery(uid), 'updated_at': now}
+        for uid in deltas
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={
+            'unread_count': table.c.unread_count + case(dict(deltas), value=table.c.user_id, else_=0),
+            'updated_at': now,
+        },
+    )
+    db.session.execute(stmt)
+
+
+def mark_read(user_id, count=1):
+    """Take ``count`` off the user's (and the global) counter, floored at 0."""
+    if not user_id or count <= 0:
+        return
+    table = NotificationUnreadCounter.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.user_id.in_([user_id, GLOBAL_KEY]))
+        .values(
+            unread_count=case((table.c.unread_count > count, table.c.unread_count - count), else_=0),
+            updated_at=datetime.utcnow(),
+        )
+    )
+
+
+def _unread_subquery(user_id):
+    nr = NotificationRecipient.__table__
+    stmt = select(func.count(nr.c.id)).where(nr.c.is_read.is_(False))
+    if user_id != GLOBAL_KEY:
+        stmt = stmt.where(nr.c.user_id == user_id)
+    return stmt.scalar_subquery()
+
+
+def _count_unread(user_id):
+    query = db.session.query(func.count(NotificationRecipient.id)).filter(
+        NotificationRecipient.is_read.is_(False)
+    )
+    if user_id != GLOBAL_KEY:
+        query = query.filter(NotificationRecipient.user_id == user_id)
+    return query.scalar() or 0
+
+
+def get_unread_count(user_id=None):
+    """
+    Unread count for ``user_id`` (or the global total when ``None``).
+
+    A user without a counter row yet is counted once and seeded inside a
+    savepoint, so the caller's transaction (this runs mid-render from a
+    context processor) is neither committed nor rolled back.
+    """
+    key = user_id or GLOBAL_KEY
+    table = NotificationUnreadCounter.__table__
+    count = db.session.execute(
+        select(table.c.unread_count).where(table.c.user_id == key)
+    ).scalar()
+    if count is not None:
+        return count
+
+    count = _count_unread(key)
+    insert = insert_for_dialect()
+    try:
+        with db.session.begin_nested():
+            if insert is not None:
+                db.session.execute(
+                    insert(table)
+                    .values(user_id=key, unread_count=count, updated_at=datetime.utcnow())
+                    .on_conflict_do_nothing(index_elements=[table.c.user_id])
+                )
+            else:
+                db.session.add(NotificationUnreadCounter(user_id=key, unread_count=count))
+    except Exception:
+        pass  # seeding is best effort; the savepoint is already rolled back
+    return count
+
+
+def reconcile_unread_counters():
+    """
+    Recompute every counter from ``notification_recipients``.
+
+    Each step is a single statement, so increments committed while it runs
+    are not lost. Returns the number of counters that were corrected.
+    """
+    table = NotificationUnreadCounter.__table__
+    nr = NotificationRecipient.__table__
+    now = datetime.utcnow()
+
+    per_user = (
+        select(func.count(nr.c.id))
+        .where(nr.c.user_id == table.c.user_id, nr.c.is_read.is_(False))
+        .scalar_subquery()
+    )
+    total = select(func.count(nr.c.id)).where(nr.c.is_read.is_(False)).scalar_subquery()
+    actual = case((table.c.user_id == GLOBAL_KEY, total), else_=per_user)
+
+    corrected = db.session.execute(
+        update(table)
+        .where(table.c.unread_count != actual)
+        .values(unread_count=actual, updated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    missing = (
+        select(nr.c.user_id, func.count(nr.c.id), literal(now, db.DateTime))
+        .where(nr.c.is_read.is_(False), nr.c.user_id.not_in(select(table.c.user_id)))
+        .group_by(nr.c.user_id)
+    )
+    inserted = db.session.execute(
+        table.insert().from_select(['user_id', 'unread_count', 'updated_at'], missing)
+    ).rowcount
+
+    if db.session.get(NotificationUnreadCounter, GLOBAL_KEY) is None:
+        db.session.add(NotificationUnreadCounter(
+            user_id=GLOBAL_KEY, unread_count=_count_unread(GLOBAL_KEY), updated_at=now
+        ))
+        inserted += 1
+
+    db.session.commit()
+    return corrected + inserted
+
+
+def init_notification_counters(app, scheduler=None):
+    """Register the reconcile CLI command and the periodic job."""
+
+    @app.cli.command('reconcile-notifications')
+    def reconcile_notifications_command():
+        """Recompute unread notification counters."""
+        fixed = reconcile_unread_counters()
+        click.echo(f"Reconciled unread counters ({fixed} corrected).")
+
+    interval = app.config.get('NOTIFICATION_RECONCILE_INTERVAL', 900)
+    if scheduler is not None and interval:
+        scheduler.add_job('reconcile_unread_counters', interval, reconcile_unread_counters)
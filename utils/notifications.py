@@ -2,6 +2,7 @@
 from datetime import datetime
 from models import db, Notification, NotificationRecipient, User, StudentProfile
 from flask_login import current_user
+from utils.notification_counters import bump_unread
 
 def create_assignment_notification(assignment):
     """
@@ -40,6 +41,7 @@ def create_assignment_notification(assignment):
     ]
     if recipients:
         db.session.add_all(recipients)
+        bump_unread(r.user_id for r in recipients)
 
     db.session.commit()
     return notice
@@ -89,6 +91,7 @@ def create_fee_notification(fee):
 
     if recipients:
         db.session.add_all(recipients)
+        bump_unread(r.user_id for r in recipients)
 
     db.session.commit()
     return notice
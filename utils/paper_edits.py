@@ -0,0 +1,227 @@
+# utils/paper_edits.py
+"""
+Diff-based saving of edited quiz papers and exam questions.
+
+``edit_quiz`` used to delete every question and option of the quiz and
+insert them again from the form, and ``edit_exam_question`` did the same
+with a question's options. A one-word fix rewrote the whole paper, gave
+every row a new id and left stored answers pointing at rows that no
+longer existed.
+
+The edit forms now post the ids of the rows they were built from. The
+submitted paper is matched against the stored one (by id, then by
+identical content, then, for forms that post no ids, by position among
+the rows left over) and only the difference is written, with one
+statement per kind of change: a ``DELETE ... IN`` for removed rows, an
+executemany ``UPDATE`` for changed ones and a multi-row ``INSERT ...
+RETURNING`` for new ones.
+Unchanged rows are not touched and keep their ids.
+
+These are Core statements, so the ORM flush hooks do not see them; when
+anything changed the paper version is bumped once and the stored totals
+refreshed (utils/grading.py) and the touched questions re-indexed for
+search (utils/question_search.py), in the caller's transaction.
+"""
+from collections import defaultdict
+
+from sqlalchemy import bindparam, delete, insert, select, update
+
+from models import ExamOption, ExamQuestion, Option, Question
+from utils.extensions import db
+from utils.grading import bump_paper_version
+from utils import question_search
+
+
+class PaperEdit:
+    """Counts of what a save wrote; ``changed`` is False for a no-op save."""
+
+    def __init__(self):
+        self.questions = {'inserted': 0, 'updated': 0, 'deleted': 0}
+        self.options = {'inserted': 0, 'updated': 0, 'deleted': 0}
+        self.touched = set()  # question ids whose text or options changed
+
+    @property
+    def changed(self):
+        return any(self.questions.values()) or any(self.options.values())
+
+    def summary(self):
+        parts = [f"{n} {what}" for what, n in (
+            ('questions added', self.questions['inserted']),
+            ('questions changed', self.questions['updated']),
+            ('questions removed', self.questions['deleted']),
+            ('options added', self.options['inserted']),
+            ('options changed', self.options['updated']),
+            ('options removed', self.options['deleted']),
+        ) if n]
+        return ", ".join(parts) or "no changes"
+
+
+def match_rows(existing, submitted, fields):
+    """
+    Pair submitted rows with stored ones.
+
+    ``existing`` are dicts with ``id`` and ``fields``, ``submitted`` dicts
+    with ``fields`` and an optional ``id``. Returns ``(matches, updates,
+    deletes)``: the stored id for each submitted row (None for a new row),
+    ``{id: changed values}`` and the ids no submitted row claimed.
+
+    Rows left over are paired by position only when no submitted row has
+    an id: a form that posts ids marks its new rows by leaving the id out,
+    while the fixed true/false, math and subjective layouts (and older
+    forms) post none.
+    """
+    by_id = {row['id']: row for row in existing}
+    matches = [None] * len(submitted)
+    free = dict(by_id)
+
+    def key(row):
+        return tuple(row.get(f) for f in fields)
+
+    for i, row in enumerate(submitted):  # 1. by id
+        pk = row.get('id')
+        if pk in free:
+            matches[i] = pk
+            del free[pk]
+    by_content = defaultdict(list)
+    for pk, row in free.items():
+        by_content[key(row)].append(pk)
+    for i, row in enumerate(submitted):  # 2. unchanged rows posted without an id
+        if matches[i] is None and by_content.get(key(row)):
+            pk = by_content[key(row)].pop(0)
+            matches[i] = pk
+            del free[pk]
+    leftovers = iter(list(free) if not any(row.get('id') for row in submitted) else ())
+    for i in range(len(submitted)):  # 3. edited rows of a form without ids, in order
+        if matches[i] is None:
+            pk = next(leftovers, None)
+            if pk is None:
+                break
+            matches[i] = pk
+            del free[pk]
+
+    updates = {}
+    for pk, row in zip(matches, submitted):
+        if pk is None:
+            continue
+        changed = {f: row[f] for f in fields if f in row and row[f] != by_id[pk][f]}
+        if changed:
+            updates[pk] = changed
+    return matches, updates, list(free)
+
+
+def _update_rows(connection, table, updates):
+    """One executemany UPDATE per set of changed columns."""
+    groups = defaultdict(list)
+    for pk, values in updates.items():
+        groups[tuple(sorted(values))].append(
+            dict({'b_id': pk}, **{f'b_{col}': value for col, value in values.items()}))
+    for columns, rows in groups.items():
+        connection.execute(
+            update(table).where(table.c.id == bindparam('b_id'))
+            .values({col: bindparam(f'b_{col}') for col in columns}),
+            rows,
+        )
+
+
+def _save_options(connection, option_model, edit, stored, submitted):
+    """Diff the options of several questions at once: ``{question_id: [rows]}`` each."""
+    table = option_model.__table__
+    inserts, updates, deletes = [], {}, []
+    for question_id, rows in submitted.items():
+        matches, changed, removed = match_rows(stored.get(question_id, []), rows, ('text', 'is_correct'))
+        inserts.extend({'question_id': question_id, 'text': row['text'], 'is_correct': row['is_correct']}
+                       for pk, row in zip(matches, rows) if pk is None)
+        updates.update(changed)
+        deletes.extend(removed)
+        if changed or removed or None in matches:
+            edit.touched.add(question_id)
+    if deletes:
+        connection.execute(delete(table).where(table.c.id.in_(deletes)))
+    if updates:
+        _update_rows(connection, table, updates)
+    if inserts:
+        connection.execute(insert(table), inserts)
+    edit.options['inserted'] += len(inserts)
+    edit.options['updated'] += len(updates)
+    edit.options['deleted'] += len(deletes)
+
+
+def _stored_options(connection, option_model, question_ids):
+    stored = defaultdict(list)
+    if question_ids:
+        for row in connection.execute(
+            select(option_model.id, option_model.question_id, option_model.text, option_model.is_correct)
+            .where(option_model.question_id.in_(question_ids))
+            .order_by(option_model.id)
+        ).mappings():
+            stored[row['question_id']].append(dict(row, is_correct=bool(row['is_correct'])))
+    return stored
+
+
+def _finish(connection, edit, kind, exam_id=None, quiz_id=None):
+    if not edit.changed:
+        return edit
+    bump_paper_version(exam_id=exam_id, quiz_id=quiz_id)
+    if question_search.available(connection):
+        question_search.reindex(connection, **{f'{kind}_question_ids': edit.touched})
+    return edit
+
+
+def save_quiz_questions(quiz_id, submitted):
+    """
+    Save a quiz's questions as posted: ``[{'id'?, 'text', 'options': [{'id'?,
+    'text', 'is_correct'}]}]``. Returns a ``PaperEdit``; the caller commits.
+    """
+    connection = db.session.connection()
+    table = Question.__table__
+    stored = [dict(row) for row in connection.execute(
+        select(Question.id, Question.text).where(Question.quiz_id == quiz_id).order_by(Question.id)
+    ).mappings()]
+    options = _stored_options(connection, Option, [row['id'] for row in stored])
+
+    edit = PaperEdit()
+    matches, updates, deletes = match_rows(stored, submitted, ('text',))
+    if deletes:
+        connection.execute(delete(Option.__table__).where(Option.question_id.in_(deletes)))
+        connection.execute(delete(table).where(table.c.id.in_(deletes)))
+        edit.options['deleted'] += sum(len(options.get(pk, ())) for pk in deletes)
+    if updates:
+        _update_rows(connection, table, updates)
+    new = [row for pk, row in zip(matches, submitted) if pk is None]
+    if new:
+        ids = iter(connection.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True),
+            [{'quiz_id': quiz_id, 'text': row['text'], 'points': 1.0} for row in new],
+        ).scalars().all())
+        matches = [pk if pk is not None else next(ids) for pk in matches]
+    edit.questions.update(inserted=len(new), updated=len(updates), deleted=len(deletes))
+    edit.touched.update(updates, deletes)
+
+    _save_options(connection, Option, edit, options,
+                  {pk: row.get('options', []) for pk, row in zip(matches, submitted)})
+    return _finish(connection, edit, 'quiz', quiz_id=quiz_id)
+
+
+def save_exam_question(question, values, submitted_options):
+    """
+    Save one exam question's fields (``question_text``, ``question_type``,
+    ``marks``) and options as posted; returns a ``PaperEdit``. The caller
+    commits.
+    """
+    connection = db.session.connection()
+    table = ExamQuestion.__table__
+    edit = PaperEdit()
+
+    stored = connection.execute(
+        select(table.c.question_text, table.c.question_type, table.c.marks).where(table.c.id == question.id)
+    ).mappings().one()
+    changed = {f: v for f, v in values.items() if stored[f] != v}
+    if changed:
+        connection.execute(update(table).where(table.c.id == question.id).values(changed))
+        edit.questions['updated'] = 1
+        edit.touched.add(question.id)
+
+    _save_options(connection, ExamOption, edit, _stored_options(connection, ExamOption, [question.id]),
+                  {question.id: submitted_options})
+    db.session.expire(question)
+    return _finish(connection, edit, 'exam', exam_id=question.exam_id)
@@ -0,0 +1,91 @@
+# utils/paper_totals.py
+"""
+Stored paper totals: ``Exam.total_marks``, ``ExamSet.total_marks`` and
+``Quiz.total_marks``.
+
+``max_score`` used to be a property that loaded every question of the
+exam, set or quiz to sum its marks, and result pages called it once per
+row. The totals are now columns. The paper-version hook in
+utils/grading.py, which already sees every flush that adds, edits or
+deletes a question or changes set membership, recomputes them with one
+correlated ``UPDATE`` per table in the same transaction, so a total never
+disagrees with the questions it was committed with.
+
+``flask check-paper-totals`` compares the stored totals with a fresh sum
+(after bulk SQL that bypasses the session, say) and ``--fix`` rewrites
+the ones that drifted.
+"""
+import click
+from sqlalchemy import func, select, update
+
+from models import Exam, ExamQuestion, ExamSet, ExamSetQuestion, Question, Quiz
+from utils.extensions import db
+
+
+def _exam_total():
+    return (select(func.coalesce(func.sum(ExamQuestion.marks), 0))
+            .where(ExamQuestion.exam_id == Exam.id)
+            .scalar_subquery())
+
+
+def _set_total():
+    return (select(func.coalesce(func.sum(ExamQuestion.marks), 0))
+            .join(ExamSetQuestion, ExamSetQuestion.question_id == ExamQuestion.id)
+            .where(ExamSetQuestion.set_id == ExamSet.id)
+            .scalar_subquery())
+
+
+def _quiz_total():
+    return (select(func.coalesce(func.sum(Question.points), 0))
+            .where(Question.quiz_id == Quiz.id)
+            .scalar_subquery())
+
+
+def refresh_totals(connection, exam_ids=(), quiz_ids=()):
+    """Recompute the totals of these exams (and all their sets) and quizzes."""
+    if exam_ids:
+        connection.execute(update(Exam.__table__).where(Exam.id.in_(exam_ids))
+                           .values(total_marks=_exam_total()))
+        connection.execute(update(ExamSet.__table__).where(ExamSet.exam_id.in_(exam_ids))
+                           .values(total_marks=_set_total()))
+    if quiz_ids:
+        connection.execute(update(Quiz.__table__).where(Quiz.id.in_(quiz_ids))
+                           .values(total_marks=_quiz_total()))
+
+
+def stale_totals():
+    """``[(kind, id, stored, actual)]`` for every total that disagrees with its questions."""
+    stale = []
+    for kind, model, total in (('exam', Exam, _exam_total()), ('set', ExamSet, _set_total()),
+                               ('quiz', Quiz, _quiz_total())):
+        rows = db.session.execute(
+            select(model.id, model.total_marks, total.label('actual'))
+            .where(model.total_marks.is_distinct_from(total))
+        )
+        stale.extend((kind, pk, stored, actual) for pk, stored, actual in rows)
+    return stale
+
+
+def init_paper_totals(app):
+    @app.cli.command('check-paper-totals')
+    @click.option('--fix', is_flag=True, help="Rewrite the totals that are out of date.")
+    def check_paper_totals_command(fix):
+        """Compare stored exam, set and quiz totals with their questions."""
+        stale = stale_totals()
+        for kind, pk, stored, actual in stale:
+            click.echo(f"  {kind} {pk}: stored {stored}, questions sum to {actual}")
+        if not stale:
+            click.echo("All paper totals are consistent.")
+            return
+        if not fix:
+            click.echo(f"{len(stale)} stale totals; re-run with --fix to rewrite them.")
+            raise SystemExit(1)
+        refresh_totals(
+            db.session.connection(),
+            exam_ids={pk for kind, pk, _, _ in stale if kind == 'exam'}
+            | set(db.session.execute(select(ExamSet.exam_id).where(
+                ExamSet.id.in_([pk for kind, pk, _, _ in stale if kind == 'set']))).scalars()),
+            quiz_ids={pk for kind, pk, _, _ in stale if kind == 'quiz'},
+        )
+        db.session.commit()
+        click.echo(f"Rewrote {len(stale)} totals.")
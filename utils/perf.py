@@ -0,0 +1,181 @@
+# utils/perf.py
+"""
+Request-level SQL instrumentation.
+
+SQLAlchemy engine events time every statement issued while a request is
+being handled. At the end of the request we keep a small summary (query
+count, DB time, slowest statements and statement shapes repeated often
+enough to look like N+1 loading) in a rolling in-memory buffer that the
+admin ``/admin/perf`` page reads. In debug mode the totals are also sent
+back as ``X-DB-Queries`` / ``X-DB-Time`` headers.
+
+The buffer is per process; with several gunicorn workers each keeps its
+own window.
+"""
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def statement_shape(sql):
+    """Collapse literals, placeholders lists and whitespace so repeats compare equal."""
+    shape = _STRING_RE.sub('?', sql)
+    shape = _NUMBER_RE.sub('?', shape)
+    shape = _IN_LIST_RE.sub('(?)', shape)
+    return _SPACE_RE.sub(' ', shape).strip()
+
+
+class _RequestStats:
+    __slots__ = ('started', 'queries', 'db_time', 'shapes', 'slowest')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+        self.slowest = []  # [(seconds, statement)], longest first
+
+    def record(self, statement, elapsed, keep):
+        self.queries += 1
+        self.db_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+        if len(self.slowest) < keep or elapsed > self.slowest[-1][0]:
+            self.slowest.append((elapsed, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[keep:]
+
+
+class PerfMonitor:
+    def __init__(self):
+        self.records = deque(maxlen=500)
+        self.slow_statements = 5
+        self.n_plus_one_threshold = 5
+        self.send_headers = None  # None: follow app.debug
+        self._installed = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.records = deque(maxlen=app.config.get('PERF_BUFFER_SIZE', 500))
+        self.slow_statements = app.config.get('PERF_SLOW_STATEMENTS', 5)
+        self.n_plus_one_threshold = app.config.get('PERF_N_PLUS_ONE_THRESHOLD', 5)
+        self.send_headers = app.config.get('PERF_HEADERS')
+        if not app.config.get('PERF_ENABLED', True):
+            return
+
+        with self._lock:
+            if not self._installed:
+                event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+                self._installed = True
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    # --- engine hooks --------------------------------------------------------
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('perf_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('perf_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        if not has_request_context():
+            return
+        stats = g.get('_perf_stats')
+        if stats is not None:
+            stats.record(statement, elapsed, self.slow_statements)
+
+    # --- request hooks -------------------------------------------------------
+
+    @staticmethod
+    def _start_request():
+        g._perf_stats = _RequestStats()
+
+    def _finish_request(self, response):
+        stats = g.pop('_perf_stats', None)
+        if stats is None:
+            return response
+
+        repeated = [
+            {'shape': shape, 'count': count}
+            for shape, count in stats.shapes.most_common()
+            if count >= self.n_plus_one_threshold
+        ]
+        self.records.append({
+            'at': datetime.utcnow(),
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - stats.started) * 1000, 2),
+            'queries': stats.queries,
+            'db_ms': round(stats.db_time * 1000, 2),
+            'slowest': [
+                {'ms': round(seconds * 1000, 2), 'statement': statement}
+                for seconds, statement in stats.slowest
+            ],
+            'n_plus_one': repeated,
+        })
+
+        send_headers = current_app.debug if self.send_headers is None else self.send_headers
+        if send_headers:
+            response.headers['X-DB-Queries'] = str(stats.queries)
+            response.headers['X-DB-Time'] = f"{stats.db_time * 1000:.2f}ms"
+        return response
+
+    # --- reporting -----------------------------------------------------------
+
+    def recent(self, limit=100):
+        records = list(self.records)
+        return records[::-1][:limit]
+
+    def by_endpoint(self):
+        """Aggregate the buffer per endpoint, worst average query count first."""
+        grouped = {}
+        for rec in list(self.records):
+            agg = grouped.setdefault(rec['endpoint'] or rec['path'], {
+                'endpoint': rec['endpoint'] or rec['path'],
+                'requests': 0, 'queries': 0, 'max_queries': 0,
+                'db_ms': 0.0, 'duration_ms': 0.0, 'n_plus_one': 0,
+            })
+            agg['requests'] += 1
+            agg['queries'] += rec['queries']
+            agg['max_queries'] = max(agg['max_queries'], rec['queries'])
+            agg['db_ms'] += rec['db_ms']
+            agg['duration_ms'] += rec['duration_ms']
+            agg['n_plus_one'] += 1 if rec['n_plus_one'] else 0
+
+        rows = []
+        for agg in grouped.values():
+            n = agg['requests']
+            rows.append({
+                'endpoint': agg['endpoint'],
+                'requests': n,
+                'avg_queries': round(agg['queries'] / n, 1),
+                'max_queries': agg['max_queries'],
+                'avg_db_ms': round(agg['db_ms'] / n, 2),
+                'avg_duration_ms': round(agg['duration_ms'] / n, 2),
+                'n_plus_one_requests': agg['n_plus_one'],
+            })
+        rows.sort(key=lambda row: row['avg_queries'], reverse=True)
+        return rows
+
+    def clear(self):
+        self.records.clear()
+
+
+perf_monitor = PerfMonitor()
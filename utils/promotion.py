@@ -1,4 +1,5 @@
 # utils/promotion.py
+from utils.identity_cache import invalidate_user
 
 CLASS_PROGRESSIONS = [
     "KG", "Primary 1", "Primary 2", "Primary 3", "Primary 4", "Primary 5", "Primary 6",
@@ -31,3 +32,4 @@ def promote_student(student, final_score):
     student.last_class_completed = current_class if status == "Promoted" else student.last_class_completed
     student.current_class = next_class if next_class else student.current_class
     student.academic_performance = status
+    invalidate_user(student.user_id)
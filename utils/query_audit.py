@@ -0,0 +1,287 @@
+# utils/query_audit.py
+"""
+Query-plan audit for the app's hot queries.
+
+    flask audit-queries [--min-rows 1000] [--verbose]
+
+Each entry in ``HOT_QUERIES`` builds the statement a route runs on every
+page view, with representative parameter values. The command runs
+``EXPLAIN QUERY PLAN`` on each one and exits non-zero when a plan has a
+full ``SCAN`` of a table holding at least ``--min-rows`` rows (index
+lookups show up as ``SEARCH``). Run it against a production-sized copy, or
+the synthetic dataset from benchmarks/dataset.py; ``--min-rows 0`` flags
+every scan regardless of size.
+
+New hot paths register themselves with ``@hot_query('name')``.
+"""
+import re
+from datetime import date, datetime
+
+import click
+from sqlalchemy import and_, func, select
+
+from models import (
+    Assignment, AttendanceRecord, ClassFeeStructure, Course, Exam, ExamAttempt, ExamOption,
+    ExamQuestion, ExamSetQuestion, ExamSubmission, NotificationRecipient,
+    NotificationUnreadCounter, ParentChildLink, Quiz, StudentCourseRegistration,
+    StudentFeeBalance, StudentFeeTransaction, StudentProfile,
+    StudentQuizSubmission, User,
+)
+from utils.exam_dashboard import Term, student_exams_stmt
+from utils.extensions import db
+
+HOT_QUERIES = {}
+
+_SCAN = re.compile(r'^SCAN (?:TABLE )?(\S+)')
+
+SAMPLE_USER_ID = 'STD000'
+SAMPLE_CLASS = 'JHS 1'
+SAMPLE_YEAR = '2025/2026'
+SAMPLE_SEMESTER = '1'
+
+
+def hot_query(name):
+    """Register a zero-argument function returning a ``Select`` to audit."""
+    def decorator(fn):
+        HOT_QUERIES[name] = fn
+        return fn
+    return decorator
+
+
+# --- registry ----------------------------------------------------------------
+
+@hot_query('students_in_class')
+def _students_in_class():
+    return (select(User)
+            .join(StudentProfile, StudentProfile.user_id == User.user_id)
+            .where(StudentProfile.current_class == SAMPLE_CLASS)
+            .order_by(User.last_name))
+
+
+@hot_query('attendance_sheet')
+def _attendance_sheet():
+    return select(AttendanceRecord.student_id).where(and_(
+        AttendanceRecord.teacher_id == 1, AttendanceRecord.date == date(2025, 10, 1)))
+
+
+@hot_query('student_attendance_history')
+def _student_attendance_history():
+    return (select(AttendanceRecord).where(AttendanceRecord.student_id == 1)
+            .order_by(AttendanceRecord.date.desc()))
+
+
+@hot_query('quiz_results')
+def _quiz_results():
+    return (select(StudentQuizSubmission).where(StudentQuizSubmission.student_id == 1)
+            .order_by(StudentQuizSubmission.submitted_at.asc()))
+
+
+@hot_query('quiz_already_submitted')
+def _quiz_already_submitted():
+    return select(StudentQuizSubmission.id).where(
+        StudentQuizSubmission.quiz_id == 1, StudentQuizSubmission.student_id == 1)
+
+
+@hot_query('class_quizzes')
+def _class_quizzes():
+    return select(Quiz).where(Quiz.assigned_class == SAMPLE_CLASS).order_by(Quiz.start_datetime)
+
+
+@hot_query('class_assignments')
+def _class_assignments():
+    return (select(Assignment).where(Assignment.assigned_class == SAMPLE_CLASS)
+            .order_by(Assignment.due_date))
+
+
+@hot_query('class_exams')
+def _class_exams():
+    return select(Exam).where(Exam.assigned_class == SAMPLE_CLASS, Exam.start_datetime <= datetime(2025, 10, 1))
+
+
+@hot_query('student_exam_dashboard')
+def _student_exam_dashboard():
+    term = Term('sample', 'sample', datetime(2025, 9, 1), datetime(2026, 1, 15))
+    return student_exams_stmt(1, SAMPLE_CLASS, term)
+
+
+@hot_query('exam_submission_lookup')
+def _exam_submission_lookup():
+    return select(ExamSubmission).where(ExamSubmission.exam_id == 1, ExamSubmission.student_id == 1)
+
+
+@hot_query('exam_results')
+def _exam_results():
+    return (select(ExamSubmission).where(ExamSubmission.student_id == 1)
+            .order_by(ExamSubmission.submitted_at.desc()))
+
+
+@hot_query('open_exam_attempt')
+def _open_exam_attempt():
+    return select(ExamAttempt).where(
+        ExamAttempt.exam_id == 1, ExamAttempt.student_id == 1, ExamAttempt.submitted.is_(False))
+
+
+@hot_query('expired_exam_attempts')
+def _expired_exam_attempts():
+    return (select(ExamAttempt.id)
+            .where(ExamAttempt.submitted.is_(False), ExamAttempt.deadline < datetime(2026, 1, 1))
+            .order_by(ExamAttempt.deadline)
+            .limit(200))
+
+
+@hot_query('exam_paper_questions')
+def _exam_paper_questions():
+    return (select(ExamQuestion)
+            .join(ExamSetQuestion, ExamSetQuestion.question_id == ExamQuestion.id)
+            .where(ExamSetQuestion.set_id == 1)
+            .order_by(ExamSetQuestion.order))
+
+
+@hot_query('exam_paper_options')
+def _exam_paper_options():
+    return select(ExamOption).where(ExamOption.question_id.in_([1, 2, 3]))
+
+
+@hot_query('exam_question_pool')
+def _exam_question_pool():
+    return select(ExamQuestion).where(ExamQuestion.exam_id == 1)
+
+
+@hot_query('unread_notifications')
+def _unread_notifications():
+    return select(func.count(NotificationRecipient.id)).where(
+        NotificationRecipient.user_id == SAMPLE_USER_ID, NotificationRecipient.is_read.is_(False))
+
+
+@hot_query('unread_counter')
+def _unread_counter():
+    return select(NotificationUnreadCounter.unread_count).where(
+        NotificationUnreadCounter.user_id == SAMPLE_USER_ID)
+
+
+@hot_query('fee_transactions')
+def _fee_transactions():
+    return select(func.sum(StudentFeeTransaction.amount)).where(
+        StudentFeeTransaction.student_id == 1,
+        StudentFeeTransaction.academic_year == SAMPLE_YEAR,
+        StudentFeeTransaction.semester == SAMPLE_SEMESTER,
+        StudentFeeTransaction.is_approved.is_(True))
+
+
+@hot_query('class_fee_structure')
+def _class_fee_structure():
+    return select(ClassFeeStructure).where(
+        ClassFeeStructure.class_level == SAMPLE_CLASS,
+        ClassFeeStructure.academic_year == SAMPLE_YEAR,
+        ClassFeeStructure.semester == SAMPLE_SEMESTER)
+
+
+@hot_query('fee_balance')
+def _fee_balance():
+    return select(StudentFeeBalance).where(
+        StudentFeeBalance.student_id == 1,
+        StudentFeeBalance.academic_year == SAMPLE_YEAR,
+        StudentFeeBalance.semester == SAMPLE_SEMESTER)
+
+
+@hot_query('course_registrations')
+def _course_registrations():
+    return select(StudentCourseRegistration).where(
+        StudentCourseRegistration.student_id == 1,
+        StudentCourseRegistration.academic_year == SAMPLE_YEAR,
+        StudentCourseRegistration.semester == SAMPLE_SEMESTER)
+
+
+@hot_query('class_courses')
+def _class_courses():
+    return select(Course).where(
+        Course.assigned_class == SAMPLE_CLASS,
+        Course.semester == SAMPLE_SEMESTER,
+        Course.academic_year == SAMPLE_YEAR)
+
+
+@hot_query('parent_children')
+def _parent_children():
+    return (select(StudentProfile)
+            .join(ParentChildLink, ParentChildLink.student_id == StudentProfile.id)
+            .where(ParentChildLink.parent_id == 1))
+
+
+# --- audit -------------------------------------------------------------------
+
+def explain(stmt, connection=None):
+    """Return the ``EXPLAIN QUERY PLAN`` detail lines for a statement."""
+    connection = connection or db.session.connection()
+    compiled = stmt.compile(dialect=connection.dialect,
+                            compile_kwargs={'render_postcompile': True})
+    params = compiled.params
+    if compiled.positiontup:
+        params = tuple(params[key] for key in compiled.positiontup)
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).all()
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan, tables):
+    """Table names from ``SCAN`` steps that read a real table end to end."""
+    scanned = []
+    for detail in plan:
+        match = _SCAN.match(detail)
+        if match and match.group(1) in tables:
+            scanned.append(match.group(1))
+    return scanned
+
+
+def audit_queries(min_rows=1000, names=None):
+    """
+    Explain every registered query.
+
+    Returns ``[(name, plan, offending_tables)]``; a query fails when it scans
+    a table with at least ``min_rows`` rows.
+    """
+    connection = db.session.connection()
+    tables = set(db.metadata.tables)
+    sizes = {}
+
+    def size(table):
+        if table not in sizes:
+            sizes[table] = connection.exec_driver_sql(f'SELECT COUNT(*) FROM "{table}"').scalar()
+        return sizes[table]
+
+    results = []
+    for name, build in HOT_QUERIES.items():
+        if names and name not in names:
+            continue
+        plan = explain(build(), connection)
+        offending = [t for t in full_scans(plan, tables) if size(t) >= min_rows]
+        results.append((name, plan, offending))
+    return results
+
+
+def init_query_audit(app):
+    @app.cli.command('audit-queries')
+    @click.option('--min-rows', default=None, type=int,
+                  help="Flag scans of tables with at least this many rows.")
+    @click.option('--query', 'names', multiple=True, help="Only audit these queries.")
+    @click.option('--verbose', '-v', is_flag=True, help="Print every plan.")
+    def audit_queries_command(min_rows, names, verbose):
+        """EXPLAIN the hot queries and fail on full scans of large tables."""
+        if db.engine.dialect.name != 'sqlite':
+            raise click.ClickException("audit-queries reads SQLite query plans only.")
+        if min_rows is None:
+            min_rows = app.config.get('QUERY_AUDIT_MIN_ROWS', 1000)
+
+        failures = 0
+        for name, plan, offending in audit_queries(min_rows, names):
+            if offending:
+                failures += 1
+                click.echo(f"FAIL {name}: full scan of {', '.join(offending)}")
+            else:
+                click.echo(f"ok   {name}")
+            if offending or verbose:
+                for detail in plan:
+                    click.echo(f"       {detail}")
+
+        if failures:
+            click.echo(f"{failures} quer{'y' if failures == 1 else 'ies'} scan large tables.")
+            raise SystemExit(1)
+        click.echo("No full scans on large tables.")
@@ -0,0 +1,418 @@
+# utils/question_import.py
+"""
+Bulk question import for exams and quizzes from CSV, JSON or XLSX.
+
+Questions used to be entered one at a time through the exam question form
+or ``add_quiz``, which commit a row (or several) per question. The importer
+reads a file as a stream of records, validates each one on its own and
+writes the valid questions in chunks of ``QUESTION_IMPORT_CHUNK``: one
+multi-row ``INSERT ... RETURNING`` for the questions of a chunk and one
+for all of their options. Invalid records are reported with their line
+(CSV/XLSX) or position (JSON) and skipped; they never abort the import.
+
+Accepted layouts:
+
+* CSV and XLSX: a header row, then one row per option, the layout the quiz
+  backup CSV already uses (``Question, Option, Is Correct``). Consecutive
+  rows with the same question text (or an empty one) make one question.
+  Optional columns: ``Type`` (exams: mcq, true_false, math, subjective)
+  and ``Marks`` (or ``Points``). A subjective question is a single row with no option (or
+  with its rubric as the option). CSV is read as UTF-8 line by line; a row
+  that does not decode is reported and skipped like an invalid record.
+* JSON: the quiz backup shape ``{"quiz": {...}, "questions": [...]}`` (see
+  utils/quiz_backup.py) or a bare list of questions, each with ``text``
+  (or ``question_text``), ``options`` (``[{"text", "is_correct"}]``) and
+  optional ``type``/``question_type`` and ``marks``/``points``. JSON has
+  no streaming parser in the standard library, so the document is loaded
+  whole; records are still validated and inserted chunk by chunk.
+
+XLSX needs openpyxl, which is optional; without it XLSX uploads are
+refused with a message and the other formats keep working.
+
+Bulk inserts skip the ORM flush hooks, so the import bumps the paper
+version and refreshes the stored totals (utils/grading.py) and re-indexes
+the new questions for search (utils/question_search.py) itself, all in the
+same transaction as the rows.
+"""
+import codecs
+import csv
+import json
+import os
+import zipfile
+from itertools import groupby, islice
+
+import click
+from sqlalchemy import insert
+
+from models import Exam, ExamOption, ExamQuestion, Option, Question, Quiz
+from utils.extensions import db
+from utils.grading import bump_paper_version
+from utils import question_search
+
+try:
+    import openpyxl
+    from openpyxl.utils.exceptions import InvalidFileException
+except ImportError:  # XLSX import is optional
+    openpyxl = None
+    InvalidFileException = zipfile.BadZipFile
+
+FORMATS = ('csv', 'json', 'xlsx')
+EXAM_TYPES = ('mcq', 'true_false', 'math', 'subjective')
+MAX_ERRORS = 200  # row errors kept in the report; the rest are only counted
+OPTION_LENGTH = 255
+
+_TRUE = {'1', 'true', 'yes', 'y', 'on', 'x', 'correct'}
+_COLUMNS = {
+    'question': 'text', 'question text': 'text', 'text': 'text',
+    'option': 'option', 'option text': 'option', 'answer': 'option',
+    'is correct': 'is_correct', 'is_correct': 'is_correct', 'correct': 'is_correct',
+    'type': 'type', 'question type': 'type', 'question_type': 'type',
+    'marks': 'marks', 'mark': 'marks', 'points': 'marks', 'score': 'marks',
+}
+
+
+class QuestionImportError(Exception):
+    """The file as a whole cannot be read (unknown format, bad header, broken JSON)."""
+
+
+class ImportResult:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.imported = 0
+        self.options = 0
+        self.error_count = 0
+        self.errors = []  # [(line, message)], at most MAX_ERRORS
+        self.question_ids = []
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'imported': self.imported,
+            'options': self.options,
+            'error_count': self.error_count,
+            'errors': [{'line': line, 'message': message} for line, message in self.errors],
+        }
+
+
+# --- reading -------------------------------------------------------------------
+
+def detect_format(filename):
+    ext = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if ext not in FORMATS:
+        raise QuestionImportError(f"Unsupported file type '.{ext}'; use CSV, JSON or XLSX.")
+    return ext
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _header(row):
+    columns = [_COLUMNS.get(_cell(name).lower()) for name in row]
+    if 'text' not in columns:
+        raise QuestionImportError("The header row needs a 'Question' column.")
+    return columns
+
+
+def _group_rows(rows):
+    """Records from ``(line, cells)`` option rows; consecutive rows of one question are merged."""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    columns = _header(first[1])
+
+    def fields(item):
+        line, cells = item
+        return line, {name: _cell(value) for name, value in zip(columns, cells) if name}
+
+    def continued(parsed):
+        text = ''
+        for line, f in parsed:
+            if not any(f.values()):
+                continue  # blank row
+            if f.get('text'):
+                text = f['text']
+            elif f.get('option'):
+                f['text'] = text  # question cell left empty on its later option rows
+            yield line, f
+
+    parsed = continued(fields(item) for item in rows)
+    for text, group in groupby(parsed, key=lambda item: item[1].get('text', '')):
+        group = list(group)
+        line, head = group[0]
+        yield line, {
+            'text': text,
+            'type': head.get('type', ''),
+            'marks': head.get('marks', ''),
+            'options': [
+                {'text': f.get('option', ''), 'is_correct': f.get('is_correct', '').lower() in _TRUE}
+                for _, f in group if f.get('option')
+            ],
+        }
+
+
+def _text_lines(stream, undecodable):
+    """
+    Decoded lines of a UTF-8 stream. A line that does not decode is passed
+    on with replacement characters and its number added to ``undecodable``.
+    """
+    lines = (line for chunk in stream for line in chunk.splitlines(keepends=True))
+    for number, raw in enumerate(lines, start=1):
+        if number == 1 and raw.startswith(codecs.BOM_UTF8):
+            raw = raw[len(codecs.BOM_UTF8):]
+        try:
+            yield raw.decode('utf-8')
+        except UnicodeDecodeError:
+            undecodable.add(number)
+            yield raw.decode('utf-8', errors='replace')
+
+
+def _csv_records(stream):
+    undecodable = set()
+    reader = csv.reader(_text_lines(stream, undecodable))
+    skipped = []  # (line, record) for rows that did not decode
+
+    def rows():
+        last = 0
+        while True:
+            try:
+                row = next(reader, None)
+            except csv.Error as e:
+                raise QuestionImportError(f"Invalid CSV at line {reader.line_num}: {e}")
+            if row is None:
+                return
+            line, last = last + 1, reader.line_num
+            if undecodable.isdisjoint(range(line, last + 1)):
+                yield line, row
+            elif line == 1:
+                raise QuestionImportError("The header row is not UTF-8 text; save the file as CSV UTF-8.")
+            else:
+                skipped.append((line, {'error': "not UTF-8 text; save the file as CSV UTF-8"}))
+
+    for record in _group_rows(rows()):
+        yield from skipped
+        skipped.clear()
+        yield record
+    yield from skipped
+
+
+def _xlsx_records(stream):
+    if openpyxl is None:
+        raise QuestionImportError("XLSX import needs openpyxl; upload a CSV or JSON file instead.")
+    try:
+        workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+        raise QuestionImportError(f"Not a readable XLSX workbook: {e}")
+    try:
+        sheet = workbook.worksheets[0]
+        yield from _group_rows(enumerate(sheet.iter_rows(values_only=True), start=1))
+    finally:
+        workbook.close()
+
+
+def _json_records(stream):
+    try:
+        data = json.load(stream)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise QuestionImportError(f"Invalid JSON: {e}")
+    questions = data.get('questions') if isinstance(data, dict) else data
+    if not isinstance(questions, list):
+        raise QuestionImportError("Expected a list of questions or a quiz backup with 'questions'.")
+    for position, q in enumerate(questions, start=1):
+        if not isinstance(q, dict):
+            yield position, None
+            continue
+        options = q.get('options') or []
+        yield position, {
+            'text': _cell(q.get('text', q.get('question_text'))),
+            'type': _cell(q.get('type', q.get('question_type'))),
+            'marks': _cell(q.get('marks', q.get('points'))),
+            'options': [
+                {'text': _cell(o.get('text')), 'is_correct': o.get('is_correct') in (True, 1)
+                 or _cell(o.get('is_correct')).lower() in _TRUE}
+                for o in options if isinstance(o, dict) and _cell(o.get('text'))
+            ] if isinstance(options, list) else None,
+        }
+
+
+def read_records(stream, fmt):
+    """
+    ``(line, record)`` pairs from a binary stream; ``record`` is None when
+    unreadable, or carries an ``error`` for a row that could not be decoded.
+    """
+    return {'csv': _csv_records, 'json': _json_records, 'xlsx': _xlsx_records}[fmt](stream)
+
+
+# --- validation ----------------------------------------------------------------
+
+def _number(raw, integer):
+    if raw == '':
+        return 1
+    value = int(raw) if integer else float(raw)  # ValueError for the caller
+    if value <= 0:
+        raise ValueError(raw)
+    return value
+
+
+def validate(record, kind):
+    """``(values, options)`` ready to insert, or raise ValueError with the reason."""
+    if record is None:
+        raise ValueError("not a question object")
+    if 'error' in record:
+        raise ValueError(record['error'])
+    if not record['text']:
+        raise ValueError("question text is empty")
+    options = record['options']
+    if options is None:
+        raise ValueError("'options' must be a list")
+    for o in options:
+        if len(o['text']) > OPTION_LENGTH:
+            raise ValueError(f"option longer than {OPTION_LENGTH} characters")
+
+    if kind == 'quiz':
+        try:
+            points = _number(record['marks'], integer=False)
+        except ValueError:
+            raise ValueError(f"points must be a positive number, got '{record['marks']}'")
+        qtype = 'mcq'
+        values = {'text': record['text'], 'points': points}
+    else:
+        qtype = (record['type'] or ('mcq' if options else 'subjective')).lower()
+        if qtype not in EXAM_TYPES:
+            raise ValueError(f"unknown question type '{record['type']}'")
+        try:
+            marks = _number(record['marks'], integer=True)
+        except ValueError:
+            raise ValueError(f"marks must be a positive whole number, got '{record['marks']}'")
+        values = {'question_text': record['text'], 'question_type': qtype, 'marks': marks}
+
+    if qtype in ('mcq', 'true_false'):
+        if len(options) < 2:
+            raise ValueError("needs at least two options")
+        if not any(o['is_correct'] for o in options):
+            raise ValueError("no option is marked correct")
+    elif qtype == 'math':
+        if not options:
+            raise ValueError("needs at least one answer")
+        options = [dict(o, is_correct=True) for o in options]  # every listed answer is accepted
+    elif qtype == 'subjective':
+        options = [dict(o, is_correct=False) for o in options]  # rubric text only
+    return values, options
+
+
+# --- writing -------------------------------------------------------------------
+
+def _insert_chunk(connection, kind, owner_id, chunk):
+    question_model, option_model = (Question, Option) if kind == 'quiz' else (ExamQuestion, ExamOption)
+    owner_key = 'quiz_id' if kind == 'quiz' else 'exam_id'
+    table = question_model.__table__
+    ids = connection.execute(
+        insert(table).returning(table.c.id, sort_by_parameter_order=True),
+        [dict(values, **{owner_key: owner_id}) for values, _ in chunk],
+    ).scalars().all()
+    option_rows = [
+        {'question_id': question_id, 'text': o['text'], 'is_correct': o['is_correct']}
+        for question_id, (_, options) in zip(ids, chunk)
+        for o in options
+    ]
+    if option_rows:
+        connection.execute(insert(option_model.__table__), option_rows)
+    return ids, len(option_rows)
+
+
+def import_questions(stream, fmt, exam_id=None, quiz_id=None, chunk_size=500, dry_run=False):
+    """
+    Import questions from ``stream`` into an exam or a quiz; returns an
+    ``ImportResult``. Raises ``QuestionImportError`` when the file cannot be read
+    at all. The caller commits (or rolls back a dry run).
+    """
+    kind = 'quiz' if quiz_id is not None else 'exam'
+    owner_id = quiz_id if kind == 'quiz' else exam_id
+    result = ImportResult(dry_run=dry_run)
+    connection = db.session.connection()
+
+    def valid():
+        for line, record in read_records(stream, fmt):
+            try:
+                yield validate(record, kind)
+            except ValueError as e:
+                result.error(line, str(e))
+
+    records = valid()
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        if dry_run:
+            result.imported += len(chunk)
+            result.options += sum(len(options) for _, options in chunk)
+            continue
+        ids, option_count = _insert_chunk(connection, kind, owner_id, chunk)
+        result.question_ids.extend(ids)
+        result.imported += len(ids)
+        result.options += option_count
+
+    if result.question_ids:
+        bump_paper_version(exam_id=exam_id, quiz_id=quiz_id)
+        if question_search.available(connection):
+            question_search.reindex(connection, **{f'{kind}_question_ids': result.question_ids})
+    return result
+
+
+def import_file(file, exam_id=None, quiz_id=None, dry_run=False, chunk_size=500):
+    """Import an uploaded ``FileStorage`` and commit; returns the ``ImportResult``."""
+    fmt = detect_format(file.filename)
+    try:
+        result = import_questions(file.stream, fmt, exam_id=exam_id, quiz_id=quiz_id,
+                                  chunk_size=chunk_size, dry_run=dry_run)
+    except Exception:
+        db.session.rollback()
+        raise
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return result
+
+
+def init_question_import(app):
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--exam', 'exam_id', type=int, help="Exam to add the questions to.")
+    @click.option('--quiz', 'quiz_id', type=int, help="Quiz to add the questions to.")
+    @click.option('--dry-run', is_flag=True, help="Validate the file without saving anything.")
+    def import_questions_command(path, exam_id, quiz_id, dry_run):
+        """Import exam or quiz questions from a CSV, JSON or XLSX file."""
+        if (exam_id is None) == (quiz_id is None):
+            raise click.UsageError("Give exactly one of --exam or --quiz.")
+        owner = db.session.get(Quiz, quiz_id) if quiz_id is not None else db.session.get(Exam, exam_id)
+        if owner is None:
+            raise click.ClickException("No such exam or quiz.")
+        try:
+            fmt = detect_format(path)
+            with open(path, 'rb') as stream:
+                result = import_questions(stream, fmt, exam_id=exam_id, quiz_id=quiz_id,
+                                          chunk_size=app.config.get('QUESTION_IMPORT_CHUNK', 500),
+                                          dry_run=dry_run)
+        except QuestionImportError as e:
+            db.session.rollback()
+            raise click.ClickException(str(e))
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+        for line, message in result.errors:
+            click.echo(f"  line {line}: {message}")
+        verb = "Would import" if dry_run else "Imported"
+        click.echo(f"{verb} {result.imported} questions ({result.options} options) "
+                   f"into '{owner.title}'; {result.error_count} rows rejected.")
@@ -0,0 +1,248 @@
+# utils/question_search.py
+"""
+Full-text search over the exam and quiz question bank (SQLite FTS5).
+
+Set builders used to load an exam's whole pool and filter it in the
+browser, and there was no way to find a question written for another
+exam. ``question_search`` is an FTS5 table with one row per question: the
+question text followed by its option texts, plus the question's kind
+(``exam``/``quiz``) and id. Row ids encode both (``id * 2`` for exam
+questions, ``id * 2 + 1`` for quiz questions).
+
+The index follows the ORM: an ``after_flush`` hook re-indexes every
+question that was added, edited or deleted in the flush, or whose options
+were, in the same transaction as the change. Bulk SQL that bypasses the
+session is caught up with ``flask rebuild-question-index``. The table is
+created with the schema (``db.create_all``) and by the migration; on a
+database without FTS5 (or not on SQLite) the hook does nothing and
+search reports itself unavailable.
+
+Searches rank with bm25 and filter by subject and class through the
+owning exam or quiz. ``near_duplicates`` looks up the closest questions
+for a new one and scores them by word overlap, so authors are warned
+before a question is added twice.
+"""
+import re
+
+import click
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from models import ExamOption, ExamQuestion, Option, Question
+from utils.extensions import db
+
+TABLE = 'question_search'
+KINDS = ('exam', 'quiz')
+MAX_PER_PAGE = 100
+
+_CREATE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    "body, kind UNINDEXED, question_id UNINDEXED, tokenize='porter unicode61')"
+)
+_INSERT = {
+    'exam': (
+        f"INSERT INTO {TABLE} (rowid, body, kind, question_id) "
+        "SELECT q.id * 2, q.question_text || ' ' || COALESCE("
+        "(SELECT group_concat(o.text, ' ') FROM exam_options o WHERE o.question_id = q.id), ''), "
+        "'exam', q.id FROM exam_questions q"
+    ),
+    'quiz': (
+        f"INSERT INTO {TABLE} (rowid, body, kind, question_id) "
+        "SELECT q.id * 2 + 1, q.text || ' ' || COALESCE("
+        "(SELECT group_concat(o.text, ' ') FROM option o WHERE o.question_id = q.id), ''), "
+        "'quiz', q.id FROM question q"
+    ),
+}
+_SEARCH = f"""
+    SELECT s.kind, s.question_id, bm25({TABLE}) AS rank,
+           snippet({TABLE}, 0, '[', ']', '…', 16) AS snippet,
+           COALESCE(eq.question_text, qq.text) AS question_text,
+           COALESCE(e.id, z.id) AS owner_id,
+           COALESCE(e.title, z.title) AS owner_title,
+           COALESCE(e.subject, z.subject) AS subject,
+           COALESCE(e.assigned_class, z.assigned_class) AS class_name
+    FROM {TABLE} s
+    LEFT JOIN exam_questions eq ON s.kind = 'exam' AND eq.id = s.question_id
+    LEFT JOIN exams e ON e.id = eq.exam_id
+    LEFT JOIN question qq ON s.kind = 'quiz' AND qq.id = s.question_id
+    LEFT JOIN quiz z ON z.id = qq.quiz_id
+    WHERE {TABLE} MATCH :match
+      AND (:kind IS NULL OR s.kind = :kind)
+      AND (:subject IS NULL OR COALESCE(e.subject, z.subject) = :subject)
+      AND (:class_name IS NULL OR COALESCE(e.assigned_class, z.assigned_class) = :class_name)
+      AND (:owner_id IS NULL OR COALESCE(e.id, z.id) = :owner_id)
+    ORDER BY rank
+    LIMIT :limit OFFSET :offset
+"""
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+_available = None  # per process: does the table exist?
+
+
+def _rowid(kind, question_id):
+    return question_id * 2 + (1 if kind == 'quiz' else 0)
+
+
+def available(connection=None):
+    """True when the FTS table exists on this database."""
+    global _available
+    if _available is None:
+        connection = connection or db.session.connection()
+        if connection.dialect.name != 'sqlite':
+            _available = False
+        else:
+            _available = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE,)
+            ).first() is not None
+    return _available
+
+
+def create_index(connection):
+    """
+    Create the FTS table and fill it if it is new (SQLite with FTS5 only);
+    returns True when the table exists.
+    """
+    global _available
+    _available = None
+    if available(connection):
+        return True
+    if connection.dialect.name != 'sqlite':
+        return False
+    try:
+        connection.exec_driver_sql(_CREATE)
+    except Exception:  # SQLite built without FTS5
+        return False
+    _available = True
+    rebuild_index(connection)
+    return True
+
+
+def rebuild_index(connection):
+    """Re-index every question; returns the row count."""
+    connection.exec_driver_sql(f"DELETE FROM {TABLE}")
+    for sql in _INSERT.values():
+        connection.exec_driver_sql(sql)
+    return connection.exec_driver_sql(f"SELECT count(*) FROM {TABLE}").scalar()
+
+
+def reindex(connection, exam_question_ids=(), quiz_question_ids=()):
+    """Refresh the rows of these questions (deleted ones just drop out)."""
+    for kind, ids in (('exam', exam_question_ids), ('quiz', quiz_question_ids)):
+        ids = sorted(set(ids))
+        if not ids:
+            continue
+        placeholders = ', '.join('?' * len(ids))
+        connection.exec_driver_sql(
+            f"DELETE FROM {TABLE} WHERE rowid IN ({placeholders})",
+            tuple(_rowid(kind, i) for i in ids))
+        connection.exec_driver_sql(f"{_INSERT[kind]} WHERE q.id IN ({placeholders})", tuple(ids))
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_with_schema(target, connection, **kw):
+    create_index(connection)
+
+
+@event.listens_for(Session, 'after_flush')
+def _index_changed_questions(session, flush_context):
+    exam_ids, quiz_ids = set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, ExamQuestion):
+            exam_ids.add(obj.id)
+        elif isinstance(obj, ExamOption):
+            exam_ids.add(obj.question_id)
+        elif isinstance(obj, Question):
+            quiz_ids.add(obj.id)
+        elif isinstance(obj, Option):
+            quiz_ids.add(obj.question_id)
+    exam_ids.discard(None)
+    quiz_ids.discard(None)
+    if not (exam_ids or quiz_ids):
+        return
+    connection = session.connection()
+    if available(connection):
+        reindex(connection, exam_ids, quiz_ids)
+
+
+# --- queries -----------------------------------------------------------------
+
+def _words(value):
+    return [w.lower() for w in _WORD.findall(value or '')]
+
+
+def match_expression(value, any_word=False):
+    """
+    FTS5 query for free text: every word quoted (so operators in the input
+    are literal) and all required, the last one as a prefix; with
+    ``any_word`` the words are ORed instead. None when there are no words.
+    """
+    words = _words(value)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    if not any_word:
+        terms[-1] += '*'
+    return (' OR ' if any_word else ' ').join(terms)
+
+
+def search_questions(query, subject=None, class_name=None, kind=None, owner_id=None,
+                     page=1, per_page=20):
+    """
+    One page of matching questions, best first; returns ``(rows, has_next)``.
+    Each row has kind, question_id, question_text, snippet, rank and the
+    owning exam/quiz (owner_id, owner_title, subject, class_name).
+    """
+    match = match_expression(query)
+    if match is None:
+        return [], False
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    page = max(1, page)
+    rows = db.session.execute(text(_SEARCH), {
+        'match': match, 'kind': kind if kind in KINDS else None,
+        'subject': subject or None, 'class_name': class_name or None,
+        'owner_id': owner_id, 'limit': per_page + 1, 'offset': (page - 1) * per_page,
+    }).mappings().all()
+    return [dict(r) for r in rows[:per_page]], len(rows) > per_page
+
+
+def _similarity(a, b):
+    a, b = set(_words(a)), set(_words(b))
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def near_duplicates(question_text, kind=None, exclude=None, threshold=0.6, limit=5):
+    """
+    Questions whose wording overlaps ``question_text`` by at least
+    ``threshold`` (Jaccard over words), closest first. ``exclude`` is a
+    ``(kind, question_id)`` to leave out, usually the question just saved.
+    """
+    match = match_expression(question_text, any_word=True)
+    if match is None or not available():
+        return []
+    candidates = db.session.execute(text(_SEARCH), {
+        'match': match, 'kind': kind, 'subject': None, 'class_name': None,
+        'owner_id': None, 'limit': 25, 'offset': 0,
+    }).mappings().all()
+    found = []
+    for row in candidates:
+        if exclude and (row['kind'], row['question_id']) == tuple(exclude):
+            continue
+        score = _similarity(question_text, row['question_text'])
+        if score >= threshold:
+            found.append(dict(row, similarity=round(score, 2)))
+    found.sort(key=lambda r: r['similarity'], reverse=True)
+    return found[:limit]
+
+
+def init_question_search(app):
+    @app.cli.command('rebuild-question-index')
+    def rebuild_question_index_command():
+        """Re-index every exam and quiz question for search."""
+        connection = db.session.connection()
+        if not create_index(connection):
+            raise click.ClickException("Question search needs SQLite with FTS5.")
+        count = rebuild_index(connection)
+        db.session.commit()
+        click.echo(f"Indexed {count} questions.")
@@ -0,0 +1,221 @@
+# utils/regrade.py
+"""
+Re-grading of stored exam submissions after answer key edits.
+
+Submissions keep their answers in ``exam_answers`` (one bulk insert per
+submission), so a corrected key can be applied to every script of an
+exam. ``regrade_exam`` pages through the submissions by id in chunks,
+loads a chunk's answers with one query, scores them against the key of
+each submission's set and writes the changed scores back to
+``exam_submissions`` and the matching submitted ``exam_attempts`` with two
+executemany updates. Each chunk is its own transaction, so a failure
+part-way keeps the chunks already done and a re-run picks up the rest.
+
+With ``workers`` > 0 the scoring of each chunk is spread over a process
+pool. Only plain data (key items and answer dicts) crosses the process
+boundary; the database work stays in the calling process.
+
+Submissions stored before answers were persisted have no answer rows;
+they are skipped (and counted) rather than re-scored to zero.
+"""
+import multiprocessing
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from sqlalchemy import bindparam, func, select, update
+
+from models import Exam, ExamAnswer, ExamAttempt, ExamSubmission
+from utils.extensions import db
+from utils.grading import answer_key_for_exam, score_answers
+
+_jobs = {}  # exam_id -> status dict of the last background re-grade
+_jobs_lock = threading.Lock()
+
+
+def _grade_chunk(keys, scripts):
+    """Score ``(submission_id, set_id, answers)`` tuples; runs in pool workers too."""
+    return [(sid, score_answers(keys[set_id], answers)) for sid, set_id, answers in scripts]
+
+
+def _split(items, parts):
+    size = -(-len(items) // parts)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def regrade_exam(exam_id, chunk_size=500, workers=0, progress=None):
+    """
+    Recompute every submission score of an exam; returns a summary dict.
+
+    ``progress(done, total)`` is called after each committed chunk.
+    """
+    exam = db.session.get(Exam, exam_id)
+    if exam is None:
+        raise LookupError(f"Exam {exam_id} not found")
+
+    total = db.session.scalar(
+        select(func.count(ExamSubmission.id)).where(ExamSubmission.exam_id == exam_id))
+    summary = {'exam_id': exam_id, 'total': total, 'done': 0, 'changed': 0,
+               'skipped': 0, 'chunks': 0}
+    keys = {}
+
+    sub_table = ExamSubmission.__table__
+    att_table = ExamAttempt.__table__
+    update_submissions = (
+        update(sub_table)
+        .where(sub_table.c.id == bindparam('b_id'))
+        .values(score=bindparam('b_score'))
+    )
+    update_attempts = (
+        update(att_table)
+        .where(att_table.c.exam_id == bindparam('b_exam_id'),
+               att_table.c.student_id == bindparam('b_student_id'),
+               att_table.c.submitted.is_(True))
+        .values(score=bindparam('b_score'))
+    )
+
+    pool = None
+    if workers and workers > 0:
+        pool = ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=multiprocessing.get_context('spawn'))
+    try:
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(ExamSubmission.id, ExamSubmission.student_id,
+                       ExamSubmission.set_id, ExamSubmission.score)
+                .where(ExamSubmission.exam_id == exam_id, ExamSubmission.id > last_id)
+                .order_by(ExamSubmission.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            # Submissions with answer rows (even all blank) are re-scored.
+            answers = defaultdict(dict)
+            for sid, question_id, option_id in db.session.execute(
+                select(ExamAnswer.submission_id, ExamAnswer.question_id,
+                       ExamAnswer.selected_option_id)
+                .where(ExamAnswer.submission_id.in_([r.id for r in rows]))
+            ):
+                answers[sid][question_id] = option_id
+
+            scripts = []
+            for r in rows:
+                if r.id not in answers:
+                    summary['skipped'] += 1
+                    continue
+                if r.set_id not in keys:
+                    keys[r.set_id] = answer_key_for_exam(exam, r.set_id).items
+                scripts.append((r.id, r.set_id, answers[r.id]))
+
+            if pool is not None and len(scripts) > 1:
+                chunk_keys = {set_id: keys[set_id] for _, set_id, _ in scripts}
+                parts = _split(scripts, workers)
+                scores = [s for part in pool.map(_grade_chunk, [chunk_keys] * len(parts), parts)
+                          for s in part]
+            else:
+                scores = _grade_chunk(keys, scripts)
+
+            by_id = {r.id: r for r in rows}
+            changed = [(sid, score) for sid, score in scores if by_id[sid].score != score]
+            if changed:
+                db.session.execute(update_submissions, [
+                    {'b_id': sid, 'b_score': score} for sid, score in changed])
+                db.session.execute(update_attempts, [
+                    {'b_exam_id': exam_id, 'b_student_id': by_id[sid].student_id, 'b_score': score}
+                    for sid, score in changed])
+            db.session.commit()
+
+            summary['chunks'] += 1
+            summary['changed'] += len(changed)
+            summary['done'] += len(rows)
+            if progress is not None:
+                progress(summary['done'], total)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return summary
+
+
+# --- background jobs ---------------------------------------------------------
+
+def regrade_status(exam_id):
+    with _jobs_lock:
+        status = _jobs.get(exam_id)
+        return dict(status) if status else None
+
+
+def start_regrade(app, exam_id, chunk_size=None, workers=None):
+    """
+    Run ``regrade_exam`` on a background thread; returns its status dict.
+    A re-grade already running for the exam is returned instead of a new one.
+    """
+    if chunk_size is None:
+        chunk_size = app.config.get('REGRADE_CHUNK_SIZE', 500)
+    if workers is None:
+        workers = app.config.get('REGRADE_WORKERS', 0)
+
+    with _jobs_lock:
+        running = _jobs.get(exam_id)
+        if running and running['state'] == 'running':
+            return dict(running)
+        status = _jobs[exam_id] = {
+            'exam_id': exam_id, 'state': 'running', 'done': 0, 'total': None,
+            'changed': 0, 'skipped': 0, 'error': None,
+            'started_at': time.time(), 'finished_at': None,
+        }
+
+    def progress(done, total):
+        with _jobs_lock:
+            status.update(done=done, total=total)
+
+    def run():
+        with app.app_context():
+            try:
+                summary = regrade_exam(exam_id, chunk_size, workers, progress)
+                result = {'state': 'finished', 'done': summary['done'], 'total': summary['total'],
+                          'changed': summary['changed'], 'skipped': summary['skipped']}
+            except Exception as exc:
+                db.session.rollback()
+                app.logger.exception("Re-grade of exam %s failed", exam_id)
+                result = {'state': 'failed', 'error': repr(exc)}
+            finally:
+                db.session.remove()
+            with _jobs_lock:
+                status.update(result, finished_at=time.time())
+
+    threading.Thread(target=run, name=f'regrade-exam-{exam_id}', daemon=True).start()
+    return dict(status)
+
+
+def init_regrade(app):
+    @app.cli.command('regrade-exam')
+    @click.argument('exam_id', type=int)
+    @click.option('--chunk-size', default=None, type=int, help="Submissions per transaction.")
+    @click.option('--workers', default=None, type=int,
+                  help="Scoring processes (0 scores in this process).")
+    def regrade_exam_command(exam_id, chunk_size, workers):
+        """Re-score every submission of an exam against its current answer key."""
+        if chunk_size is None:
+            chunk_size = app.config.get('REGRADE_CHUNK_SIZE', 500)
+        if workers is None:
+            workers = app.config.get('REGRADE_WORKERS', 0)
+
+        started = time.perf_counter()
+
+        def progress(done, total):
+            click.echo(f"  {done}/{total} submissions")
+
+        try:
+            summary = regrade_exam(exam_id, chunk_size, workers, progress)
+        except LookupError as exc:
+            raise click.ClickException(str(exc))
+        click.echo(
+            f"Re-graded {summary['done'] - summary['skipped']} of {summary['total']} submissions "
+            f"({summary['changed']} changed, {summary['skipped']} without stored answers) "
+            f"in {time.perf_counter() - started:.2f}s."
+        )
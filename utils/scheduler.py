@@ -0,0 +1,111 @@
+# utils/scheduler.py
+"""
+Minimal in-process periodic job runner.
+
+Each worker process runs one daemon thread that calls registered jobs at
+their interval inside an app context. Jobs must be idempotent: every
+gunicorn worker runs its own copy. The thread is started lazily on the
+first request so CLI commands and a preloading gunicorn master (which
+forks after import) never start it.
+"""
+import threading
+import time
+
+
+class _Job:
+    __slots__ = ('name', 'interval', 'func', 'next_run', 'runs', 'failures', 'last_error')
+
+    def __init__(self, name, interval, func, delay=None):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = time.monotonic() + (interval if delay is None else delay)
+        self.runs = 0
+        self.failures = 0
+        self.last_error = None
+
+
+class Scheduler:
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._app = None
+
+    def init_app(self, app):
+        self._app = app
+        if not app.config.get('SCHEDULER_ENABLED', True):
+            return
+
+        @app.before_request
+        def start_scheduler():
+            if self._thread is None:
+                self.start()
+
+    def add_job(self, name, interval, func, delay=None):
+        """Register ``func`` to run every ``interval`` seconds (replaces by name)."""
+        with self._lock:
+            self._jobs[name] = _Job(name, interval, func, delay)
+        self._wake.set()
+
+    def remove_job(self, name):
+        with self._lock:
+            self._jobs.pop(name, None)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='lms-scheduler', daemon=True)
+            self._thread.start()
+
+    def run_pending(self):
+        """Run every job that is due; returns the seconds until the next one."""
+        now = time.monotonic()
+        with self._lock:
+            due = [job for job in self._jobs.values() if job.next_run <= now]
+        for job in due:
+            self._run_job(job)
+        with self._lock:
+            if not self._jobs:
+                return 60.0
+            return max(0.0, min(job.next_run for job in self._jobs.values()) - time.monotonic())
+
+    def _run_job(self, job):
+        from utils.extensions import db
+
+        with self._app.app_context():
+            try:
+                job.func()
+                job.runs += 1
+                job.last_error = None
+            except Exception as exc:
+                db.session.rollback()
+                job.failures += 1
+                job.last_error = repr(exc)
+                self._app.logger.exception("Scheduled job %s failed", job.name)
+            finally:
+                db.session.remove()
+        job.next_run = time.monotonic() + job.interval
+
+    def _run(self):
+        while True:
+            wait = self.run_pending()
+            self._wake.wait(timeout=min(wait, 60.0))
+            self._wake.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                job.name: {
+                    'interval': job.interval,
+                    'runs': job.runs,
+                    'failures': job.failures,
+                    'last_error': job.last_error,
+                }
+                for job in self._jobs.values()
+            }
+
+
+scheduler = Scheduler()
@@ -0,0 +1,142 @@
+# utils/set_allocation.py
+"""
+Set allocation planner for exams.
+
+``pick_set_for_student`` used to choose a set on every page load (random,
+or a hash of ``assignment_seed``), re-querying the exam's sets each time,
+and nothing was stored until the student started. The planner instead
+allocates a set to every student of ``assigned_class`` in one pass and
+bulk-writes the result to ``exam_set_assignments``; the instruction and
+start pages then read a student's set with one indexed lookup.
+
+Allocation walks the class roster (ordered by student number, the order
+of the register and usually the seating plan) and gives each student the
+set with the fewest students so far, so set sizes never differ by more
+than one. With ``avoid_adjacent`` the set of the previous student in the
+roster is skipped where another set is as small, so neighbours sit
+different papers; without it the roster is shuffled first. Ties are
+broken in an order seeded from ``assignment_seed``, so re-planning is
+reproducible.
+
+Exams in ``choice`` mode are not planned: students pick their own set.
+"""
+import random
+
+import click
+from sqlalchemy import insert, select
+
+from models import Exam, ExamSet, ExamSetAssignment, StudentProfile, User
+from utils.extensions import db
+
+
+def _roster(exam):
+    return db.session.execute(
+        select(User.id)
+        .join(StudentProfile, StudentProfile.user_id == User.user_id)
+        .where(User.role == 'student', StudentProfile.current_class == exam.assigned_class)
+        .order_by(User.user_id)
+    ).scalars().all()
+
+
+def plan_set_allocation(exam, avoid_adjacent=True, replace=False):
+    """
+    Allocate sets to the exam's class; returns ``{set_id: student count}``
+    for the whole class. Existing allocations are kept (and counted for
+    balance) unless ``replace`` is set, so a re-run only places students
+    who joined the class since. The caller commits.
+    """
+    if exam.assignment_mode == 'choice':
+        return {}
+    set_ids = db.session.execute(
+        select(ExamSet.id).where(ExamSet.exam_id == exam.id).order_by(ExamSet.id)
+    ).scalars().all()
+    if not set_ids:
+        return {}
+
+    rng = random.Random(exam.assignment_seed or f"exam-{exam.id}")
+    preference = list(set_ids)
+    rng.shuffle(preference)
+    rank = {set_id: i for i, set_id in enumerate(preference)}
+
+    if replace:
+        ExamSetAssignment.query.filter_by(exam_id=exam.id).delete(synchronize_session=False)
+        existing = {}
+    else:
+        existing = dict(db.session.execute(
+            select(ExamSetAssignment.student_id, ExamSetAssignment.set_id)
+            .where(ExamSetAssignment.exam_id == exam.id)
+        ).all())
+
+    roster = _roster(exam)
+    if not avoid_adjacent:
+        rng.shuffle(roster)
+
+    counts = {set_id: 0 for set_id in set_ids}
+    for set_id in existing.values():
+        if set_id in counts:
+            counts[set_id] += 1
+
+    rows = []
+    previous = None
+    for position, student_id in enumerate(roster):
+        set_id = existing.get(student_id)
+        if set_id not in counts:
+            smallest = min(counts.values())
+            candidates = [s for s in set_ids if counts[s] == smallest]
+            if avoid_adjacent and len(candidates) > 1:
+                candidates = [s for s in candidates if s != previous]
+            set_id = min(candidates, key=rank.__getitem__)
+            counts[set_id] += 1
+            rows.append({'exam_id': exam.id, 'student_id': student_id,
+                         'set_id': set_id, 'position': position})
+        previous = set_id
+
+    if rows:
+        stale = [r['student_id'] for r in rows if r['student_id'] in existing]
+        if stale:
+            # Allocated to a set that has since been deleted.
+            ExamSetAssignment.query.filter(
+                ExamSetAssignment.exam_id == exam.id,
+                ExamSetAssignment.student_id.in_(stale),
+            ).delete(synchronize_session=False)
+        db.session.execute(insert(ExamSetAssignment), rows)
+    return counts
+
+
+def allocated_set(exam_id, student_id):
+    """The student's planned ExamSet, or None."""
+    return (
+        ExamSet.query
+        .join(ExamSetAssignment, ExamSetAssignment.set_id == ExamSet.id)
+        .filter(ExamSetAssignment.exam_id == exam_id,
+                ExamSetAssignment.student_id == student_id)
+        .first()
+    )
+
+
+def allocation_map(exam_id):
+    """``{student_id: set_id}`` for every planned student of an exam."""
+    return dict(db.session.execute(
+        select(ExamSetAssignment.student_id, ExamSetAssignment.set_id)
+        .where(ExamSetAssignment.exam_id == exam_id)
+    ).all())
+
+
+def init_set_allocation(app):
+    @app.cli.command('plan-exam-sets')
+    @click.argument('exam_id', type=int)
+    @click.option('--replace', is_flag=True, help="Re-plan students who already have a set.")
+    @click.option('--allow-adjacent', is_flag=True,
+                  help="Shuffle the roster instead of keeping neighbours on different sets.")
+    def plan_exam_sets_command(exam_id, replace, allow_adjacent):
+        """Allocate sets to every student of an exam's class."""
+        exam = db.session.get(Exam, exam_id)
+        if exam is None:
+            raise click.ClickException(f"Exam {exam_id} not found")
+        counts = plan_set_allocation(exam, avoid_adjacent=not allow_adjacent, replace=replace)
+        db.session.commit()
+        if not counts:
+            click.echo("Nothing to plan (no sets, or students choose their set).")
+            return
+        for set_id, count in counts.items():
+            click.echo(f"  set {set_id}: {count} students")
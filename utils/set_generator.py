@@ -0,0 +1,353 @@
+# utils/set_generator.py
+"""
+Balanced exam set generation from an exam's question pool.
+
+Sets used to be built by hand, one drag at a time, with nothing to tell
+whether two sets were equally hard. ``generate_sets`` splits the pool
+into ``n`` parallel sets of ``size`` questions that match on
+
+* the question-type mix: the ``n * size`` slots are shared between the
+  types in proportion to the pool (largest-remainder rounding) and each
+  type's slots are spread over the sets so that no two sets differ by
+  more than one question of a type; a pool split evenly thus becomes a
+  partition. Questions are only ever exchanged for one of the same type,
+  so the mix holds throughout;
+* total marks and summed difficulty, both aimed at ``size`` times the
+  pool mean. Difficulty is the share of students who answered a question
+  correctly in past submissions (utils/item_analysis.py); questions
+  without data (new or subjective ones) count as the pool average;
+* overlap: no two sets share more than ``max_overlap`` of their questions
+  (as far as the pool allows).
+
+The search works on integer arrays: a set x slot matrix of question
+indexes and a set x question membership matrix, with running per-set
+sums and a set x set overlap matrix. It starts from a random stratified
+draw that prefers the least-used questions, then improves it locally.
+Each step takes one slot and scores, in one vectorized pass, replacing
+its question with every same-type question the set does not hold and
+swapping it with every same-type question of another set. It applies
+the best move if it lowers the cost and stops after a full pass without
+improvement (or ``max_rounds`` passes).
+
+``save_sets`` writes the sets and their questions with two multi-row
+INSERTs and refreshes the exam's paper version and totals.
+"""
+import secrets
+import string
+import time
+
+import click
+import numpy as np
+from sqlalchemy import insert, select
+
+from models import Exam, ExamQuestion, ExamSet, ExamSetQuestion
+from utils.extensions import db
+from utils.grading import bump_paper_version
+from utils.item_analysis import item_analysis
+
+OVERLAP_WEIGHT = 100.0  # cost of each question shared beyond the bound, squared
+
+
+class SetPlan:
+    """Generated sets (question ids per set) and how well they match."""
+
+    def __init__(self, exam, sets, summary):
+        self.exam = exam
+        self.sets = sets          # [[question id, ...], ...] in paper order
+        self.summary = summary    # JSON-ready report
+
+    def as_dict(self):
+        return dict(self.summary, exam_id=self.exam.id, sets=[
+            dict(info, question_ids=ids) for info, ids in zip(self.summary['set_stats'], self.sets)
+        ])
+
+
+def _quotas(type_codes, n_types, n_sets, size):
+    """
+    Set x type question counts: each row sums to ``size``, each column to
+    the type's share of all the slots, and a column's counts differ by at
+    most one.
+    """
+    counts = np.bincount(type_codes, minlength=n_types)
+    exact = counts / counts.sum() * n_sets * size
+    totals = np.floor(exact).astype(np.int64)
+    for t in np.argsort(-(exact - totals), kind='stable')[:n_sets * size - totals.sum()]:
+        totals[t] += 1
+    quota = np.tile(totals // n_sets, (n_sets, 1))
+    # Hand out each type's remainder to the next sets in turn; every set
+    # ends up with the same number of extra questions.
+    s = 0
+    for t in range(n_types):
+        for _ in range(totals[t] % n_sets):
+            quota[s, t] += 1
+            s = (s + 1) % n_sets
+    return quota
+
+
+class _Search:
+    def __init__(self, marks, difficulty, types, n_sets, size, bound, rng):
+        self.w = marks
+        self.d = difficulty
+        self.types = types
+        self.n, self.k, self.m = n_sets, size, len(marks)
+        self.bound = bound
+        self.rng = rng
+        self.by_type = [np.flatnonzero(types == t) for t in range(types.max() + 1)]
+        self.target_w = size * marks.mean()
+        self.target_d = size * difficulty.mean()
+        self.scale_w = marks.std() or 1.0
+        self.scale_d = max(difficulty.std(), 0.05)
+
+    # -- state --------------------------------------------------------------
+
+    def start(self):
+        quota = _quotas(self.types, len(self.by_type), self.n, self.k)
+        uses = np.zeros(self.m, dtype=np.int64)
+        slots = np.empty((self.n, self.k), dtype=np.int64)
+        for s in range(self.n):
+            picked = []
+            for t, pool in enumerate(self.by_type):
+                if quota[s, t]:
+                    order = np.lexsort((self.rng.random(len(pool)), uses[pool]))
+                    picked.extend(pool[order[:quota[s, t]]])
+            slots[s] = self.rng.permutation(picked)
+            uses[slots[s]] += 1
+        self.load(slots)
+
+    def load(self, slots):
+        self.slots = slots
+        self.member = np.zeros((self.n, self.m), dtype=np.int64)
+        np.put_along_axis(self.member, slots, 1, axis=1)
+        self.sum_w = self.w[slots].sum(axis=1)
+        self.sum_d = self.d[slots].sum(axis=1)
+        self.overlap = self.member @ self.member.T
+
+    # -- cost ---------------------------------------------------------------
+
+    def _balance(self, sum_w, sum_d):
+        return ((sum_w - self.target_w) / self.scale_w) ** 2 + ((sum_d - self.target_d) / self.scale_d) ** 2
+
+    def _excess(self, overlap):
+        return OVERLAP_WEIGHT * np.maximum(overlap - self.bound, 0) ** 2
+
+    def cost(self):
+        pairs = self.overlap[np.triu_indices(self.n, 1)]
+        return float(self._balance(self.sum_w, self.sum_d).sum() + self._excess(pairs).sum())
+
+    # -- moves --------------------------------------------------------------
+
+    def _others(self, s):
+        return np.flatnonzero(np.arange(self.n) != s)
+
+    def try_replace(self, s, j):
+        a = self.slots[s, j]
+        pool = self.by_type[self.types[a]]
+        cand = pool[self.member[s, pool] == 0]
+        if not len(cand):
+            return 0.0
+        others = self._others(s)
+        row = self.overlap[s, others]
+        new_row = row[:, None] - self.member[others, a][:, None] + self.member[others][:, cand]
+        old = self._balance(self.sum_w[s], self.sum_d[s]) + self._excess(row).sum()
+        new = (self._balance(self.sum_w[s] - self.w[a] + self.w[cand],
+                             self.sum_d[s] - self.d[a] + self.d[cand])
+               + self._excess(new_row).sum(axis=0))
+        best = int(np.argmin(new))
+        gain = old - new[best]
+        if gain <= 1e-9:
+            return 0.0
+        b = cand[best]
+        self.slots[s, j] = b
+        self.member[s, a], self.member[s, b] = 0, 1
+        self.sum_w[s] += self.w[b] - self.w[a]
+        self.sum_d[s] += self.d[b] - self.d[a]
+        self.overlap[s, others] = self.overlap[others, s] = new_row[:, best]
+        return gain
+
+    def try_swap(self, s, j, r):
+        a = self.slots[s, j]
+        if self.member[r, a]:
+            return 0.0
+        row_r = self.slots[r]
+        ok = (self.types[row_r] == self.types[a]) & (self.member[s, row_r] == 0)
+        cols = np.flatnonzero(ok)
+        if not len(cols):
+            return 0.0
+        cand = row_r[cols]
+        rest = np.flatnonzero((np.arange(self.n) != s) & (np.arange(self.n) != r))
+        dw = self.w[cand] - self.w[a]
+        dd = self.d[cand] - self.d[a]
+        old = (self._balance(self.sum_w[s], self.sum_d[s]) + self._balance(self.sum_w[r], self.sum_d[r])
+               + self._excess(self.overlap[s, rest]).sum() + self._excess(self.overlap[r, rest]).sum())
+        shift = self.member[rest][:, cand] - self.member[rest, a][:, None]
+        new_s = self.overlap[s, rest][:, None] + shift
+        new_r = self.overlap[r, rest][:, None] - shift
+        new = (self._balance(self.sum_w[s] + dw, self.sum_d[s] + dd)
+               + self._balance(self.sum_w[r] - dw, self.sum_d[r] - dd)
+               + self._excess(new_s).sum(axis=0) + self._excess(new_r).sum(axis=0))
+        best = int(np.argmin(new))
+        gain = old - new[best]
+        if gain <= 1e-9:
+            return 0.0
+        b, jr = cand[best], cols[best]
+        self.slots[s, j], self.slots[r, jr] = b, a
+        self.member[s, a], self.member[s, b] = 0, 1
+        self.member[r, b], self.member[r, a] = 0, 1
+        self.sum_w[s] += dw[best]
+        self.sum_d[s] += dd[best]
+        self.sum_w[r] -= dw[best]
+        self.sum_d[r] -= dd[best]
+        self.overlap[s, rest] = self.overlap[rest, s] = new_s[:, best]
+        self.overlap[r, rest] = self.overlap[rest, r] = new_r[:, best]
+        return gain
+
+    def improve(self, max_rounds):
+        rounds = 0
+        for rounds in range(1, max_rounds + 1):
+            gained = 0.0
+            for flat in self.rng.permutation(self.n * self.slots.shape[1]):
+                s, j = divmod(int(flat), self.slots.shape[1])
+                gained += self.try_replace(s, j)
+                if self.n > 1:
+                    r = int(self.rng.integers(self.n - 1))
+                    gained += self.try_swap(s, j, r if r < s else r + 1)
+            if gained <= 1e-9:
+                break
+        return rounds
+
+
+def _difficulty(exam, question_ids):
+    """Past share correct per question; the mean of the known ones where there is no data."""
+    known = {item['question_id']: item['difficulty']
+             for item in item_analysis.report(exam)['items'] if item['difficulty'] is not None}
+    values = np.array([known.get(q, np.nan) for q in question_ids], dtype=float)
+    fill = np.nanmean(values) if np.isfinite(values).any() else 0.5
+    return np.where(np.isfinite(values), values, fill), len(known)
+
+
+def generate_sets(exam, n_sets, size=None, max_overlap=0.0, seed=None, max_rounds=50):
+    """
+    Plan ``n_sets`` balanced sets of ``size`` questions (default: an even
+    split of the pool) sharing at most ``max_overlap`` (a fraction of
+    ``size``) between any two; returns a ``SetPlan``. Raises ValueError for
+    impossible requests. Nothing is written.
+    """
+    started = time.perf_counter()
+    rows = db.session.execute(
+        select(ExamQuestion.id, ExamQuestion.question_type, ExamQuestion.marks)
+        .where(ExamQuestion.exam_id == exam.id)
+        .order_by(ExamQuestion.id)
+    ).all()
+    if n_sets < 1:
+        raise ValueError("Ask for at least one set.")
+    if not rows:
+        raise ValueError("This exam has no questions in its pool.")
+    size = size or len(rows) // n_sets
+    if size < 1 or size > len(rows):
+        raise ValueError(f"Each set needs between 1 and {len(rows)} questions.")
+
+    question_ids = np.array([r.id for r in rows], dtype=np.int64)
+    type_names, types = np.unique([r.question_type or '' for r in rows], return_inverse=True)
+    marks = np.array([r.marks or 0 for r in rows], dtype=float)
+    difficulty, with_data = _difficulty(exam, question_ids.tolist())
+    bound = int(np.floor(max(0.0, min(1.0, max_overlap)) * size))
+
+    search = _Search(marks, difficulty, types.astype(np.int64), n_sets, size, bound,
+                     np.random.default_rng(seed))
+    search.start()
+    initial = search.cost()
+    rounds = search.improve(max_rounds)
+
+    pairs = search.overlap[np.triu_indices(n_sets, 1)]
+    set_stats = []
+    for s in range(n_sets):
+        chosen = search.slots[s]
+        mix = np.bincount(types[chosen], minlength=len(type_names))
+        set_stats.append({
+            'total_marks': float(search.sum_w[s]),
+            'difficulty': round(float(search.sum_d[s] / len(chosen)), 4),
+            'types': {str(name): int(c) for name, c in zip(type_names, mix) if c},
+        })
+    summary = {
+        'n_sets': n_sets,
+        'size': int(search.slots.shape[1]),
+        'pool': len(rows),
+        'questions_with_history': with_data,
+        'target_marks': round(float(search.target_w), 2),
+        'target_difficulty': round(float(difficulty.mean()), 4),
+        'overlap_bound': bound,
+        'max_overlap': int(pairs.max()) if len(pairs) else 0,
+        'within_bound': bool((pairs <= bound).all()),
+        'initial_cost': round(initial, 4),
+        'cost': round(search.cost(), 4),
+        'rounds': rounds,
+        'seconds': round(time.perf_counter() - started, 3),
+        'set_stats': set_stats,
+    }
+    sets = [question_ids[row].tolist() for row in search.slots]
+    return SetPlan(exam, sets, summary)
+
+
+def _set_names(exam, count, prefix):
+    taken = set(db.session.execute(select(ExamSet.name).where(ExamSet.exam_id == exam.id)).scalars())
+    names, k = [], 0
+    while len(names) < count:
+        label = string.ascii_uppercase[k % 26] * (k // 26 + 1)
+        name = f"{prefix} {label}"
+        if name not in taken:
+            names.append(name)
+        k += 1
+    return names
+
+
+def save_sets(plan, prefix='Set'):
+    """Write the planned sets with two bulk INSERTs; returns the new set ids. The caller commits."""
+    table = ExamSet.__table__
+    names = _set_names(plan.exam, len(plan.sets), prefix)
+    set_ids = db.session.execute(
+        insert(table).returning(table.c.id, sort_by_parameter_order=True),
+        [{'exam_id': plan.exam.id, 'name': name, 'access_password': secrets.token_hex(3),
+          'total_marks': info['total_marks']}
+         for name, info in zip(names, plan.summary['set_stats'])],
+    ).scalars().all()
+    db.session.execute(insert(ExamSetQuestion.__table__), [
+        {'set_id': set_id, 'question_id': qid, 'order': position}
+        for set_id, ids in zip(set_ids, plan.sets)
+        for position, qid in enumerate(ids, start=1)
+    ])
+    bump_paper_version(exam_id=plan.exam.id)
+    for info, name in zip(plan.summary['set_stats'], names):
+        info['name'] = name
+    return set_ids
+
+
+def init_set_generator(app):
+    @app.cli.command('generate-exam-sets')
+    @click.argument('exam_id', type=int)
+    @click.option('--sets', 'n_sets', type=int, default=2, show_default=True, help="Number of sets.")
+    @click.option('--size', type=int, default=None, help="Questions per set (default: even split).")
+    @click.option('--max-overlap', type=float, default=None,
+                  help="Largest share of questions two sets may have in common.")
+    @click.option('--seed', type=int, default=None, help="Random seed, for a repeatable plan.")
+    @click.option('--dry-run', is_flag=True, help="Show the plan without saving it.")
+    def generate_exam_sets_command(exam_id, n_sets, size, max_overlap, seed, dry_run):
+        """Generate balanced parallel sets from an exam's question pool."""
+        exam = db.session.get(Exam, exam_id)
+        if exam is None:
+            raise click.ClickException("No such exam.")
+        if max_overlap is None:
+            max_overlap = app.config.get('EXAM_SET_MAX_OVERLAP', 0.2)
+        try:
+            plan = generate_sets(exam, n_sets, size, max_overlap, seed)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        if not dry_run:
+            save_sets(plan)
+            db.session.commit()
+        summary = plan.summary
+        for k, info in enumerate(summary['set_stats']):
+            click.echo(f"  {info.get('name', f'set {k + 1}')}: {info['total_marks']:g} marks, "
+                       f"difficulty {info['difficulty']}, {info['types']}")
+        click.echo(f"{'Planned' if dry_run else 'Created'} {summary['n_sets']} sets of {summary['size']} "
+                   f"in {summary['seconds']}s; max overlap {summary['max_overlap']} "
+                   f"(bound {summary['overlap_bound']}).")
@@ -0,0 +1,128 @@
+# utils/set_membership.py
+"""
+Exam set membership and ordering in bulk.
+
+``reorder_set_questions`` used to load and update each ``ExamSetQuestion``
+of the posted order separately, and ``add_questions_to_set`` ran an
+existence query, a duplicate check and a ``max(order)`` query per
+question, so a drag-and-drop on a 100-question set cost hundreds of
+statements.
+
+Each operation here is a fixed number of statements whatever the size
+of the set:
+
+* add: one query that returns which of the requested questions belong to
+  the exam and whether each is already in the set, the set's current
+  last position with them, then one multi-row ``INSERT`` for the rest
+* remove: one ``DELETE ... IN ... RETURNING``
+* reorder: one ``UPDATE ... SET "order" = CASE question_id WHEN ... END``
+
+and they all end by bumping ``ExamSet.version`` (``UPDATE ... RETURNING``),
+the exam's paper version and the stored totals, all in the caller's
+transaction, so the caller commits once and gets the new version back.
+Membership changes made through the ORM bump the set version from the
+flush hook in utils/grading.py.
+"""
+from sqlalchemy import and_, case, delete, exists, func, insert, select, update
+
+from models import ExamQuestion, ExamSet, ExamSetQuestion
+from utils.extensions import db
+from utils.grading import bump_paper_version
+
+
+def _ids(values):
+    """Posted ids as ints, duplicates dropped, order kept; ValueError on junk."""
+    seen = {}
+    for value in values:
+        seen.setdefault(int(value), None)
+    return list(seen)
+
+
+def bump_set_version(exam_set):
+    """Bump the set's version (and the exam's paper version); returns the new set version."""
+    table = ExamSet.__table__
+    version = db.session.execute(
+        update(table).where(table.c.id == exam_set.id)
+        .values(version=table.c.version + 1)
+        .returning(table.c.version)
+    ).scalar_one()
+    bump_paper_version(exam_id=exam_set.exam_id)
+    db.session.expire(exam_set, ['version', 'total_marks'])
+    return version
+
+
+def add_questions(exam_set, question_ids):
+    """
+    Append questions of the set's exam, in the given order; returns
+    ``(added, skipped, version)`` with ``skipped`` as ``[{'id', 'reason'}]``.
+    """
+    question_ids = _ids(question_ids)
+    if not question_ids:
+        return [], [], exam_set.version
+    in_set = exists().where(ExamSetQuestion.set_id == exam_set.id,
+                            ExamSetQuestion.question_id == ExamQuestion.id)
+    last = (select(func.coalesce(func.max(ExamSetQuestion.order), 0))
+            .where(ExamSetQuestion.set_id == exam_set.id).scalar_subquery())
+    found = {row.id: row for row in db.session.execute(
+        select(ExamQuestion.id, in_set.label('in_set'), last.label('last'))
+        .where(ExamQuestion.exam_id == exam_set.exam_id, ExamQuestion.id.in_(question_ids))
+    )}
+
+    added, skipped = [], []
+    for qid in question_ids:
+        row = found.get(qid)
+        if row is None:
+            skipped.append({"id": qid, "reason": "question not found or belongs to another exam"})
+        elif row.in_set:
+            skipped.append({"id": qid, "reason": "already in set"})
+        else:
+            added.append(qid)
+    if not added:
+        return added, skipped, exam_set.version
+
+    start = next(iter(found.values())).last
+    db.session.execute(insert(ExamSetQuestion), [
+        {'set_id': exam_set.id, 'question_id': qid, 'order': start + k}
+        for k, qid in enumerate(added, start=1)
+    ])
+    return added, skipped, bump_set_version(exam_set)
+
+
+def remove_questions(exam_set, question_ids):
+    """Drop questions from the set; returns ``(removed question ids, version)``."""
+    question_ids = _ids(question_ids)
+    if not question_ids:
+        return [], exam_set.version
+    removed = db.session.execute(
+        delete(ExamSetQuestion).where(ExamSetQuestion.set_id == exam_set.id,
+                                      ExamSetQuestion.question_id.in_(question_ids))
+        .returning(ExamSetQuestion.question_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    if not removed:
+        return [], exam_set.version
+    return sorted(removed), bump_set_version(exam_set)
+
+
+def reorder_questions(exam_set, question_ids):
+    """
+    Number the listed questions 1..n in the given order with one UPDATE;
+    questions of the set that are not listed keep their position. Returns
+    ``(moved count, version)``.
+    """
+    question_ids = _ids(question_ids)
+    if not question_ids:
+        return 0, exam_set.version
+    position = case({qid: k for k, qid in enumerate(question_ids, start=1)},
+                    value=ExamSetQuestion.question_id)
+    moved = db.session.execute(
+        update(ExamSetQuestion)
+        .where(and_(ExamSetQuestion.set_id == exam_set.id,
+                    ExamSetQuestion.question_id.in_(question_ids),
+                    ExamSetQuestion.order.is_distinct_from(position)))
+        .values(order=position)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not moved:
+        return 0, exam_set.version
+    return moved, bump_set_version(exam_set)
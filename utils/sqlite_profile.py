@@ -0,0 +1,55 @@
+# utils/sqlite_profile.py
+"""
+Production PRAGMA profile for SQLite connections.
+
+Every new DB-API connection gets the pragmas from ``SQLITE_PRAGMAS``. The
+defaults are WAL journalling (readers no longer block the writer), a
+busy timeout instead of failing straight away with "database is locked",
+``synchronous=NORMAL`` (safe with WAL), a larger page cache, mmap I/O and
+in-memory temp tables. Non-SQLite engines are left alone.
+"""
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,          # ms
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,          # negative = KiB, i.e. ~64 MB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+_pragmas = {}
+_installed = False
+
+
+def apply_pragmas(dbapi_connection, pragmas=None):
+    """Run ``PRAGMA name=value`` for each entry on a raw sqlite3 connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in (pragmas if pragmas is not None else _pragmas).items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def _on_connect(dbapi_connection, connection_record):
+    if _pragmas and isinstance(dbapi_connection, sqlite3.Connection):
+        apply_pragmas(dbapi_connection)
+
+
+def init_sqlite_profile(app):
+    """Install the connect hook with the app's ``SQLITE_PRAGMAS``."""
+    global _installed
+    if not app.config.get('SQLITE_PROFILE_ENABLED', True):
+        _pragmas.clear()
+        return
+
+    _pragmas.clear()
+    _pragmas.update(app.config.get('SQLITE_PRAGMAS') or DEFAULT_PRAGMAS)
+    if not _installed:
+        event.listen(Engine, 'connect', _on_connect)
+        _installed = True
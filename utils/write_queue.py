@@ -0,0 +1,151 @@
+# utils/write_queue.py
+"""
+Optional single-writer queue with group commit.
+
+SQLite allows one writer at a time. When many request threads write at
+once they queue on the database lock and some time out with "database is
+locked". With ``WRITE_QUEUE_ENABLED`` on, write units go to one writer
+thread per process instead. It runs them back to back and commits each
+batch once, so N small transactions cost one fsync.
+
+A write unit is a plain function that uses ``db.session`` and does not
+commit. It runs on the writer thread, in its own app context and session,
+so pass ids and plain values, not ORM objects from the request session,
+and return plain values too.
+When the queue is off, ``run_write`` calls the unit inline and commits, so
+call sites look the same either way.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from utils.extensions import db
+
+
+class _Job:
+    __slots__ = ('fn', 'args', 'kwargs', 'future')
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+class WriteQueue:
+    def __init__(self):
+        self.enabled = False
+        self.max_batch = 64
+        self.max_delay = 0.005
+        self.timeout = 30
+        self._app = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = self.jobs = self.failures = 0
+
+    def init_app(self, app):
+        self._app = app
+        self.enabled = app.config.get('WRITE_QUEUE_ENABLED', False)
+        self.max_batch = app.config.get('WRITE_QUEUE_MAX_BATCH', 64)
+        self.max_delay = app.config.get('WRITE_QUEUE_MAX_DELAY_MS', 5) / 1000.0
+        self.timeout = app.config.get('WRITE_QUEUE_TIMEOUT', 30)
+
+    # --- public API ----------------------------------------------------------
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue a write unit; returns a ``Future`` with its return value."""
+        job = _Job(fn, args, kwargs)
+        self._ensure_thread()
+        self._queue.put(job)
+        return job.future
+
+    def run(self, fn, *args, **kwargs):
+        """Run a write unit and wait for it to be committed."""
+        if not self.enabled:
+            try:
+                result = fn(*args, **kwargs)
+                db.session.commit()
+                return result
+            except Exception:
+                db.session.rollback()
+                raise
+        return self.submit(fn, *args, **kwargs).result(timeout=self.timeout)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'pending': self._queue.qsize(),
+            'batches': self.batches,
+            'jobs': self.jobs,
+            'failures': self.failures,
+            'avg_batch': round(self.jobs / self.batches, 2) if self.batches else None,
+        }
+
+    # --- writer thread -------------------------------------------------------
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='lms-writer', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            with self._app.app_context():
+                try:
+                    self._commit_batch(batch)
+                finally:
+                    db.session.remove()
+
+    def _begin(self):
+        # Take the write lock up front so the batch never has to upgrade a
+        # read transaction (which fails immediately under contention).
+        conn = db.session.connection()
+        if conn.dialect.name == 'sqlite':
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    def _commit_batch(self, batch):
+        try:
+            self._begin()
+            results = [job.fn(*job.args, **job.kwargs) for job in batch]
+            db.session.commit()
+        except Exception as exc:
+            db.session.rollback()
+            if len(batch) == 1:
+                self.failures += 1
+                batch[0].future.set_exception(exc)
+                return
+            # Something in the batch failed: replay one unit per transaction
+            # so only the offending unit reports the error.
+            for job in batch:
+                self._commit_batch([job])
+            return
+
+        self.batches += 1
+        self.jobs += len(batch)
+        for job, result in zip(batch, results):
+            job.future.set_result(result)
+
+
+write_queue = WriteQueue()
+
+
+def run_write(fn, *args, **kwargs):
+    """Run ``fn`` as a write unit (queued or inline) and return its result."""
+    return write_queue.run(fn, *args, **kwargs)
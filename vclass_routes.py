@@ -4,7 +4,7 @@ from flask import request
 from flask_login import login_required, current_user, login_user, logout_user
 from sqlalchemy import func
 from werkzeug.utils import safe_join, secure_filename
-from models import db, User, Quiz, StudentQuizSubmission, Question, StudentProfile, QuizAttempt, Assignment, CourseMaterial, StudentCourseRegistration, Course,  TimetableEntry, AcademicCalendar, AcademicYear, AppointmentSlot, AppointmentBooking, StudentFeeBalance, ClassFeeStructure, StudentFeeTransaction, Exam, ExamSubmission, ExamQuestion, ExamAttempt, ExamSet, ExamSetQuestion, Meeting, StudentAnswer, Recording, PasswordResetRequest, PasswordResetToken, AssignmentSubmission
+from models import db, User, Quiz, StudentQuizSubmission, Question, StudentProfile, QuizAttempt, Assignment, CourseMaterial, StudentCourseRegistration, Course,  TimetableEntry, AcademicCalendar, AcademicYear, AppointmentSlot, AppointmentBooking, StudentFeeBalance, ClassFeeStructure, StudentFeeTransaction, Exam, ExamSubmission, ExamQuestion, ExamAttempt, ExamSet, ExamSetQuestion, Meeting, Recording, PasswordResetRequest, PasswordResetToken, AssignmentSubmission
 from datetime import date, datetime, timedelta, time
 from forms import StudentLoginForm, ForgotPasswordForm, ResetPasswordForm
 from io import BytesIO
@@ -14,6 +14,8 @@ from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.platypus import Table, TableStyle
 from utils.email_utils import send_password_reset_email
+from utils.answer_drafts import apply_batch, last_seq, parse_changes, quiz_drafts
+from utils.grading import answer_key_for_quiz, answers_from_form
 
 
 vclass_bp = Blueprint('vclass', __name__, url_prefix='/vclass')
@@ -429,72 +431,54 @@ def start_quiz_timer(quiz_id):
         session.modified = True
     return jsonify({'status': 'started'})
 
+@vclass_bp.route("/autosave", methods=["POST"])
 @vclass_bp.route("/vclass/autosave_answer", methods=["POST"])
+@login_required
 def autosave_answer():
-    data = request.get_json()
-    quiz_id = data["quiz_id"]
-    qid = data["question_id"]
-    oid = data["selected_option_id"]
+    """
+    Apply a batch of changed quiz answers: ``{quiz_id, seq, changes: [...]}``.
+    Replies with the last acknowledged ``seq`` and whether this batch was applied.
+    """
+    if current_user.role != 'student':
+        abort(403)
 
-    ans = StudentAnswer.query.filter_by(
-        student_id=current_user.id,
-        quiz_id=quiz_id,
-        question_id=qid
-    ).first()
+    data = request.get_json(silent=True) or {}
+    try:
+        quiz_id = int(data.get('quiz_id'))
+        seq, changes = parse_changes(data)
+    except (TypeError, ValueError, KeyError):
+        return jsonify({'error': 'Incomplete data'}), 400
 
-    if ans:
-        ans.selected_option_id = oid
-        ans.saved_at = datetime.utcnow()
-    else:
-        ans = StudentAnswer(
-            student_id=current_user.id,
-            quiz_id=quiz_id,
-            question_id=qid,
-            selected_option_id=oid
-        )
-        db.session.add(ans)
+    quiz = db.session.get(Quiz, quiz_id)
+    now = datetime.utcnow()
+    if quiz is None or not (quiz.start_datetime <= now <= quiz.end_datetime):
+        return jsonify({'error': 'Quiz is not open'}), 404
 
-    db.session.commit()
-    return jsonify(success=True)
+    ack, applied = apply_batch(quiz_drafts, (current_user.id, quiz.id), seq, changes)
+    return jsonify({'status': 'saved' if applied else 'duplicate', 'ack': ack, 'applied': applied})
 
 @vclass_bp.route("/vclass/get_saved_answers/<int:quiz_id>")
 @login_required
 def get_saved_answers(quiz_id):
-    answers = (
-        StudentAnswer.query
-        .join(QuizAttempt)
-        .filter(
-            QuizAttempt.student_id == current_user.id,
-            QuizAttempt.quiz_id == quiz_id
-        )
-        .all()
-    )
-    return jsonify({str(a.question_id): a.answer_text for a in answers})
+    drafts = quiz_drafts.get((current_user.id, quiz_id))
+    return jsonify({
+        'last_seq': last_seq(drafts),
+        'answers': {
+            str(q_id): d['selected_option_id']
+            for q_id, d in drafts.items() if d['selected_option_id'] is not None
+        },
+    })
 
 @vclass_bp.route('/submit_quiz/<int:quiz_id>', methods=['POST'])
 @login_required
 def submit_quiz(quiz_id):
     quiz = Quiz.query.get_or_404(quiz_id)
 
-    # 🧠 Use current_user.id (numeric PK)
-    autosaved_key = f'autosaved_quiz_{quiz.id}_{current_user.id}'
-    autosaved_answers = session.get(autosaved_key, {})
-
-    score = 0
-    for q in quiz.questions:
-        submitted_option_id = request.form.get(f"answers[{q.id}]")
-
-        if not submitted_option_id:
-            submitted_option_id = autosaved_answers.get(str(q.id))
-
-        if submitted_option_id:
-            try:
-                submitted_option_id = int(submitted_option_id)
-                correct_option = next((opt for opt in q.options if opt.is_correct), None)
-                if correct_option and submitted_option_id == correct_option.id:
-                    score += 1
-            except (ValueError, TypeError):
-                continue
+    # 🧠 Use current_user.id (numeric PK); posted answers win over autosaved ones
+    answers = {q_id: d['selected_option_id']
+               for q_id, d in quiz_drafts.get((current_user.id, quiz.id)).items()}
+    answers.update(answers_from_form(request.form))
+    score = answer_key_for_quiz(quiz).grade(answers)
 
     # 🧾 Save Submission
     submission = StudentQuizSubmission(
@@ -514,8 +498,8 @@ def submit_quiz(quiz_id):
     )
     db.session.add(attempt)
 
-    # Clean up session
-    session.pop(autosaved_key, None)
+    # Clean up drafts so a further attempt starts empty
+    quiz_drafts.discard((current_user.id, quiz.id))
     session.pop(f'quiz_{quiz.id}_start_time', None)
 
     db.session.commit()
@@ -758,7 +742,8 @@ def my_results():
     # -----------------------
     # QUIZZES (student submissions) - unchanged
     # -----------------------
-    quiz_subs = StudentQuizSubmission.query.filter_by(student_id=user_id).all()
+    quiz_subs = (StudentQuizSubmission.query.filter_by(student_id=user_id)
+                 .options(joinedload(StudentQuizSubmission.quiz)).all())
     quiz_results = []
     for sub in quiz_subs:
         quiz = getattr(sub, 'quiz', None)
@@ -867,7 +852,9 @@ def my_results():
     # -----------------------
     # EXAMS (unchanged)
     # -----------------------
-    exam_submissions = ExamSubmission.query.filter_by(student_id=user_id).all()
+    exam_submissions = (ExamSubmission.query.filter_by(student_id=user_id)
+                        .options(joinedload(ExamSubmission.exam), joinedload(ExamSubmission.exam_set))
+                        .all())
     exam_results = []
     for sub in exam_submissions:
         exam = getattr(sub, 'exam', None)